@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Index approximatif (IVF) pour la recherche de plus proches voisins"""
+
+import numpy as np
+
+# Nombre de vecteurs d'entraînement par cluster pour le k-means
+TRAINING_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+# Nombre de lignes traitées à la fois lors de l'affectation aux clusters
+ASSIGN_BATCH_SIZE = 65536
+
+
+def default_nlist(count):
+    """Nombre de clusters par défaut pour un index de count vecteurs (≈ 4·√N)"""
+    return max(1, min(count, int(4 * np.sqrt(count))))
+
+
+def train_ivf(matrix, nlist, seed=0):
+    """
+    Entraîne les centroïdes de l'index IVF (k-means sphérique).
+
+    Args:
+        matrix: Matrice des embeddings normalisés (une ligne par chunk)
+        nlist: Nombre de clusters
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        Matrice des centroïdes normalisés (nlist x dimension)
+    """
+    rng = np.random.default_rng(seed)
+    count = matrix.shape[0]
+    nlist = max(1, min(nlist, count))
+
+    sample_size = min(count, nlist * TRAINING_SAMPLES_PER_LIST)
+    sample = matrix[rng.choice(count, sample_size, replace=False)] if sample_size < count else matrix
+    sample = np.asarray(sample, dtype=np.float32)
+
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = assign_ivf(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        # Somme des vecteurs de chaque cluster (lignes triées par cluster puis réduites)
+        order = np.argsort(assignments, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        # Un cluster vide est réinitialisé sur un vecteur tiré au hasard
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+def assign_ivf(matrix, centroids):
+    """
+    Affecte chaque vecteur au cluster le plus proche.
+
+    Args:
+        matrix: Matrice des embeddings normalisés
+        centroids: Centroïdes de l'index IVF
+
+    Returns:
+        Tableau int32 des numéros de cluster (un par ligne)
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    lists = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_BATCH_SIZE):
+        block = matrix[start:start + ASSIGN_BATCH_SIZE]
+        lists[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def inverted_lists(lists, nlist):
+    """
+    Calcule les listes inversées à partir des affectations.
+
+    Returns:
+        Tuple (order, offsets): les lignes du cluster c sont order[offsets[c]:offsets[c + 1]]
+    """
+    lists = np.asarray(lists, dtype=np.int32)
+    order = np.argsort(lists, kind='stable').astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=nlist))]).astype(np.int64)
+    return order, offsets
+
+
+class IVFIndex:
+    """
+    Listes inversées: seules les lignes des nprobe clusters les plus proches
+    de la question sont comparées exactement.
+    """
+
+    def __init__(self, centroids, order, offsets):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nlist = self.centroids.shape[0]
+        self._order = order
+        self._offsets = offsets
+
+    @classmethod
+    def from_lists(cls, centroids, lists):
+        """Construit l'index à partir des affectations de chaque ligne"""
+        order, offsets = inverted_lists(lists, len(centroids))
+        return cls(centroids, order, offsets)
+
+    def probe(self, query, nprobe):
+        """Retourne les nprobe clusters les plus proches de la question normalisée"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ query
+        return np.argpartition(-scores, nprobe - 1)[:nprobe]
+
+    def candidates(self, query, nprobe, probe=None):
+        """Retourne les lignes des nprobe clusters les plus proches de la question normalisée"""
+        if probe is None:
+            probe = self.probe(query, nprobe)
+        parts = [self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
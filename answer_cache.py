@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cache des réponses pour les questions répétées ou quasi identiques"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Valeurs par défaut (surchargées par la section answer_cache de config.yaml)
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 3600
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize_query(text):
+    """Forme normalisée d'une question (casse, espaces et ponctuation finale ignorés)"""
+    text = re.sub(r'\s+', ' ', text.strip().lower())
+    return text.rstrip(' ?!.')
+
+
+def create_answer_cache(config):
+    """Crée le cache des réponses configuré (None s'il est désactivé)"""
+    cache_config = config.get('answer_cache', {})
+    if not cache_config.get('enabled', True):
+        return None
+    return AnswerCache(
+        max_entries=cache_config.get('max_entries', DEFAULT_MAX_ENTRIES),
+        ttl=cache_config.get('ttl', DEFAULT_TTL),
+        similarity_threshold=cache_config.get('similarity_threshold', DEFAULT_SIMILARITY_THRESHOLD)
+    )
+
+
+class AnswerCache:
+    """
+    Cache des réponses à deux niveaux.
+
+    Niveau exact: la question normalisée est la clé. Niveau sémantique: une
+    réponse est réutilisée si l'embedding de la nouvelle question est assez
+    proche (similarité cosinus) de celui d'une question en cache. Les entrées
+    sont évincées par ancienneté d'utilisation (LRU) et par durée de vie (TTL).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # clé -> (embedding normalisé ou None, réponse, date d'insertion)
+        self._entries = OrderedDict()
+        # Matrice des embeddings en cache (reconstruite après chaque modification)
+        self._matrix = None
+        self._matrix_keys = []
+        # Incrémentée à chaque invalidation: les réponses calculées avant sont ignorées
+        self.generation = 0
+        self.stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0}
+
+    def _expire(self, now):
+        """Supprime les entrées plus anciennes que le TTL (appelé sous verrou)"""
+        if not self.ttl:
+            return
+        expired = [key for key, (_, _, created) in self._entries.items() if now - created > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def get_exact(self, query_text):
+        """Retourne la réponse en cache pour la même question normalisée, ou None"""
+        key = normalize_query(query_text)
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats['exact_hits'] += 1
+            return entry[1]
+
+    def get_similar(self, embedding):
+        """
+        Retourne la réponse d'une question en cache dont l'embedding est proche, ou None.
+
+        Un appel sans résultat compte comme un échec du cache.
+        """
+        query = _normalize(embedding)
+        with self._lock:
+            self._expire(time.monotonic())
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self._entries.items() if entry[0] is not None]
+                self._matrix = (
+                    np.vstack([self._entries[key][0] for key in self._matrix_keys])
+                    if self._matrix_keys else None
+                )
+            if self._matrix is not None and self._matrix.shape[1] == len(query):
+                scores = self._matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    self.stats['semantic_hits'] += 1
+                    return self._entries[key][1]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, query_text, embedding, response, generation=None):
+        """
+        Enregistre la réponse à une question.
+
+        Args:
+            query_text: Question posée
+            embedding: Embedding de la question (None = niveau exact uniquement)
+            response: Réponse à mettre en cache
+            generation: Génération du cache au début du calcul de la réponse
+                (la réponse est ignorée si le cache a été invalidé depuis)
+        """
+        key = normalize_query(query_text)
+        vector = None if embedding is None else _normalize(embedding)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (vector, response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """Vide le cache (les statistiques sont conservées)"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def report(self):
+        """Statistiques du cache pour /api/status"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['exact_hits'] + stats['semantic_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['exact_hits'] + stats['semantic_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
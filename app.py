@@ -1,16 +1,30 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Interface Web RAG avec Flask et LangChain"""
+"""
+Interface Web RAG avec Flask et LangChain
+
+Le serveur répond dès l'import du module: les modules de recherche (LangChain,
+clients Ollama) et l'index sont chargés en arrière-plan, pendant que
+/api/status indique l'état "warming". Les modules d'indexation ne sont
+importés qu'à la première indexation d'URL.
+"""
+
+import time
+
+# Début du démarrage (temps jusqu'à ce que l'application soit prête)
+STARTED_AT = time.perf_counter()
 
 import os
 import sys
+import json
+import threading
 import yaml
-import pickle
-from flask import Flask, render_template, request, jsonify
-from langchain_community.vectorstores import SKLearnVectorStore
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
-from langchain_core.prompts import PromptTemplate
-from ingest import ingest_urls
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from answer_cache import create_answer_cache
+from jobs import JobQueue
+from filters import MetadataFilter
+from batch import get_batch_config, parse_batch_items, parse_concurrency, run_batch
+from metrics import REGISTRY, REQUESTS, REQUEST_SECONDS, CONTENT_TYPE, CallbackMetric, Timings
 
 # Forcer l'encodage UTF-8 pour la console Windows
 if sys.platform == 'win32':
@@ -29,107 +43,363 @@ def load_config():
         return yaml.safe_load(f)
 
 def load_vectorstore():
-    """Charge le vector store depuis le fichier"""
+    """
+    Ouvre le vector store (fichiers mappés en mémoire, sans recalculer les embeddings).
+    
+    Raises:
+        EmbeddingModelMismatch: Si l'index a été construit avec un autre modèle
+            d'embedding (ou est dans l'ancien format): le serveur ne le reconstruit
+            pas lui-même, l'opérateur lance python ingest.py --rebuild
+    """
+    from embedder import get_embeddings
+    from store import (DEFAULT_RERANK_CANDIDATES, get_store_path, get_store_dtype, store_exists, LocalVectorStore,
+                       EmbeddingModelMismatch)
+    from shards import load_shards, read_shard_count, ShardedVectorStore
+    
     config = load_config()
-    vectorstore_path = os.path.join(config['paths']['vectorstore_dir'], 'vectorstore.pkl')
+    vectorstore_path = get_store_path(config)
+    embedding_model = config['models']['embedding_model']
+    dtype = get_store_dtype(config)
     
-    if not os.path.exists(vectorstore_path):
+    if not store_exists(vectorstore_path):
         return None
     
-    # Charger les données sauvegardées
-    with open(vectorstore_path, 'rb') as f:
-        save_data = pickle.load(f)
-    
-    # Recréer les documents LangChain
-    from langchain_core.documents import Document
-    documents = [
-        Document(page_content=doc, metadata=meta)
-        for doc, meta in zip(save_data['documents'], save_data['metadatas'])
-    ]
+    # Ouvrir la matrice, les textes et les metadatas sauvegardés (les shards en parallèle)
+    try:
+        shards = load_shards(vectorstore_path, embedding_model, dtype=dtype)
+    except EmbeddingModelMismatch as e:
+        # Reconstruire l'index recalcule tout le corpus: jamais implicitement dans le serveur
+        # (plusieurs workers le feraient en même temps sur le même dossier)
+        raise EmbeddingModelMismatch(f"{e}. Lancez python ingest.py --rebuild pour recalculer les embeddings") from e
     
-    # Recréer le vector store
-    embeddings = OllamaEmbeddings(model=save_data.get('embedding_model', config['models']['embedding_model']))
-    vectorstore = SKLearnVectorStore.from_documents(
-        documents=documents,
-        embedding=embeddings
-    )
+    # Index approximatif IVF pour les grands vector stores, recherche exacte sinon
+    search_config = config['search']
+    mode = search_config.get('index', 'auto')
+    use_ivf = mode != 'exact'
+    if mode == 'auto' and sum(len(store_data) for store_data in shards) < search_config.get('ann_min_size', 20000):
+        use_ivf = False
     
-    return vectorstore
+    embedding = get_embeddings(config)
+    stores = [
+        LocalVectorStore(embedding=embedding, data=store_data, use_ivf=use_ivf,
+                         nprobe=search_config.get('ivf_nprobe', 16),
+                         rerank_candidates=search_config.get('rerank_candidates', DEFAULT_RERANK_CANDIDATES))
+        for store_data in shards
+    ]
+    if read_shard_count(vectorstore_path) is None:
+        return stores[0]
+    # Vector store partitionné: recherche lancée sur tous les shards puis fusionnée
+    return ShardedVectorStore(embedding, stores)
 
-# Charger la configuration et le vector store au démarrage
+# Charger la configuration au démarrage; le vector store et le pipeline sont chargés par warm_up
 config = load_config()
-vectorstore = load_vectorstore()
+vectorstore = None
+pipeline = None
+answer_cache = create_answer_cache(config)
+# Les indexations s'exécutent une par une en arrière-plan (un seul écrivain pour le vector store)
+index_jobs = JobQueue('index-jobs')
+# Limites d'appels simultanés vers Ollama du mode async ({nom: ConcurrencyLimit}, vide en mode flask)
+concurrency_limits = {}
+
+# État du démarrage: "warming" puis "ready" (ou "error"), et durée de chaque étape
+startup = {'status': 'warming', 'time_to_ready': None, 'stages': {}, 'error': None}
+ready = threading.Event()
+# Thread de chargement, lancé par start()
+warm_up_thread = None
+start_lock = threading.Lock()
+WARMING_MESSAGE = "L'index est en cours de chargement, réessayez dans quelques secondes"
+# Routes qui ont besoin de l'index (503 tant qu'il n'est pas chargé)
+INDEX_ROUTES = ('/api/query', '/api/query/stream', '/api/query/batch')
+
+def warm_up():
+    """
+    Charge les modules de recherche, le vector store et le pipeline (thread d'arrière-plan).
+    
+    Avec server.warmup, les modèles sont chargés en mémoire côté Ollama en
+    parallèle. L'application est prête quand tout est terminé.
+    """
+    global vectorstore, pipeline
+    stages = startup['stages']
+    try:
+        start = time.perf_counter()
+        from pipeline import QueryPipeline, warm_up_models
+        stages['imports'] = round(time.perf_counter() - start, 3)
+        
+        models_thread = None
+        if config.get('server', {}).get('warmup', False):
+            def load_models():
+                start = time.perf_counter()
+                warm_up_models(config)
+                stages['models'] = round(time.perf_counter() - start, 3)
+            models_thread = threading.Thread(target=load_models, name='warm-up-models', daemon=True)
+            models_thread.start()
+        
+        start = time.perf_counter()
+        new_vectorstore = load_vectorstore()
+        pipeline = QueryPipeline(config, new_vectorstore, answer_cache)
+        vectorstore = new_vectorstore
+        stages['index'] = round(time.perf_counter() - start, 3)
+        if vectorstore is None:
+            print("⚠️  Vector store non trouvé. Lancez d'abord: python ingest.py")
+        
+        if models_thread is not None:
+            models_thread.join()
+        
+        startup['time_to_ready'] = round(time.perf_counter() - STARTED_AT, 3)
+        startup['status'] = 'ready'
+        details = ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in stages.items())
+        print(f"✅ Prêt en {startup['time_to_ready']:.2f}s ({details})")
+    except Exception as e:
+        startup['status'] = 'error'
+        startup['error'] = str(e)
+        print(f"❌ Erreur au chargement de l'index: {e}")
+    finally:
+        ready.set()
+
+def wait_until_ready(timeout=None):
+    """Attend la fin du chargement en arrière-plan. Retourne True si l'application est prête"""
+    ready.wait(timeout)
+    return startup['status'] == 'ready'
+
+def index_size():
+    """Nombre de chunks de l'index servi (None si aucun index)"""
+    current_vectorstore = pipeline.vectorstore if pipeline is not None else None
+    return len(current_vectorstore.data) if current_vectorstore is not None else None
+
+def answer_cache_entries():
+    return answer_cache.report()['entries'] if answer_cache is not None else None
+
+# Valeurs lues à chaque export de /metrics
+REGISTRY.register(CallbackMetric('rag_index_chunks', "Chunks de l'index servi", index_size))
+REGISTRY.register(CallbackMetric('rag_answer_cache_entries', 'Réponses dans le cache', answer_cache_entries))
+REGISTRY.register(CallbackMetric('rag_time_to_ready_seconds', "Durée du démarrage jusqu'à l'état ready",
+                                 lambda: startup['time_to_ready']))
 
 def reload_vectorstore():
-    """Recharge le vector store depuis le fichier"""
-    global vectorstore
-    vectorstore = load_vectorstore()
+    """
+    Recharge le vector store et recrée le pipeline de requêtes.
+    
+    La nouvelle version est ouverte à côté de l'ancienne, puis le pipeline est
+    remplacé en une seule affectation: les requêtes en cours terminent avec
+    l'ancienne version, les suivantes utilisent la nouvelle, sans verrou.
+    """
+    global vectorstore, pipeline
+    from pipeline import QueryPipeline
+    new_vectorstore = load_vectorstore()
+    # Les réponses en cache ont été calculées avec l'ancien index
+    if answer_cache is not None:
+        answer_cache.clear()
+    pipeline = QueryPipeline(config, new_vectorstore, answer_cache)
+    vectorstore = new_vectorstore
     return vectorstore
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Compte les requêtes et mesure leur durée (jusqu'au premier octet pour le streaming)"""
+    route = request.url_rule.rule if request.url_rule is not None else 'inconnue'
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route=route, method=request.method)
+    return response
+
+@app.before_request
+def require_index():
+    """Les questions attendent la fin du chargement de l'index (503 avec Retry-After)"""
+    if request.path not in INDEX_ROUTES or startup['status'] == 'ready':
+        return None
+    if startup['status'] == 'warming':
+        return jsonify({'error': WARMING_MESSAGE, 'status': 'warming'}), 503, {'Retry-After': '1'}
+    return jsonify({'error': f"Erreur au chargement de l'index: {startup['error']}", 'status': 'error'}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Métriques au format Prometheus (requêtes, durée des étapes, chunks indexés, caches, taille de l'index)"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/')
 def index():
     """Page d'accueil - Interface de chat"""
     return render_template('chat.html')
 
+def validate_query(data, current_pipeline):
+    """
+    Valide la question envoyée en JSON (partagé avec le mode de service asynchrone).
+    
+    Args:
+        data: Corps JSON de la requête ("query" et, en option, "filters":
+            source, type, indexed_after, indexed_before)
+        current_pipeline: Pipeline qui traitera la requête
+    
+    Returns:
+        Tuple (query_text, metadata_filter, error); error vaut None si la requête est valide
+    """
+    if not data:
+        return None, None, 'Données JSON requises'
+    
+    query_text = data.get('query', '')
+    if not query_text:
+        return None, None, 'Aucune question fournie'
+    
+    try:
+        metadata_filter = MetadataFilter.from_dict(data.get('filters'))
+    except ValueError as e:
+        return None, None, str(e)
+    
+    if current_pipeline.vectorstore is None:
+        return None, None, 'Vector store non trouvé. Lancez d\'abord l\'indexation avec: python ingest.py'
+    
+    return query_text, metadata_filter, None
+
+def wants_timings(data):
+    """Le détail des durées est renvoyé si la requête contient "timings": true (ou metrics.response_timings)"""
+    return bool((data or {}).get('timings')) or config.get('metrics', {}).get('response_timings', False)
+
+def get_query_text(current_pipeline):
+    """
+    Lit et valide la question envoyée en JSON.
+    
+    Args:
+        current_pipeline: Pipeline qui traitera la requête
+    
+    Returns:
+        Tuple (query_text, metadata_filter, error_response); error_response vaut None si la requête est valide
+    """
+    query_text, metadata_filter, error = validate_query(request.get_json(), current_pipeline)
+    if error:
+        return None, None, (jsonify({'error': error}), 400)
+    return query_text, metadata_filter, None
+
 @app.route('/api/query', methods=['POST'])
 def query():
     """API pour les requêtes RAG"""
+    # Le pipeline (et donc la version de l'index) est fixé pour toute la requête
+    current_pipeline = pipeline
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Données JSON requises'}), 400
-        
-        query_text = data.get('query', '')
-        if not query_text:
-            return jsonify({'error': 'Aucune question fournie'}), 400
-        
-        if vectorstore is None:
-            return jsonify({'error': 'Vector store non trouvé. Lancez d\'abord l\'indexation avec: python ingest.py'}), 400
+        query_text, metadata_filter, error_response = get_query_text(current_pipeline)
+        if error_response:
+            return error_response
         
-        # Initialiser le LLM avec Ollama
-        llm = OllamaLLM(
-            model=config['models']['generation_model'],
-            temperature=config['models']['temperature']
-        )
-        
-        # Créer le retriever
-        retriever = vectorstore.as_retriever(
-            search_kwargs={"k": config['search']['top_k']}
-        )
-        
-        # Récupérer les documents pertinents
-        docs = retriever.invoke(query_text)
+        timings = Timings()
+        response = current_pipeline.invoke(query_text, metadata_filter, timings)
+        if wants_timings(request.get_json()):
+            response = dict(response, timings=timings.to_dict())
+        return jsonify(response)
         
-        # Construire le contexte
-        context = "\n\n".join([doc.page_content for doc in docs])
-        
-        # Créer le prompt
-        prompt_template = """Utilise les extraits de documents suivants pour répondre à la question. 
-Si tu ne trouves pas la réponse dans les documents, dis-le clairement.
-
-Contexte:
-{context}
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
-Question: {question}
+def sse_event(event, data):
+    """Formate un événement Server-Sent Events (données JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-Réponse:"""
+@app.route('/api/query/stream', methods=['POST'])
+def query_stream():
+    """
+    API pour les requêtes RAG en streaming (Server-Sent Events).
+    
+    Les sources sont envoyées dès la fin de la recherche (événement 'sources'),
+    puis la réponse au fil de la génération (événements 'token'), et enfin
+    un événement 'done' (ou 'error').
+    """
+    # Le même pipeline sert toute la réponse, même si l'index est rechargé entre-temps
+    current_pipeline = pipeline
+    try:
+        query_text, metadata_filter, error_response = get_query_text(current_pipeline)
+        if error_response:
+            return error_response
         
-        prompt = prompt_template.format(context=context, question=query_text)
+        timings = Timings()
+        include_timings = wants_timings(request.get_json())
+        cached, embedding = current_pipeline.lookup(query_text, metadata_filter, timings)
+        if cached is None:
+            prompt, sources, docs, prompt_info = current_pipeline.retrieve(query_text, embedding, metadata_filter,
+                                                                           timings)
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+    
+    def done_event(cached_level):
+        data = {'cached': cached_level}
+        if include_timings:
+            data['timings'] = timings.to_dict()
+        return sse_event('done', data)
+    
+    def generate():
+        if cached is not None:
+            # Réponse en cache: envoyée en un seul événement
+            yield sse_event('sources', {'sources': cached['sources'], 'chunks_found': cached['chunks_found'],
+                                      'prompt': cached.get('prompt')})
+            yield sse_event('token', {'text': cached['answer']})
+            yield done_event(cached['cached'])
+            return
         
-        # Générer la réponse
-        answer = llm.invoke(prompt)
+        yield sse_event('sources', {'sources': sources, 'chunks_found': len(docs), 'prompt': prompt_info})
+        try:
+            tokens = []
+            # Le temps d'envoi des tokens au client est compté dans la génération
+            with timings.span('generate'):
+                for token in current_pipeline.stream(prompt):
+                    tokens.append(token)
+                    yield sse_event('token', {'text': token})
+            current_pipeline.finish(query_text, embedding, ''.join(tokens), sources, docs, prompt_info, metadata_filter)
+            yield done_event(False)
+        except Exception as e:
+            yield sse_event('error', {'error': f'Erreur: {str(e)}'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Désactiver la mise en tampon des proxys pour recevoir chaque token immédiatement
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/query/batch', methods=['POST'])
+def query_batch():
+    """
+    API pour les lots de questions (évaluation hors ligne, réponses en masse).
+    
+    Corps JSON: {"queries": [...], "generate": true, "concurrency": 4}; chaque
+    question est une chaîne ou un objet {"query", "id"}. La réponse est en
+    JSONL (une ligne par question, dans l'ordre du lot); avec "generate": false,
+    seuls les chunks retrouvés sont renvoyés.
+    """
+    current_pipeline = pipeline
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Données JSON requises'}), 400
         
-        # Extraire les sources
-        sources = list(set([doc.metadata.get('source', 'Inconnu') for doc in docs]))
+        max_concurrency, max_queries = get_batch_config(config)
+        try:
+            items = parse_batch_items(data.get('queries'), max_queries)
+            # La concurrence demandée ne peut pas dépasser celle de la configuration
+            concurrency = parse_concurrency(data.get('concurrency'), max_concurrency)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({
-            'answer': answer,
-            'sources': sources,
-            'chunks_found': len(docs)
-        })
+        if current_pipeline.vectorstore is None:
+            return jsonify({'error': 'Vector store non trouvé. Lancez d\'abord l\'indexation avec: python ingest.py'}), 400
         
+        results = run_batch(current_pipeline, items, generate=data.get('generate', True),
+                            max_concurrency=concurrency)
+        # La recherche de tout le lot est faite ici: une erreur reste une réponse 500
+        first = next(results)
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
+    
+    def generate():
+        try:
+            yield json.dumps(first, ensure_ascii=False) + '\n'
+            for response in results:
+                yield json.dumps(response, ensure_ascii=False) + '\n'
+        finally:
+            # Client déconnecté: les générations restantes du lot sont annulées
+            results.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/api/documents')
 def list_documents():
@@ -168,9 +438,33 @@ def list_documents():
             'documents': []
         }), 500
 
+def run_index_urls_job(job, urls):
+    """Tâche d'arrière-plan: indexe les URLs puis recharge le vector store"""
+    # Modules d'indexation (chargeurs de documents, découpage) importés à la première indexation
+    from ingest import ingest_urls
+    # L'index chargé au démarrage ne doit pas remplacer celui produit par la tâche
+    wait_until_ready()
+    success, message, chunks_count = ingest_urls(urls, config, progress=job.update)
+    if success:
+        job.update(stage='reloading')
+        reload_vectorstore()
+        return {
+            'success': True,
+            'message': message,
+            'chunks_count': chunks_count,
+            'urls_indexed': urls
+        }
+    raise RuntimeError(message)
+
 @app.route('/api/index-url', methods=['POST'])
 def index_url():
-    """API pour indexer une ou plusieurs URLs web"""
+    """
+    API pour indexer une ou plusieurs URLs web.
+    
+    L'indexation est exécutée en arrière-plan: la réponse (202) contient
+    l'identifiant de la tâche, dont la progression est consultable sur
+    /api/jobs/<id>. Avec "wait": true, la réponse attend la fin de l'indexation.
+    """
     try:
         data = request.get_json()
         if not data:
@@ -184,23 +478,21 @@ def index_url():
         if isinstance(urls, str):
             urls = [urls]
         
-        # Indexer les URLs
-        success, message, chunks_count = ingest_urls(urls, config)
+        job = index_jobs.submit('index-url', run_index_urls_job, urls=urls)
         
-        if success:
-            # Recharger le vector store
-            reload_vectorstore()
-            return jsonify({
-                'success': True,
-                'message': message,
-                'chunks_count': chunks_count,
-                'urls_indexed': urls
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': message
-            }), 400
+        if data.get('wait'):
+            job.wait()
+            job_state = job.to_dict()
+            if job_state['status'] == 'done':
+                return jsonify(dict(job_state['result'], job_id=job.id))
+            return jsonify({'success': False, 'error': job_state['error'], 'job_id': job.id}), 400
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}',
+            'queued_jobs': index_jobs.pending_count()
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -208,29 +500,50 @@ def index_url():
             'error': f'Erreur: {str(e)}'
         }), 500
 
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Progression d'une tâche d'indexation (étape, URLs téléchargées, chunks embeddés, temps restant)"""
+    job = index_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche inconnue'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/status')
 def status():
     """Vérification du statut du système"""
+    if startup['status'] != 'ready':
+        # Index en cours de chargement (ou échec du chargement)
+        return jsonify({
+            'status': startup['status'],
+            'startup': startup,
+            'error': startup['error']
+        }), 503 if startup['status'] == 'warming' else 500
+    
+    from store import get_store_path, store_exists
     try:
-        # Vérifier Ollama (basique)
-        try:
-            from langchain_ollama import OllamaLLM
-            llm = OllamaLLM(model=config['models']['generation_model'])
-            llm.invoke("test")
-            ollama_status = "OK"
-        except:
-            ollama_status = "Erreur"
+        current_pipeline = pipeline
+        # Vérifier Ollama (liste des modèles, sans génération)
+        ollama_ok, _ = current_pipeline.check_health()
+        ollama_status = "OK" if ollama_ok else "Erreur"
         
         # Vérifier le vector store
-        vectorstore_path = os.path.join(config['paths']['vectorstore_dir'], 'vectorstore.pkl')
-        vectorstore_status = "OK" if os.path.exists(vectorstore_path) else "Index manquant"
+        vectorstore_path = get_store_path(config)
+        vectorstore_status = "OK" if store_exists(vectorstore_path) else "Index manquant"
+        current_vectorstore = current_pipeline.vectorstore
         
         status = 'OK' if ollama_status == 'OK' and vectorstore_status == 'OK' else 'Erreur'
         
         return jsonify({
             'ollama': ollama_status,
             'vectorstore': vectorstore_status,
-            'status': status
+            'status': status,
+            'index_version': current_vectorstore.data.version if current_vectorstore is not None else None,
+            # Recherche lexicale seule tant que le modèle d'embedding est en échec
+            'retrieval': 'lexical' if current_pipeline.embedding_degraded() else current_pipeline.retrieval,
+            'answer_cache': answer_cache.report() if answer_cache is not None else None,
+            # Mode async: appels en cours et en attente vers Ollama (None en mode flask)
+            'limits': {name: limit.report() for name, limit in concurrency_limits.items()} or None,
+            'startup': startup
         })
     except Exception as e:
         return jsonify({
@@ -238,16 +551,43 @@ def status():
             'status': 'Erreur'
         }), 500
 
+def start():
+    """
+    Lance le chargement de l'index en arrière-plan (sans effet s'il est déjà lancé).
+    
+    Appelé par les points d'entrée (python app.py, create_app, create_asgi_app,
+    batch.py, benchmark.py): importer le module ne démarre aucun thread ni
+    appel à Ollama. Le serveur répond ("warming") pendant le chargement.
+    """
+    global warm_up_thread
+    with start_lock:
+        if warm_up_thread is None:
+            warm_up_thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+            warm_up_thread.start()
+
+def create_app():
+    """Application Flask avec l'index en cours de chargement (serveurs WSGI: gunicorn 'app:create_app()')"""
+    start()
+    return app
+
 if __name__ == '__main__':
     print("🚀 Démarrage de l'interface web RAG...")
     print(f"📱 Ouvrez votre navigateur sur: http://{config['web']['host']}:{config['web']['port']}")
     
-    if vectorstore is None:
-        print("⚠️  Vector store non trouvé. Lancez d'abord: python ingest.py")
-    
-    app.run(
-        debug=config['web']['debug'],
-        host=config['web']['host'],
-        port=config['web']['port'],
-        use_reloader=config['web'].get('use_reloader', False)
-    )
+    if config.get('server', {}).get('mode', 'flask') == 'async':
+        # Service asynchrone (ASGI): questions traitées sans bloquer un thread par requête
+        try:
+            import uvicorn
+        except ImportError:
+            print("❌ Le mode async nécessite uvicorn et asgiref: pip install uvicorn asgiref")
+            sys.exit(1)
+        from asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(sys.modules[__name__]), host=config['web']['host'], port=config['web']['port'])
+    else:
+        start()
+        app.run(
+            debug=config['web']['debug'],
+            host=config['web']['host'],
+            port=config['web']['port'],
+            use_reloader=config['web'].get('use_reloader', False)
+        )
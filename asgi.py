@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mode de service asynchrone (ASGI) de l'interface web.
+
+Les questions (/api/query et /api/query/stream) sont traitées par des
+coroutines: l'attente du serveur de modèles ne bloque aucun thread, et le
+nombre d'appels simultanés vers Ollama est limité (section server de
+config.yaml). Quand la file d'attente est pleine, la réponse est un 429 avec
+un en-tête Retry-After. Si le client se déconnecte pendant la génération,
+la requête vers Ollama est annulée et sa place libérée. Les autres routes
+sont servies par l'application Flask.
+
+Lancement: python app.py avec server.mode: "async" dans config.yaml,
+ou: uvicorn asgi:create_asgi_app --factory
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from limits import Overloaded, create_limits
+from metrics import REQUESTS, REQUEST_SECONDS, Timings
+
+JSON_HEADERS = [(b'content-type', b'application/json')]
+# Désactiver la mise en tampon des proxys pour recevoir chaque token immédiatement
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no')
+]
+
+
+class ClientDisconnected(Exception):
+    """Le client s'est déconnecté avant la fin de la réponse"""
+
+
+async def wait_for_disconnect(receive):
+    """Attend la déconnexion du client (le corps de la requête a déjà été lu)"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def cancel_on_disconnect(receive, coroutine):
+    """
+    Exécute coroutine et retourne son résultat.
+
+    Si le client se déconnecte avant la fin, coroutine est annulée (ce qui
+    ferme la requête vers Ollama et arrête la génération) et ClientDisconnected
+    est levée.
+    """
+    task = asyncio.ensure_future(coroutine)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not task.done():
+            task.cancel()
+            # Attendre la fermeture de la requête avant de libérer la place de génération
+            await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        raise ClientDisconnected()
+    return task.result()
+
+
+async def read_json(receive):
+    """Lit le corps de la requête et le décode en JSON (None si invalide)"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def send_json(send, status, data, headers=()):
+    """Envoie une réponse JSON complète"""
+    await send({'type': 'http.response.start', 'status': status, 'headers': JSON_HEADERS + list(headers)})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+
+async def send_overloaded(send, error):
+    """Répond 429 avec le délai conseillé avant de réessayer"""
+    await send_json(send, 429, {'error': str(error)}, [(b'retry-after', str(error.retry_after).encode())])
+
+
+def done_data(cached, timings=None):
+    """Données de l'événement 'done' (avec le détail des durées s'il est demandé)"""
+    data = {'cached': cached}
+    if timings is not None:
+        data['timings'] = timings.to_dict()
+    return data
+
+
+class AsyncQueryApp:
+    """Application ASGI: questions traitées en asynchrone, autres routes déléguées à Flask"""
+
+    def __init__(self, web):
+        # web: module app (configuration, pipeline courant, application Flask)
+        self.web = web
+        self.flask = WsgiToAsgi(web.app)
+        self.embeddings_limit, self.generations_limit = create_limits(web.config)
+        # État des limites dans /api/status (route servie par Flask)
+        web.concurrency_limits.update(embeddings=self.embeddings_limit, generations=self.generations_limit)
+        self.routes = {
+            ('POST', '/api/query'): self.query,
+            ('POST', '/api/query/stream'): self.query_stream
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        handler = self.routes.get((scope.get('method'), scope.get('path')))
+        # Tant que l'index n'est pas chargé, Flask répond 503 (même contrat que le mode flask)
+        if handler is None or self.web.startup['status'] != 'ready':
+            await self.flask(scope, receive, send)
+            return
+
+        # Mêmes métriques que les routes Flask (durée jusqu'au premier octet)
+        start = time.perf_counter()
+        route, method = scope['path'], scope['method']
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                REQUESTS.inc(route=route, method=method, status=message['status'])
+                REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=method)
+            await send(message)
+
+        await handler(receive, send_and_record)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def retrieve(self, current_pipeline, query_text, metadata_filter, timings):
+        """Cache puis recherche; seul l'appel du modèle d'embedding est soumis à la limite des embeddings"""
+        async def embed(text):
+            # La recherche (vecteurs et BM25, locale) et le mode lexical n'occupent pas de place
+            if not current_pipeline.embedding_enabled():
+                return None
+            async with self.embeddings_limit.slot():
+                return await current_pipeline.aembed(text)
+
+        cached, embedding = await current_pipeline.alookup(query_text, metadata_filter, timings, embed=embed)
+        if cached is not None:
+            return cached, embedding, None
+        return None, embedding, await current_pipeline.aretrieve(query_text, embedding, metadata_filter, timings,
+                                                                 embed=embed)
+
+    async def query(self, receive, send):
+        """API pour les requêtes RAG (même contrat que la route Flask)"""
+        # Le pipeline (et donc la version de l'index) est fixé pour toute la requête
+        current_pipeline = self.web.pipeline
+        try:
+            data = await read_json(receive)
+            query_text, metadata_filter, error = self.web.validate_query(data, current_pipeline)
+            if error:
+                await send_json(send, 400, {'error': error})
+                return
+
+            timings = Timings()
+            cached, embedding, retrieved = await self.retrieve(current_pipeline, query_text, metadata_filter, timings)
+            if cached is None:
+                prompt, sources, docs, prompt_info = retrieved
+                async with self.generations_limit.slot():
+                    with timings.span('generate'):
+                        answer = await cancel_on_disconnect(receive, current_pipeline.agenerate(prompt))
+                response = current_pipeline.finish(query_text, embedding, answer, sources, docs, prompt_info,
+                                                   metadata_filter)
+            else:
+                response = cached
+            if self.web.wants_timings(data):
+                response = dict(response, timings=timings.to_dict())
+            await send_json(send, 200, response)
+
+        except ClientDisconnected:
+            return
+        except Overloaded as e:
+            await send_overloaded(send, e)
+        except Exception as e:
+            await send_json(send, 500, {'error': f'Erreur: {str(e)}'})
+
+    async def query_stream(self, receive, send):
+        """API pour les requêtes RAG en streaming (mêmes événements SSE que la route Flask)"""
+        current_pipeline = self.web.pipeline
+        sse_event = self.web.sse_event
+        try:
+            data = await read_json(receive)
+            query_text, metadata_filter, error = self.web.validate_query(data, current_pipeline)
+            if error:
+                await send_json(send, 400, {'error': error})
+                return
+
+            timings = Timings()
+            # Détail des durées dans l'événement 'done' (None = non demandé)
+            done_timings = timings if self.web.wants_timings(data) else None
+            cached, embedding, retrieved = await self.retrieve(current_pipeline, query_text, metadata_filter, timings)
+            if cached is not None:
+                # Réponse en cache: envoyée en un seul événement
+                await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+                body = (
+                    sse_event('sources', {'sources': cached['sources'], 'chunks_found': cached['chunks_found'],
+                                          'prompt': cached.get('prompt')})
+                    + sse_event('token', {'text': cached['answer']})
+                    + sse_event('done', done_data(cached['cached'], done_timings))
+                )
+                await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+                return
+
+            # La place est réservée avant d'envoyer les en-têtes: un refus reste un 429
+            async with self.generations_limit.slot():
+                await cancel_on_disconnect(receive, self.stream_answer(
+                    send, current_pipeline, query_text, embedding, metadata_filter, *retrieved,
+                    timings=timings, done_timings=done_timings))
+
+        except ClientDisconnected:
+            return
+        except Overloaded as e:
+            await send_overloaded(send, e)
+        except Exception as e:
+            await send_json(send, 500, {'error': f'Erreur: {str(e)}'})
+
+    async def stream_answer(self, send, current_pipeline, query_text, embedding, metadata_filter,
+                            prompt, sources, docs, prompt_info, timings, done_timings=None):
+        """Envoie les sources puis la réponse token par token"""
+        sse_event = self.web.sse_event
+
+        async def send_event(event, data, more_body=True):
+            await send({'type': 'http.response.body', 'body': sse_event(event, data).encode('utf-8'), 'more_body': more_body})
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+        await send_event('sources', {'sources': sources, 'chunks_found': len(docs), 'prompt': prompt_info})
+        try:
+            tokens = []
+            stream = current_pipeline.astream(prompt)
+            try:
+                with timings.span('generate'):
+                    async for token in stream:
+                        tokens.append(token)
+                        await send_event('token', {'text': token})
+            finally:
+                # Annulation (client déconnecté): fermer tout de suite la requête de génération
+                await stream.aclose()
+            current_pipeline.finish(query_text, embedding, ''.join(tokens), sources, docs, prompt_info, metadata_filter)
+            await send_event('done', done_data(False, done_timings), more_body=False)
+        except Exception as e:
+            await send_event('error', {'error': f'Erreur: {str(e)}'}, more_body=False)
+
+
+def create_asgi_app(web=None):
+    """
+    Crée l'application ASGI.
+
+    Args:
+        web: Module de l'application Flask déjà chargé (par défaut: import de app)
+    """
+    if web is None:
+        import app as web
+    # Chargement de l'index en arrière-plan (déjà lancé si web.start() a été appelé)
+    web.start()
+    return AsyncQueryApp(web)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Questions par lot (évaluation hors ligne, réponses en masse) avec résultats en JSONL"""
+
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Valeurs par défaut (surchargées par la section batch de config.yaml)
+DEFAULT_MAX_CONCURRENT_GENERATIONS = 4
+DEFAULT_MAX_QUERIES = 10000
+
+
+def get_batch_config(config):
+    """Retourne (max_concurrent_generations, max_queries)"""
+    batch_config = config.get('batch', {})
+    return (batch_config.get('max_concurrent_generations', DEFAULT_MAX_CONCURRENT_GENERATIONS),
+            batch_config.get('max_queries', DEFAULT_MAX_QUERIES))
+
+
+def parse_batch_items(queries, max_queries=None):
+    """
+    Valide les questions d'un lot.
+
+    Args:
+        queries: Liste de questions (chaînes ou objets {"query": ..., "id": ...})
+        max_queries: Nombre maximum de questions (None = illimité)
+
+    Returns:
+        Liste de dictionnaires {'id', 'query'} (id = position si absent)
+
+    Raises:
+        ValueError: Si le lot est invalide (message destiné à l'utilisateur)
+    """
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("Le champ 'queries' doit être une liste non vide")
+    if max_queries and len(queries) > max_queries:
+        raise ValueError(f"Trop de questions dans le lot ({len(queries)}, maximum {max_queries})")
+
+    items = []
+    for position, entry in enumerate(queries):
+        if isinstance(entry, str):
+            entry = {'query': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('query'), str) or not entry['query'].strip():
+            raise ValueError(f"Question {position}: chaîne ou objet avec un champ 'query' non vide attendu")
+        items.append({'id': entry.get('id', position), 'query': entry['query']})
+    return items
+
+
+def parse_concurrency(value, maximum):
+    """
+    Valide le nombre de générations simultanées demandé pour un lot.
+
+    Args:
+        value: Valeur du champ 'concurrency' (None = maximum)
+        maximum: Maximum de la configuration (batch.max_concurrent_generations)
+
+    Returns:
+        Nombre de générations simultanées, au plus maximum
+
+    Raises:
+        ValueError: Si la valeur n'est pas un entier positif (message destiné à l'utilisateur)
+    """
+    if value is None:
+        return maximum
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError("Le champ 'concurrency' doit être un entier positif")
+    return min(value, maximum)
+
+
+def run_batch(pipeline, items, generate=True, max_concurrency=DEFAULT_MAX_CONCURRENT_GENERATIONS):
+    """
+    Traite un lot de questions.
+
+    La recherche est faite pour tout le lot (embeddings en un seul lot, top-k
+    vectorisé), puis les générations sont envoyées en parallèle, au plus
+    max_concurrency à la fois: une génération n'est soumise qu'une fois un
+    résultat rendu. Si le générateur est fermé avant la fin (client
+    déconnecté), les générations pas encore commencées sont annulées. Le
+    cache des réponses n'est pas utilisé.
+
+    Args:
+        pipeline: QueryPipeline
+        items: Questions validées par parse_batch_items
+        generate: False = recherche seule (chunks retrouvés, sans génération)
+        max_concurrency: Générations simultanées vers le serveur de modèles
+
+    Yields:
+        Un résultat par question, dans l'ordre du lot
+    """
+    retrieved = pipeline.retrieve_batch([item['query'] for item in items])
+
+    def result(item, prompt_info, sources, docs):
+        return {
+            'id': item['id'],
+            'query': item['query'],
+            'sources': sources,
+            'chunks_found': len(docs),
+            'chunks': [
+                {'source': doc.metadata.get('source', 'Inconnu'), 'chunk_id': doc.metadata.get('chunk_id')}
+                for doc in docs
+            ],
+            'prompt': prompt_info
+        }
+
+    if not generate:
+        for item, (_, sources, docs, prompt_info) in zip(items, retrieved):
+            yield result(item, prompt_info, sources, docs)
+        return
+
+    max_concurrency = max(1, max_concurrency)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    queued = iter(zip(items, retrieved))
+    # Générations en cours, dans l'ordre du lot (au plus max_concurrency)
+    in_flight = deque()
+
+    def submit_next():
+        entry = next(queued, None)
+        if entry is not None:
+            in_flight.append((entry, executor.submit(pipeline.llm.invoke, entry[1][0])))
+
+    try:
+        for _ in range(max_concurrency):
+            submit_next()
+        while in_flight:
+            (item, (_, sources, docs, prompt_info)), future = in_flight.popleft()
+            response = result(item, prompt_info, sources, docs)
+            try:
+                response['answer'] = future.result()
+            except Exception as e:
+                response['error'] = f'Erreur: {str(e)}'
+            submit_next()
+            yield response
+    finally:
+        # Lot abandonné: ne pas attendre les générations restantes
+        for _, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_questions(path):
+    """Lit un fichier de questions: une par ligne, en JSON ({"query": ..., "id": ...}) ou en texte brut"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = line
+            queries.append(entry if isinstance(entry, (dict, str)) else line)
+    return queries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Répond à un lot de questions et écrit les résultats en JSONL',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exemples:
+  python batch.py questions.jsonl -o resultats.jsonl       # Questions et réponses
+  python batch.py questions.txt --retrieval-only           # Chunks retrouvés seulement (rappel)
+  python batch.py questions.jsonl --concurrency 8          # 8 générations simultanées
+        """
+    )
+    parser.add_argument('questions', help='Fichier de questions (une par ligne, JSON {"query", "id"} ou texte)')
+    parser.add_argument('-o', '--output', help='Fichier JSONL des résultats (par défaut: sortie standard)')
+    parser.add_argument(
+        '--retrieval-only',
+        action='store_true',
+        help='Recherche seule, sans génération (mesure rapide du rappel)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Générations simultanées vers Ollama (par défaut: batch.max_concurrent_generations)'
+    )
+    args = parser.parse_args()
+
+    # Le module de l'application charge la configuration, le vector store et le pipeline
+    import app as web
+
+    web.start()
+    if not web.wait_until_ready():
+        print(f"❌ Erreur au chargement de l'index: {web.startup['error']}", file=sys.stderr)
+        sys.exit(1)
+    if web.vectorstore is None:
+        print("❌ Vector store non trouvé. Lancez d'abord: python ingest.py", file=sys.stderr)
+        sys.exit(1)
+
+    max_concurrency, _ = get_batch_config(web.config)
+    try:
+        items = parse_batch_items(read_questions(args.questions))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    errors = 0
+    try:
+        for response in run_batch(web.pipeline, items, generate=not args.retrieval_only,
+                                  max_concurrency=args.concurrency or max_concurrency):
+            errors += 'error' in response
+            output.write(json.dumps(response, ensure_ascii=False) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    destination = os.path.abspath(args.output) if args.output else 'sortie standard'
+    print(f"✅ {len(items)} question(s) traitée(s), {errors} erreur(s) -> {destination}", file=sys.stderr)
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de bout en bout: indexation, démarrage et latence des questions.
+
+Le banc d'essai travaille dans un dossier temporaire (corpus synthétique ou
+documents de data/ lus sur place, vector store et cache d'embeddings vides) avec un
+serveur local qui imite Ollama: embeddings déterministes (sac de mots haché)
+et réponses fixes, avec une latence réglable. Les résultats ne dépendent donc
+que du code du projet et de la machine.
+
+Chaque étape tourne dans un processus neuf, ce qui donne son pic de mémoire
+(RSS) et un démarrage à froid:
+- ingest: python ingest.py --reset (chunks/s)
+- startup: import de l'application, dont l'ouverture du vector store
+- query: questions /api/query en parallèle (latences p50/p95/p99)
+
+Les résultats sont ajoutés en une ligne JSON au fichier de sortie, pour
+comparer les exécutions dans le temps.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import multiprocessing
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import yaml
+from quantization import QUANTIZATION_MODES
+
+try:
+    import resource
+except ImportError:
+    # Windows: pas de mesure du pic de mémoire
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = 'benchmark_results.jsonl'
+# Dimension des embeddings du serveur simulé
+DEFAULT_DIMENSION = 256
+STUB_ANSWER = ['Réponse', 'simulée', 'à', 'partir', 'du', 'contexte.']
+WORD_PATTERN = re.compile(r'\w+')
+
+
+# --- Serveur Ollama simulé ---------------------------------------------------
+
+def stub_embedding(text, dimension):
+    """Embedding déterministe d'un texte: sac de mots haché puis normalisé"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = int.from_bytes(hashlib.md5(word.encode('utf-8')).digest()[:8], 'little')
+        vector[digest % dimension] += 1.0 if digest & (1 << 63) else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Routes d'Ollama utilisées par le projet: /api/tags, /api/embed, /api/generate"""
+
+    protocol_version = 'HTTP/1.1'
+    dimension = DEFAULT_DIMENSION
+    # Latence simulée d'une génération (secondes)
+    generate_latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        line = json.dumps(data).encode('utf-8') + b'\n'
+        self.wfile.write(b'%x\r\n' % len(line) + line + b'\r\n')
+        self.wfile.flush()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path.startswith('/api/tags'):
+            self.send_json({'models': []})
+        else:
+            self.send_json({'status': 'Ollama is running'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.path == '/api/embed':
+            texts = request.get('input', [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self.send_json({'model': request.get('model'),
+                            'embeddings': [stub_embedding(text, self.dimension) for text in texts]})
+            return
+
+        if self.path == '/api/generate':
+            if not request.get('stream', True):
+                time.sleep(self.generate_latency)
+                self.send_json({'model': request.get('model'), 'response': ' '.join(STUB_ANSWER), 'done': True})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            # La latence est répartie entre les tokens
+            for word in STUB_ANSWER:
+                time.sleep(self.generate_latency / len(STUB_ANSWER))
+                self.send_chunk({'model': request.get('model'), 'response': word + ' ', 'done': False})
+            self.send_chunk({'model': request.get('model'), 'response': '', 'done': True, 'done_reason': 'stop'})
+            self.wfile.write(b'0\r\n\r\n')
+            return
+
+        self.send_json({'error': 'not found'}, status=404)
+
+
+def serve_stub(port, dimension, generate_latency):
+    """Lance le serveur simulé (exécuté dans un processus séparé)"""
+    StubOllamaHandler.dimension = dimension
+    StubOllamaHandler.generate_latency = generate_latency
+    ThreadingHTTPServer(('127.0.0.1', port), StubOllamaHandler).serve_forever()
+
+
+def start_stub_server(dimension, generate_latency, timeout=10):
+    """
+    Démarre le serveur simulé sur un port libre.
+
+    Returns:
+        Tuple (process, base_url)
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    process = multiprocessing.Process(target=serve_stub, args=(port, dimension, generate_latency), daemon=True)
+    process.start()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            if time.time() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError("Le serveur Ollama simulé n'a pas démarré")
+            time.sleep(0.05)
+
+
+# --- Corpus et espace de travail ---------------------------------------------
+
+def load_vocabulary(data_dir):
+    """Mots des documents texte de data_dir (mots générés si le dossier est vide)"""
+    words = []
+    if os.path.isdir(data_dir):
+        for name in sorted(os.listdir(data_dir)):
+            if name.lower().endswith(('.txt', '.md', '.markdown')):
+                with open(os.path.join(data_dir, name), 'r', encoding='utf-8', errors='ignore') as f:
+                    words.extend(WORD_PATTERN.findall(f.read()))
+    if not words:
+        rng = random.Random(0)
+        syllables = ['ra', 'se', 'ti', 'lo', 'mu', 'ne', 'ka', 'do', 'vi', 'pe', 'ru', 'sa']
+        words = [''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(5000)]
+    return words
+
+
+def generate_corpus(data_dir, vocabulary, files, file_size_kb, seed):
+    """
+    Écrit un corpus synthétique déterministe: paragraphes de mots du vocabulaire.
+
+    Returns:
+        Taille totale du corpus en octets
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    total = 0
+    for index in range(files):
+        paragraphs = []
+        size = 0
+        while size < file_size_kb * 1024:
+            words = rng.choices(vocabulary, k=rng.randint(20, 200))
+            if rng.random() < 0.1:
+                paragraph = '# ' + ' '.join(words[:6])
+            else:
+                paragraph = ' '.join(words) + '.'
+            paragraphs.append(paragraph)
+            size += len(paragraph.encode('utf-8')) + 2
+        with open(os.path.join(data_dir, f'document_{index:04d}.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(paragraphs))
+        total += size
+    return total
+
+
+def generate_queries(vocabulary, count, seed):
+    """Questions toutes différentes (le cache des réponses ne peut pas servir)"""
+    rng = random.Random(seed)
+    return [f"{' '.join(rng.choices(vocabulary, k=rng.randint(3, 8)))} ({index})" for index in range(count)]
+
+
+def corpus_size(data_dir):
+    return sum(entry.stat().st_size for entry in os.scandir(data_dir) if entry.is_file())
+
+
+def prepare_workspace(workspace, base_url, args):
+    """
+    Prépare le dossier de travail: corpus, config.yaml et questions.
+
+    Returns:
+        Dictionnaire décrivant le corpus
+    """
+    with open(os.path.join(REPO_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    source_data = os.path.join(REPO_DIR, 'data')
+    vocabulary = load_vocabulary(source_data)
+    if args.corpus == 'data':
+        data_dir = source_data
+        corpus = {'kind': 'data', 'files': len(os.listdir(data_dir)), 'bytes': corpus_size(data_dir)}
+    else:
+        data_dir = os.path.join(workspace, 'data')
+        corpus = {
+            'kind': 'synthetic',
+            'files': args.files,
+            'bytes': generate_corpus(data_dir, vocabulary, args.files, args.file_size_kb, args.seed),
+            'seed': args.seed
+        }
+
+    vectorstore_dir = os.path.join(workspace, 'vectorstore')
+    config['paths'] = {
+        'data_dir': data_dir,
+        'vectorstore_dir': vectorstore_dir,
+        'urls_file': os.path.join(vectorstore_dir, 'indexed_urls.json'),
+        'sources_file': os.path.join(vectorstore_dir, 'sources.json')
+    }
+    config['models']['base_url'] = base_url
+    # Cache d'embeddings vide: l'indexation calcule tous les embeddings
+    config.setdefault('embeddings', {})['cache_path'] = os.path.join(vectorstore_dir, 'embeddings_cache.sqlite')
+    # Chaque question parcourt tout le pipeline
+    config.setdefault('answer_cache', {})['enabled'] = args.answer_cache
+    config.setdefault('web', {})['debug'] = False
+    if args.shards:
+        config.setdefault('storage', {})['shards'] = args.shards
+    if args.quantization:
+        config.setdefault('storage', {})['quantization'] = args.quantization
+    with open(os.path.join(workspace, 'config.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+
+    with open(os.path.join(workspace, 'queries.json'), 'w', encoding='utf-8') as f:
+        json.dump(generate_queries(vocabulary, args.queries + args.warmup, args.seed), f, ensure_ascii=False)
+    return corpus
+
+
+# --- Étapes (exécutées chacune dans un processus neuf) -----------------------
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant en Mo (None si indisponible)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets sous Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentiles(values):
+    """p50, p95, p99, moyenne et maximum d'une liste de durées (ms)"""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2),
+            'mean_ms': round(values.mean(), 2), 'max_ms': round(values.max(), 2)}
+
+
+def phase_ingest(args):
+    """Indexation complète du corpus (python ingest.py --reset)"""
+    import ingest
+
+    start = time.perf_counter()
+    ingest.ingest_documents(reset=True)
+    seconds = time.perf_counter() - start
+
+    registry = ingest.load_sources_registry(ingest.load_config())
+    chunks = sum(entry.get('chunks', 0) for entry in registry.values())
+    if not chunks:
+        raise RuntimeError("Aucun chunk indexé")
+    return {'chunks': chunks, 'seconds': round(seconds, 3), 'chunks_per_second': round(chunks / seconds, 1)}
+
+
+def phase_startup(args):
+    """Démarrage à froid: import de l'application puis chargement de l'index en arrière-plan"""
+    start = time.perf_counter()
+    import app as web
+    # Le serveur répond (état "warming") dès la fin de l'import
+    import_seconds = time.perf_counter() - start
+    web.start()
+    if not web.wait_until_ready():
+        raise RuntimeError(web.startup['error'])
+    startup = time.perf_counter() - start
+    if web.vectorstore is None:
+        raise RuntimeError("Vector store non trouvé")
+
+    # Nouvelle ouverture dans le même processus: modules déjà importés
+    start = time.perf_counter()
+    web.load_vectorstore()
+    load_seconds = time.perf_counter() - start
+    return {'import_seconds': round(import_seconds, 3), 'startup_seconds': round(startup, 3),
+            'load_vectorstore_seconds': round(load_seconds, 3), 'chunks': len(web.vectorstore.data)}
+
+
+def phase_query(args):
+    """Questions /api/query envoyées par args.concurrency clients simultanés"""
+    import app as web
+    web.start()
+    if not web.wait_until_ready():
+        raise RuntimeError(web.startup['error'])
+
+    with open('queries.json', 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    warmup, queries = queries[:args.warmup], queries[args.warmup:]
+
+    def ask(client, query_text):
+        start = time.perf_counter()
+        response = client.post('/api/query', json={'query': query_text})
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    client = web.app.test_client()
+    for query_text in warmup:
+        ask(client, query_text)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    pending = iter(queries)
+
+    def worker():
+        # Un client Flask par thread, comme des utilisateurs distincts
+        worker_client = web.app.test_client()
+        while True:
+            with lock:
+                query_text = next(pending, None)
+            if query_text is None:
+                return
+            latency, status = ask(worker_client, query_text)
+            with lock:
+                (latencies if status == 200 else errors).append(latency)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    result = {'queries': len(queries), 'concurrency': args.concurrency, 'errors': len(errors),
+              'seconds': round(seconds, 3), 'queries_per_second': round(len(queries) / seconds, 1)}
+    result.update(percentiles(latencies))
+    return result
+
+
+PHASES = {'ingest': phase_ingest, 'startup': phase_startup, 'query': phase_query}
+
+
+def run_phase_in_process(args):
+    """Point d'entrée d'un processus d'étape: résultat en JSON sur la sortie standard"""
+    sys.path.insert(0, REPO_DIR)
+    # Les messages du projet vont sur la sortie d'erreur, la sortie standard ne contient que le résultat
+    with contextlib.redirect_stdout(sys.stderr):
+        result = PHASES[args.phase](args)
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def run_phase(phase, workspace, args, base_url):
+    """Lance une étape dans un processus neuf et retourne son résultat"""
+    command = [sys.executable, os.path.abspath(__file__), '--phase', phase,
+               '--concurrency', str(args.concurrency), '--warmup', str(args.warmup)]
+    env = dict(os.environ, OLLAMA_HOST=base_url, PYTHONPATH=os.pathsep.join(
+        filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    env['PYTHONWARNINGS'] = 'ignore'
+    completed = subprocess.run(command, cwd=workspace, env=env, capture_output=True, text=True,
+                               encoding='utf-8')
+    if args.verbose or completed.returncode:
+        sys.stderr.write(completed.stderr)
+    if completed.returncode:
+        raise RuntimeError(f"L'étape {phase} a échoué (code {completed.returncode})")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    """Exécute toutes les étapes et retourne le résultat complet"""
+    stub, base_url = start_stub_server(args.dimension, args.generate_latency_ms / 1000)
+    workspace = args.workspace or tempfile.mkdtemp(prefix='rag-benchmark-')
+    os.makedirs(workspace, exist_ok=True)
+    try:
+        corpus = prepare_workspace(workspace, base_url, args)
+        print(f"📂 Espace de travail: {workspace} ({corpus['files']} fichier(s), "
+              f"{corpus['bytes'] / 1024 / 1024:.1f} Mo)", file=sys.stderr)
+
+        results = {}
+        for phase in ('ingest', 'startup', 'query'):
+            print(f"⏱️  Étape {phase}...", file=sys.stderr)
+            results[phase] = run_phase(phase, workspace, args, base_url)
+    finally:
+        stub.terminate()
+        if not args.keep and not args.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {
+            'corpus': corpus,
+            'dimension': args.dimension,
+            'generate_latency_ms': args.generate_latency_ms,
+            'queries': args.queries,
+            'concurrency': args.concurrency,
+            'answer_cache': args.answer_cache,
+            'shards': args.shards,
+            'quantization': args.quantization
+        },
+        **results
+    }
+
+
+def print_summary(result):
+    ingest, startup, query = result['ingest'], result['startup'], result['query']
+    print(f"📥 Indexation: {ingest['chunks']} chunks en {ingest['seconds']}s "
+          f"({ingest['chunks_per_second']} chunks/s, pic {ingest['peak_rss_mb']} Mo)", file=sys.stderr)
+    print(f"🚀 Démarrage: prêt en {startup['startup_seconds']}s (import {startup['import_seconds']}s, "
+          f"load_vectorstore {startup['load_vectorstore_seconds']}s, "
+          f"pic {startup['peak_rss_mb']} Mo)", file=sys.stderr)
+    print(f"💬 Questions: {query['queries']} à {query['concurrency']} en parallèle, {query['queries_per_second']} q/s, "
+          f"p50 {query.get('p50_ms')} ms, p95 {query.get('p95_ms')} ms, p99 {query.get('p99_ms')} ms, "
+          f"{query['errors']} erreur(s), pic {query['peak_rss_mb']} Mo", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Mesure l'indexation, le démarrage et la latence des questions avec un serveur Ollama simulé",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exemples:
+  python benchmark.py                                  # Corpus synthétique par défaut
+  python benchmark.py --files 200 --file-size-kb 256   # Corpus synthétique de 50 Mo
+  python benchmark.py --corpus data --concurrency 16   # Documents de data/, 16 clients
+  python benchmark.py --generate-latency-ms 500 -o resultats.jsonl
+        """
+    )
+    parser.add_argument('--corpus', choices=['synthetic', 'data'], default='synthetic',
+                        help='Corpus synthétique (par défaut) ou documents du dossier data/')
+    parser.add_argument('--files', type=int, default=20, help='Corpus synthétique: nombre de fichiers')
+    parser.add_argument('--file-size-kb', type=int, default=128, help='Corpus synthétique: taille de chaque fichier (Ko)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine du corpus et des questions')
+    parser.add_argument('--queries', type=int, default=200, help='Nombre de questions mesurées')
+    parser.add_argument('--warmup', type=int, default=5, help='Questions envoyées avant la mesure')
+    parser.add_argument('--concurrency', type=int, default=4, help='Clients simultanés')
+    parser.add_argument('--dimension', type=int, default=DEFAULT_DIMENSION, help='Dimension des embeddings simulés')
+    parser.add_argument('--generate-latency-ms', type=float, default=0.0,
+                        help='Latence simulée de chaque génération (ms)')
+    parser.add_argument('--answer-cache', action='store_true', help='Garder le cache des réponses actif')
+    parser.add_argument('--shards', type=int, help='Nombre de shards du vector store (par défaut: storage.shards)')
+    parser.add_argument('--quantization', choices=QUANTIZATION_MODES,
+                        help='Quantification des embeddings (par défaut: storage.quantization)')
+    parser.add_argument('--workspace', help='Dossier de travail (par défaut: dossier temporaire supprimé à la fin)')
+    parser.add_argument('--keep', action='store_true', help='Ne pas supprimer le dossier de travail temporaire')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help=f'Fichier JSONL auquel ajouter le résultat (par défaut: {DEFAULT_OUTPUT})')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Afficher les messages de chaque étape')
+    parser.add_argument('--phase', choices=sorted(PHASES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase_in_process(args)
+        sys.exit(0)
+
+    try:
+        result = run_benchmark(args)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    print_summary(result)
+    print(f"✅ Résultat ajouté à {os.path.abspath(args.output)}", file=sys.stderr)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Assemblage du contexte du prompt: fusion des chunks voisins, doublons et budget de tokens"""
+
+import re
+
+# Estimation du nombre de tokens (pas de tokenizer local): ~4 caractères par token
+CHARS_PER_TOKEN = 4
+# Chevauchement minimum (caractères) pour considérer deux chunks comme voisins
+MIN_OVERLAP_CHARS = 32
+# Similarité (Jaccard des 3-grammes de mots) au-delà de laquelle un passage est un doublon
+DEFAULT_DUPLICATE_THRESHOLD = 0.8
+# Un passage coupé par le budget doit garder au moins ce nombre de tokens
+MIN_TRUNCATED_TOKENS = 32
+SEPARATOR = "\n\n"
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def estimate_tokens(text):
+    """Nombre de tokens estimé d'un texte"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def overlap_length(left, right, max_overlap):
+    """
+    Longueur du plus long suffixe de left qui est aussi un préfixe de right.
+
+    Returns:
+        Nombre de caractères communs (0 si le chevauchement est plus court que MIN_OVERLAP_CHARS)
+    """
+    limit = min(len(left), len(right), max_overlap)
+    if limit < MIN_OVERLAP_CHARS:
+        return 0
+    head = right[:MIN_OVERLAP_CHARS]
+    # La première occurrence dans la fin de left donne le chevauchement le plus long
+    position = left.find(head, len(left) - limit)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(head, position + 1)
+    return 0
+
+
+def _shingles(text):
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+class Passage:
+    """Texte inséré dans le contexte: un chunk ou plusieurs chunks voisins fusionnés"""
+
+    def __init__(self, text, metadata, rank):
+        self.text = text
+        self.metadata = metadata
+        # Meilleur rang de recherche parmi les chunks du passage
+        self.rank = rank
+        self.chunks = 1
+
+
+def _merge_neighbours(passages, max_overlap):
+    """
+    Fusionne les passages d'une même source dont la fin de l'un est le début de l'autre.
+
+    Le plus long chevauchement est fusionné en premier: un passage répétitif
+    ne peut pas capter un voisin qui n'est pas le sien.
+    """
+    merged = 0
+    while True:
+        best = None
+        for left in passages:
+            for right in passages:
+                if right is left or right.metadata.get('source') != left.metadata.get('source'):
+                    continue
+                length = overlap_length(left.text, right.text, max_overlap)
+                if length and (best is None or length > best[0]):
+                    best = (length, left, right)
+        if best is None:
+            return merged
+        length, left, right = best
+        left.text += right.text[length:]
+        left.rank = min(left.rank, right.rank)
+        left.chunks += right.chunks
+        passages.remove(right)
+        merged += 1
+
+
+def _remove_duplicates(passages, threshold):
+    """Retire les passages contenus dans un passage mieux classé ou trop semblables à lui"""
+    kept = []
+    kept_shingles = []
+    for passage in passages:
+        normalized = ' '.join(passage.text.split())
+        shingles = _shingles(normalized)
+        duplicate = False
+        for other, other_shingles in zip(kept, kept_shingles):
+            if normalized in ' '.join(other.text.split()):
+                duplicate = True
+            elif threshold < 1.0:
+                union = len(shingles | other_shingles)
+                duplicate = union > 0 and len(shingles & other_shingles) / union >= threshold
+            if duplicate:
+                break
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _truncate(text, max_chars):
+    """Coupe un texte à max_chars caractères, si possible à la fin d'un mot"""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip()
+
+
+def pack_context(docs, max_tokens, reserved_tokens=0, max_overlap=None, merge=True,
+                 duplicate_threshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """
+    Assemble les chunks trouvés en passages qui tiennent dans le budget de tokens.
+
+    Args:
+        docs: Chunks triés du plus pertinent au moins pertinent
+        max_tokens: Budget de tokens du prompt (None ou 0 = illimité)
+        reserved_tokens: Tokens déjà utilisés par le reste du prompt (consignes, question)
+        max_overlap: Chevauchement maximum entre deux chunks voisins (None = longueur des chunks)
+        merge: Fusionner les chunks voisins qui se chevauchent
+        duplicate_threshold: Similarité à partir de laquelle un passage est ignoré (1 = doublons exacts uniquement)
+
+    Returns:
+        Tuple (passages, report); report décrit les fusions, doublons et coupes effectués
+    """
+    passages = [Passage(doc.page_content, doc.metadata, rank) for rank, doc in enumerate(docs)]
+    if max_overlap is None:
+        max_overlap = max((len(passage.text) for passage in passages), default=0)
+
+    merged = _merge_neighbours(passages, max_overlap) if merge else 0
+    passages.sort(key=lambda passage: passage.rank)
+    unique = _remove_duplicates(passages, duplicate_threshold)
+
+    budget = max_tokens - reserved_tokens if max_tokens else None
+    packed = []
+    used = 0
+    truncated = False
+    for passage in unique:
+        tokens = estimate_tokens(passage.text) + (estimate_tokens(SEPARATOR) if packed else 0)
+        if budget is None or used + tokens <= budget:
+            packed.append(passage)
+            used += tokens
+            continue
+        remaining = budget - used - (estimate_tokens(SEPARATOR) if packed else 0)
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            passage.text = _truncate(passage.text, remaining * CHARS_PER_TOKEN)
+            used += estimate_tokens(passage.text) + (estimate_tokens(SEPARATOR) if packed else 0)
+            packed.append(passage)
+            truncated = True
+        break
+
+    report = {
+        'chunks': len(docs),
+        'passages': len(packed),
+        'chunks_merged': merged,
+        'duplicates_removed': len(passages) - len(unique),
+        'chunks_dropped': len(unique) - len(packed),
+        'truncated': truncated,
+        'context_tokens': used
+    }
+    return packed, report
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Client d'embedding par lots, parallèle, avec cache persistant"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+from metrics import EMBEDDING_CACHE_LOOKUPS
+
+# Valeurs par défaut (surchargées par la section embeddings de config.yaml)
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_CONCURRENCY = 4
+# Nombre maximum de paramètres par requête SQLite
+SQLITE_LOOKUP_CHUNK = 500
+
+
+def get_embeddings(config):
+    """
+    Crée le client d'embedding configuré (Ollama + lots + cache).
+
+    Args:
+        config: Configuration
+
+    Returns:
+        Instance de CachedEmbeddings
+    """
+    model = config['models']['embedding_model']
+    embeddings_config = config.get('embeddings', {})
+
+    ollama_kwargs = {'model': model}
+    if config['models'].get('base_url'):
+        ollama_kwargs['base_url'] = config['models']['base_url']
+
+    return CachedEmbeddings(
+        OllamaEmbeddings(**ollama_kwargs),
+        model,
+        batch_size=embeddings_config.get('batch_size', DEFAULT_BATCH_SIZE),
+        max_concurrency=embeddings_config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+        cache_path=embeddings_config.get('cache_path') or None
+    )
+
+
+def text_hash(text):
+    """Hash d'un texte utilisé comme clé du cache"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache persistant des embeddings (SQLite), indexé par (modèle, hash du texte)"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, '
+            'PRIMARY KEY (model, text_hash)) WITHOUT ROWID'
+        )
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        """Retourne {hash: vecteur} pour les hashes présents dans le cache"""
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            for i in range(0, len(hashes), SQLITE_LOOKUP_CHUNK):
+                chunk = hashes[i:i + SQLITE_LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})',
+                    [model] + chunk
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        """Enregistre des vecteurs ({hash: vecteur})"""
+        if not items:
+            return
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings envoyés par lots, avec plusieurs requêtes en parallèle.
+
+    Les textes déjà embeddés avec le même modèle sont lus depuis le cache et
+    n'appellent jamais le modèle.
+    """
+
+    def __init__(self, embeddings, model, batch_size=DEFAULT_BATCH_SIZE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, cache_path=None):
+        self._embeddings = embeddings
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self._cache = EmbeddingCache(cache_path) if cache_path else None
+        self._stats_lock = threading.Lock()
+        self.stats = {'texts': 0, 'cache_hits': 0, 'computed': 0, 'seconds': 0.0}
+
+    def embed_documents(self, texts, progress=None):
+        """
+        Calcule les embeddings de plusieurs textes.
+
+        Args:
+            texts: Textes à embedder
+            progress: Fonction appelée avec (textes traités, total) après chaque lot
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        start = time.perf_counter()
+
+        hashes = [text_hash(text) for text in texts]
+        vectors = self._cache.get_many(self.model, set(hashes)) if self._cache else {}
+        cache_hits = sum(1 for key in hashes if key in vectors)
+        if progress is not None:
+            progress(cache_hits, len(texts))
+
+        # Textes à calculer (uniques), envoyés par lots en parallèle
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        missing_keys = list(missing)
+        batches = [
+            missing_keys[i:i + self.batch_size]
+            for i in range(0, len(missing_keys), self.batch_size)
+        ]
+
+        computed = {}
+        if batches:
+            def embed_batch(batch_keys):
+                return self._embeddings.embed_documents([missing[key] for key in batch_keys])
+
+            occurrences = Counter(hashes)
+            done = cache_hits
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                for batch_keys, batch_vectors in zip(batches, executor.map(embed_batch, batches)):
+                    computed.update(zip(batch_keys, batch_vectors))
+                    if progress is not None:
+                        done += sum(occurrences[key] for key in batch_keys)
+                        progress(done, len(texts))
+
+            if self._cache:
+                self._cache.put_many(self.model, computed)
+            vectors.update(computed)
+
+        if self._cache:
+            EMBEDDING_CACHE_LOOKUPS.inc(cache_hits, kind='document', result='hit')
+            EMBEDDING_CACHE_LOOKUPS.inc(len(texts) - cache_hits, kind='document', result='miss')
+        with self._stats_lock:
+            self.stats['texts'] += len(texts)
+            self.stats['cache_hits'] += cache_hits
+            self.stats['computed'] += len(computed)
+            self.stats['seconds'] += time.perf_counter() - start
+
+        return [vectors[key] for key in hashes]
+
+    def embed_query(self, text):
+        # Les questions ont leur propre espace de clés (certains modèles les préfixent)
+        key = text_hash(text)
+        model_key = self.model + ':query'
+        if self._cache:
+            found = self._cache.get_many(model_key, [key])
+            if key in found:
+                EMBEDDING_CACHE_LOOKUPS.inc(kind='query', result='hit')
+                return found[key]
+            EMBEDDING_CACHE_LOOKUPS.inc(kind='query', result='miss')
+        vector = self._embeddings.embed_query(text)
+        if self._cache:
+            self._cache.put_many(model_key, {key: vector})
+        return vector
+
+    def throughput_report(self):
+        """Résumé du débit d'embedding depuis la création du client"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        rate = stats['texts'] / stats['seconds'] if stats['seconds'] else 0.0
+        return (
+            f"{stats['texts']} chunks embeddés en {stats['seconds']:.1f}s "
+            f"({rate:.1f} chunks/s, {stats['cache_hits']} depuis le cache, "
+            f"{stats['computed']} calculés)"
+        )
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Téléchargement concurrent de pages web pour l'indexation"""
+
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+
+# Valeurs par défaut (surchargées par la section web_loader de config.yaml)
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_PER_HOST_RATE = 2.0
+
+
+class HostRateLimiter:
+    """Limite le nombre de requêtes par seconde vers un même hôte"""
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """Bloque jusqu'à ce qu'une requête vers l'hôte de l'URL soit autorisée"""
+        if not self._interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(user_agent, pool_size=DEFAULT_MAX_WORKERS, retries=DEFAULT_RETRIES,
+                   backoff_factor=DEFAULT_BACKOFF_FACTOR):
+    """
+    Crée une session HTTP avec un pool de connexions keep-alive et des tentatives automatiques.
+
+    Args:
+        user_agent: User-Agent envoyé avec chaque requête
+        pool_size: Nombre de connexions conservées par hôte
+        retries: Nombre de nouvelles tentatives (erreurs réseau, 429 et 5xx)
+        backoff_factor: Facteur d'attente exponentielle entre deux tentatives
+
+    Returns:
+        Session requests
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET', 'HEAD'],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.headers['User-Agent'] = user_agent
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def declared_charset(response):
+    """
+    Charset annoncé par l'en-tête Content-Type (None s'il n'y en a pas).
+
+    Sans charset explicite, requests suppose ISO-8859-1 pour text/html: ce
+    choix par défaut ne doit pas être imposé au décodage de la page.
+    """
+    for param in response.headers.get('Content-Type', '').split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def fetch_web_document(url, session, previous=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Télécharge une page web avec une requête conditionnelle.
+
+    Les en-têtes ETag/Last-Modified de la dernière indexation sont renvoyés au
+    serveur; une réponse 304 ou un contenu identique (même sha256) signifie que
+    la page n'a pas changé.
+
+    Args:
+        url: URL de la page
+        session: Session requests utilisée pour la requête
+        previous: Empreinte enregistrée lors de la dernière indexation
+        timeout: Délai maximum (secondes) pour la connexion et la lecture
+
+    Returns:
+        Tuple (documents, fingerprint, changed)
+    """
+    headers = {}
+    if previous:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and previous:
+        return [], previous, False
+    response.raise_for_status()
+
+    fingerprint = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'sha256': hashlib.sha256(response.content).hexdigest()
+    }
+    if previous and previous.get('sha256') == fingerprint['sha256']:
+        return [], fingerprint, False
+
+    # Extraction du texte comme WebBaseLoader; sans charset dans l'en-tête, BeautifulSoup
+    # détecte l'encodage (<meta charset>, puis analyse des octets)
+    soup = BeautifulSoup(response.content, 'html.parser', from_encoding=declared_charset(response))
+    metadata = {'source': url, 'type': 'web'}
+    if soup.find('title'):
+        metadata['title'] = soup.find('title').get_text()
+    description = soup.find('meta', attrs={'name': 'description'})
+    if description:
+        metadata['description'] = description.get('content', 'No description found.')
+    if soup.find('html'):
+        metadata['language'] = soup.find('html').get('lang', 'No language found.')
+
+    return [Document(page_content=soup.get_text(), metadata=metadata)], fingerprint, True
+
+
+def fetch_urls(urls, previous_fingerprints=None, user_agent='RAG-Documentation/1.0',
+               max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+               backoff_factor=DEFAULT_BACKOFF_FACTOR, per_host_rate=DEFAULT_PER_HOST_RATE,
+               session=None, on_result=None):
+    """
+    Télécharge plusieurs URLs en parallèle.
+
+    Une erreur sur une URL n'interrompt pas les autres: chaque résultat porte
+    sa propre erreur.
+
+    Args:
+        urls: Liste d'URLs
+        previous_fingerprints: Empreintes de la dernière indexation ({url: empreinte})
+        user_agent: User-Agent envoyé avec chaque requête
+        max_workers: Nombre maximum de téléchargements simultanés
+        timeout: Délai maximum (secondes) par requête
+        retries: Nombre de nouvelles tentatives par requête
+        backoff_factor: Facteur d'attente exponentielle entre deux tentatives
+        per_host_rate: Requêtes par seconde maximum vers un même hôte (0 = illimité)
+        session: Session requests à utiliser (par défaut, une session dédiée est créée)
+        on_result: Fonction appelée avec (url, résultat) à la fin de chaque téléchargement
+
+    Returns:
+        Dictionnaire {url: (documents, fingerprint, changed, error)} dans l'ordre des URLs;
+        error vaut None si le téléchargement a réussi
+    """
+    previous_fingerprints = previous_fingerprints or {}
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    own_session = session is None
+    if own_session:
+        session = create_session(user_agent, pool_size=max_workers, retries=retries,
+                                 backoff_factor=backoff_factor)
+    limiter = HostRateLimiter(per_host_rate)
+
+    def fetch_one(url):
+        try:
+            limiter.wait(url)
+            documents, fingerprint, changed = fetch_web_document(
+                url, session, previous_fingerprints.get(url), timeout=timeout
+            )
+            result = (documents, fingerprint, changed, None)
+        except Exception as e:
+            result = ([], None, False, str(e))
+        if on_result is not None:
+            on_result(url, result)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+            results = list(executor.map(fetch_one, urls))
+    finally:
+        if own_session:
+            session.close()
+
+    return dict(zip(urls, results))
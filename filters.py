@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Filtres de recherche sur les metadatas des chunks (source, type, date d'indexation)"""
+
+from datetime import datetime
+from functools import lru_cache
+
+FILTER_KEYS = ('source', 'type', 'indexed_after', 'indexed_before')
+
+
+@lru_cache(maxsize=65536)
+def _parse_date(value):
+    """Date ISO 8601 en datetime local naïf (None si absente ou invalide)"""
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+
+def _as_set(value, name):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {value}
+    if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+        return set(value)
+    raise ValueError(f"Filtre '{name}': une chaîne ou une liste de chaînes est attendue")
+
+
+class MetadataFilter:
+    """
+    Restriction d'une recherche à une partie des chunks.
+
+    Un chunk est retenu si sa source et son type font partie des valeurs
+    demandées et si sa date d'indexation (metadata indexed_at) est dans
+    l'intervalle [indexed_after, indexed_before[.
+    """
+
+    def __init__(self, sources=None, types=None, indexed_after=None, indexed_before=None):
+        self.sources = sources
+        self.types = types
+        self.indexed_after = indexed_after
+        self.indexed_before = indexed_before
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Crée un filtre à partir du champ "filters" d'une requête.
+
+        Returns:
+            Instance de MetadataFilter, ou None si aucun filtre n'est demandé
+
+        Raises:
+            ValueError: Si le filtre est invalide (message destiné à l'utilisateur)
+        """
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("Le champ 'filters' doit être un objet")
+        unknown = sorted(set(data) - set(FILTER_KEYS))
+        if unknown:
+            raise ValueError(f"Filtres inconnus: {', '.join(unknown)} (acceptés: {', '.join(FILTER_KEYS)})")
+
+        dates = {}
+        for name in ('indexed_after', 'indexed_before'):
+            value = data.get(name)
+            if value is None:
+                continue
+            dates[name] = _parse_date(value) if isinstance(value, str) else None
+            if dates[name] is None:
+                raise ValueError(f"Filtre '{name}': date ISO 8601 attendue (ex. 2024-05-31 ou 2024-05-31T12:00:00)")
+
+        return cls(_as_set(data.get('source'), 'source'), _as_set(data.get('type'), 'type'),
+                   dates.get('indexed_after'), dates.get('indexed_before'))
+
+    def matches(self, source, chunk_type, indexed_at):
+        """Indique si un chunk (ou une partition) de ces metadatas est retenu"""
+        if self.sources is not None and source not in self.sources:
+            return False
+        if self.types is not None and chunk_type not in self.types:
+            return False
+        if self.indexed_after is not None or self.indexed_before is not None:
+            # Les chunks sans date d'indexation sont exclus d'un filtre par date
+            date = _parse_date(indexed_at)
+            if date is None:
+                return False
+            if self.indexed_after is not None and date < self.indexed_after:
+                return False
+            if self.indexed_before is not None and date >= self.indexed_before:
+                return False
+        return True
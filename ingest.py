@@ -7,8 +7,13 @@ import sys
 import yaml
 import argparse
 import json
+import hashlib
+import re
+import time
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 
 # Forcer l'encodage UTF-8 pour la console Windows
 if sys.platform == 'win32':
@@ -19,11 +24,25 @@ if sys.platform == 'win32':
 if 'USER_AGENT' not in os.environ:
     os.environ['USER_AGENT'] = 'RAG-Documentation/1.0'
 
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader, WebBaseLoader
+from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import SKLearnVectorStore
-from langchain_ollama import OllamaEmbeddings
-import pickle
+from langchain_core.documents import Document
+from embedder import get_embeddings
+from metrics import CHUNKS_INDEXED, INGEST_STAGE_SECONDS, Timings
+from fetcher import fetch_urls
+from ann import train_ivf, assign_ivf, default_nlist
+from store import (DEFAULT_RERANK_CANDIDATES, get_store_path, get_store_dtype, get_store_quantization, store_exists,
+                   save_store, read_store, append_to_store, remove_store, load_ivf_centroids, quantization_outdated,
+                   normalize_rows, LocalVectorStore)
+from shards import (SHARD_DIRNAME, get_shard_count, shard_of, shard_paths, read_shard_count, create_shards,
+                    new_layout, publish_layout, load_shards, ShardedVectorStore)
+
+# Valeurs par défaut de la section ingestion de config.yaml
+DEFAULT_STREAM_THRESHOLD_MB = 16
+DEFAULT_READ_WINDOW = 1024 * 1024
+DEFAULT_WRITE_BATCH = 2048
+# Formats lus en flux: fenêtres de texte, ou page par page pour les PDF
+STREAMED_EXTENSIONS = ('.pdf', '.txt', '.md', '.markdown')
 
 def load_config():
     """Charge la configuration depuis config.yaml"""
@@ -45,14 +64,53 @@ def get_document_loader(file_path):
     else:
         raise ValueError(f"Format non supporté: {ext}")
 
-def load_and_index_documents(documents_to_index, config=None, reset=False):
+def split_documents(documents, chunk_size, chunk_overlap):
+    """
+    Découpe des documents en chunks et retire les doublons (même source, même contenu).
+    
+    Args:
+        documents: Liste de documents LangChain
+        chunk_size: Taille des chunks en caractères
+        chunk_overlap: Chevauchement entre chunks
+    
+    Returns:
+        Liste de chunks (documents LangChain avec metadata['chunk_id'])
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    
+    splits = []
+    seen_chunk_ids = set()
+    for doc in text_splitter.split_documents(documents):
+        chunk_id = get_chunk_id(doc.metadata.get('source', ''), doc.page_content)
+        if chunk_id in seen_chunk_ids:
+            continue
+        seen_chunk_ids.add(chunk_id)
+        doc.metadata['chunk_id'] = chunk_id
+        splits.append(doc)
+    return splits
+
+def load_and_index_documents(documents_to_index, config=None, reset=False, fingerprints=None, deleted_sources=None,
+                             progress=None, timings=None):
     """
     Charge et indexe une liste de documents.
     
+    L'indexation est incrémentale: seuls les nouveaux chunks sont embeddés
+    et ajoutés au vector store, sans relire ni réembedder l'existant.
+    Les chunks déjà indexés pour les sources des documents fournis sont
+    remplacés, ce qui évite tout doublon en cas de réindexation.
+    
     Args:
         documents_to_index: Liste de documents LangChain à indexer
         config: Configuration (si None, charge depuis config.yaml)
         reset: Si True, supprime le vector store existant avant d'indexer
+        fingerprints: Empreintes des sources indexées ({source: empreinte}),
+            enregistrées dans le registre des sources après indexation
+        deleted_sources: Sources supprimées dont les chunks doivent être purgés
+        progress: Fonction appelée avec l'étape et les compteurs de l'indexation (voir index_chunks)
+        timings: Timings de l'indexation (étapes split, embed et write)
     
     Returns:
         Tuple (documents_list, metadatas_list) pour sauvegarde
@@ -60,77 +118,606 @@ def load_and_index_documents(documents_to_index, config=None, reset=False):
     if config is None:
         config = load_config()
     
-    vectorstore_dir = config['paths']['vectorstore_dir']
-    
-    # Créer le dossier vectorstore s'il n'existe pas
-    os.makedirs(vectorstore_dir, exist_ok=True)
-    
-    # Paramètres de chunking
-    chunk_size = config['chunking']['chunk_size']
-    chunk_overlap = config['chunking']['chunk_overlap']
-    
-    # Initialiser le text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    
-    if not documents_to_index:
+    if not documents_to_index and not deleted_sources:
         return [], []
     
+    timings = timings or Timings(INGEST_STAGE_SECONDS)
+    
     # Découper en chunks
-    splits = text_splitter.split_documents(documents_to_index)
+    if progress is not None:
+        progress(stage='splitting')
+    with timings.span('split'):
+        splits = split_documents(
+            documents_to_index,
+            config['chunking']['chunk_size'],
+            config['chunking']['chunk_overlap']
+        )
     
-    # Créer les embeddings avec Ollama
-    embeddings = OllamaEmbeddings(model=config['models']['embedding_model'])
+    result = index_chunks(splits, config, reset=reset, fingerprints=fingerprints,
+                          deleted_sources=deleted_sources, progress=progress, timings=timings)
+    print(f"⏱️  Étapes: {timings.summary()}")
+    return result
+
+def index_chunks(splits, config, chunk_embeddings=None, reset=False, fingerprints=None, deleted_sources=None,
+                 progress=None, timings=None):
+    """
+    Embedde des chunks et les ajoute au vector store.
     
-    # Charger le vector store existant s'il existe (sauf si reset)
-    vectorstore_path = os.path.join(vectorstore_dir, "vectorstore.pkl")
-    existing_documents = []
-    existing_metadatas = []
+    Args:
+        splits: Liste de chunks (documents LangChain)
+        config: Configuration
+        chunk_embeddings: Embeddings déjà calculés pour les chunks (None = à calculer)
+        reset: Si True, supprime le vector store existant avant d'indexer
+        fingerprints: Empreintes des sources indexées ({source: empreinte})
+        deleted_sources: Sources supprimées dont les chunks doivent être purgés
+        progress: Fonction appelée avec stage ('embedding' puis 'writing') et les
+            compteurs chunks_total / chunks_embedded
+        timings: Timings de l'indexation (étapes embed et write)
     
+    Returns:
+        Tuple (documents_list, metadatas_list) des chunks ajoutés
+    """
+    timings = timings or Timings(INGEST_STAGE_SECONDS)
     if reset:
         # Supprimer le vector store existant
-        if os.path.exists(vectorstore_path):
-            os.remove(vectorstore_path)
+        if reset_vectorstore(config):
             print("🗑️  Vector store existant supprimé (reset)")
-    elif os.path.exists(vectorstore_path):
-        with open(vectorstore_path, 'rb') as f:
-            save_data = pickle.load(f)
-            existing_documents = save_data.get('documents', [])
-            existing_metadatas = save_data.get('metadatas', [])
     
-    # Ajouter les nouveaux documents
+    # Seuls les nouveaux chunks sont embeddés puis ajoutés au vector store existant
     new_documents = [doc.page_content for doc in splits]
     new_metadatas = [doc.metadata for doc in splits]
+    if chunk_embeddings is None:
+        chunk_embeddings = []
+        if new_documents:
+            # Embeddings par lots avec Ollama (les textes déjà connus viennent du cache)
+            embeddings = get_embeddings(config)
+            embed_progress = None
+            if progress is not None:
+                progress(stage='embedding', chunks_total=len(new_documents), chunks_embedded=0)
+                embed_progress = lambda done, total: progress(chunks_embedded=done)
+            with timings.span('embed'):
+                chunk_embeddings = embeddings.embed_documents(new_documents, progress=embed_progress)
+            print(f"⚡ {embeddings.throughput_report()}")
+    
+    if progress is not None:
+        progress(stage='writing', chunks_total=len(new_documents), chunks_embedded=len(new_documents))
+    
+    # Un seul enregistrement dans le journal pour tous les chunks
+    writer = ChunkWriter(config, deleted_sources=deleted_sources, batch_size=0, timings=timings)
+    writer.add(splits, chunk_embeddings)
+    writer.finish(fingerprints)
+    
+    return new_documents, new_metadatas
+
+class ChunkWriter:
+    """
+    Écrit des chunks embeddés dans le vector store, par lots.
+    
+    Chaque lot est ajouté au journal dès qu'il atteint batch_size chunks: la
+    mémoire utilisée dépend de la taille d'un lot et du nombre de sources
+    (un compteur de chunks par source), pas du nombre de chunks indexés.
+    Les anciens chunks d'une source sont supprimés avec son premier lot, les
+    lots suivants de la même source s'y ajoutent. Dans un vector store
+    partitionné, chaque lot n'est écrit que dans les shards de ses sources.
+    """
+    
+    def __init__(self, config, deleted_sources=None, batch_size=None, timings=None):
+        """
+        Args:
+            config: Configuration
+            deleted_sources: Sources supprimées dont les chunks doivent être purgés
+            batch_size: Chunks par enregistrement du journal (None = ingestion.write_batch,
+                0 = un seul enregistrement à la fin)
+            timings: Timings de l'indexation (étape write)
+        """
+        self.config = config
+        self.timings = timings or Timings(INGEST_STAGE_SECONDS)
+        self.path = get_store_path(config)
+        self.embedding_model = config['models']['embedding_model']
+        self.dtype = get_store_dtype(config)
+        self.quantization = get_store_quantization(config)
+        if batch_size is None:
+            batch_size = config.get('ingestion', {}).get('write_batch', DEFAULT_WRITE_BATCH)
+        self.batch_size = batch_size
+        self.deleted_sources = set(deleted_sources or [])
+        # Date d'indexation de chaque chunk (filtres indexed_after / indexed_before des requêtes)
+        self.indexed_at = datetime.now().isoformat()
+        self.chunks_per_source = {}
+        self.written_sources = set()
+        # Shards modifiés (leurs codes quantifiés sont mis à jour par finish)
+        self.written_shards = set()
+        self.purged = False
+        self.texts = []
+        self.metadatas = []
+        self.embeddings = []
+        
+        os.makedirs(config['paths']['vectorstore_dir'], exist_ok=True)
+        # Un nouveau vector store est partitionné selon storage.shards
+        shard_count = get_shard_count(config)
+        if shard_count > 1 and not store_exists(self.path):
+            create_shards(self.path, shard_count)
+        self.shard_paths = shard_paths(self.path)
+        if len(self.shard_paths) != shard_count:
+            print(f"⚠️  storage.shards vaut {shard_count} mais le vector store en a {len(self.shard_paths)}: "
+                  f"lancez python ingest.py --reshard pour le répartir")
+        # Affecter les nouveaux chunks aux clusters de l'index IVF de leur shard s'il existe
+        self.centroids = [load_ivf_centroids(path, self.embedding_model) for path in self.shard_paths]
     
-    # Combiner avec les documents existants
-    all_documents = existing_documents + new_documents
-    all_metadatas = existing_metadatas + new_metadatas
+    def add(self, splits, chunk_embeddings):
+        """Ajoute des chunks et leurs embeddings; écrit un lot s'il est complet"""
+        for doc, embedding in zip(splits, chunk_embeddings):
+            doc.metadata['indexed_at'] = self.indexed_at
+            source = doc.metadata.get('source')
+            self.chunks_per_source[source] = self.chunks_per_source.get(source, 0) + 1
+            self.texts.append(doc.page_content)
+            self.metadatas.append(doc.metadata)
+            self.embeddings.append(embedding)
+        if self.batch_size and len(self.texts) >= self.batch_size:
+            self.flush()
     
-    # Recréer tous les documents pour le vector store
-    from langchain_core.documents import Document
-    all_doc_objects = [
-        Document(page_content=doc, metadata=meta)
-        for doc, meta in zip(all_documents, all_metadatas)
+    def flush(self):
+        """Écrit les chunks en attente dans le journal du vector store"""
+        # Les anciens chunks des sources réindexées ou supprimées sont remplacés
+        replaced_sources = {meta.get('source') for meta in self.metadatas} - self.written_sources
+        if not self.purged:
+            replaced_sources |= self.deleted_sources
+        if not self.texts and not replaced_sources:
+            return
+        
+        # Chunks et sources remplacées de chaque shard: les autres shards ne sont pas modifiés
+        count = len(self.shard_paths)
+        rows_per_shard = {}
+        for i, meta in enumerate(self.metadatas):
+            rows_per_shard.setdefault(shard_of(meta.get('source'), count), []).append(i)
+        sources_per_shard = {}
+        for source in replaced_sources:
+            sources_per_shard.setdefault(shard_of(source, count), set()).add(source)
+        
+        with self.timings.span('write'):
+            for shard in sorted(set(rows_per_shard) | set(sources_per_shard)):
+                rows = rows_per_shard.get(shard, [])
+                embeddings = [self.embeddings[i] for i in rows]
+                ivf_lists = None
+                if self.centroids[shard] is not None and rows:
+                    ivf_lists = assign_ivf(normalize_rows(np.asarray(embeddings, dtype=np.float32)),
+                                           self.centroids[shard])
+                append_to_store(self.shard_paths[shard], [self.texts[i] for i in rows],
+                                [self.metadatas[i] for i in rows], embeddings, self.embedding_model,
+                                deleted_sources=sources_per_shard.get(shard), ivf_lists=ivf_lists, dtype=self.dtype,
+                                quantization=self.quantization)
+                self.written_shards.add(shard)
+        CHUNKS_INDEXED.inc(len(self.texts))
+        
+        self.written_sources |= replaced_sources
+        self.purged = True
+        self.texts = []
+        self.metadatas = []
+        self.embeddings = []
+    
+    def finish(self, fingerprints=None):
+        """
+        Écrit le dernier lot et met à jour le registre des sources.
+        
+        Args:
+            fingerprints: Empreintes des sources indexées ({source: empreinte})
+        """
+        self.flush()
+        
+        registry = load_sources_registry(self.config)
+        for source in self.deleted_sources:
+            registry.pop(source, None)
+        for source, fingerprint in (fingerprints or {}).items():
+            registry[source] = {
+                'fingerprint': fingerprint,
+                'chunks': self.chunks_per_source.get(source, 0),
+                'indexed_at': self.indexed_at
+            }
+        save_sources_registry(registry, self.config)
+        
+        # Construire l'index approximatif (des shards qui n'en ont pas) quand le vector store devient assez grand
+        missing = [shard for shard, centroids in enumerate(self.centroids) if centroids is None]
+        if missing and should_build_ann_index(self.config, registry):
+            build_ann_index(self.config, shards=missing)
+        
+        # Les chunks du journal ne sont pas quantifiés: réécrire les shards modifiés
+        # dont le journal est devenu trop gros (ou dont les codes ne suivent pas la configuration)
+        outdated = [
+            shard for shard in sorted(self.written_shards)
+            if quantization_outdated(self.shard_paths[shard], self.quantization)
+        ]
+        if outdated:
+            quantize_vectorstore(self.config, shards=outdated)
+
+def should_build_ann_index(config, registry):
+    """Indique si l'index IVF doit être construit (mode 'ivf', ou mode 'auto' au-delà de ann_min_size)"""
+    search_config = config.get('search', {})
+    mode = search_config.get('index', 'auto')
+    if mode == 'exact':
+        return False
+    if mode == 'ivf':
+        return True
+    total_chunks = sum(entry.get('chunks', 0) for entry in registry.values())
+    return total_chunks >= search_config.get('ann_min_size', 20000)
+
+def selected_shard_paths(config, shards=None):
+    """
+    Retourne les (numéro, dossier) des shards existants du vector store.
+    
+    Args:
+        shards: Numéros des shards à retenir (None = tous)
+    """
+    paths = shard_paths(get_store_path(config))
+    return [
+        (shard, path) for shard, path in enumerate(paths)
+        if (shards is None or shard in shards) and store_exists(path)
     ]
+
+def shard_label(config, path):
+    """Nom du shard pour les messages (vide si le vector store n'est pas partitionné)"""
+    return f" [{os.path.basename(path)}]" if read_shard_count(get_store_path(config)) is not None else ''
+
+def build_ann_index(config=None, shards=None):
+    """
+    Construit (ou reconstruit) l'index approximatif IVF du vector store.
     
-    # Créer le vector store avec tous les documents
-    vectorstore = SKLearnVectorStore.from_documents(
-        documents=all_doc_objects,
-        embedding=embeddings
-    )
+    Les centroïdes sont entraînés par k-means sur les embeddings, puis chaque
+    chunk est affecté à son cluster; les chunks indexés ensuite sont affectés
+    aux clusters existants sans réentraînement. Chaque shard a son propre index.
     
-    # Sauvegarder
-    save_data = {
-        'documents': all_documents,
-        'metadatas': all_metadatas,
-        'embedding_model': config['models']['embedding_model']
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+        shards: Numéros des shards à traiter (None = tous)
+    
+    Returns:
+        Nombre de clusters construits (0 si le vector store est vide)
+    """
+    if config is None:
+        config = load_config()
+    
+    total = 0
+    for _, path in selected_shard_paths(config, shards):
+        save_data = read_store(path)
+        documents = save_data.get('documents', [])
+        if not documents or 'embeddings' not in save_data or save_data.get('embedding_model') is None:
+            continue
+        
+        matrix = normalize_rows(np.asarray(save_data['embeddings'], dtype=np.float32))
+        nlist = config.get('search', {}).get('ivf_nlist', 0) or default_nlist(len(documents))
+        
+        print(f"🧭 Construction de l'index IVF{shard_label(config, path)} ({nlist} clusters, {len(documents)} chunks)...")
+        centroids = train_ivf(matrix, nlist)
+        ivf_lists = assign_ivf(matrix, centroids)
+        
+        save_store(path, documents, save_data['metadatas'], save_data['embeddings'],
+                   save_data['embedding_model'], ivf_lists=ivf_lists, ivf_centroids=centroids,
+                   dtype=get_store_dtype(config), quantization=get_store_quantization(config))
+        total += len(centroids)
+    
+    return total
+
+def quantize_vectorstore(config=None, shards=None):
+    """
+    Réécrit le vector store avec les codes quantifiés configurés (storage.quantization).
+    
+    Les embeddings ne sont pas recalculés: le journal est intégré à la
+    nouvelle version, les codes sont calculés sur tous ses chunks et l'index
+    IVF existant est conservé. Avec storage.quantization: "none", les codes
+    sont supprimés.
+    
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+        shards: Numéros des shards à traiter (None = tous)
+    
+    Returns:
+        Nombre de chunks réécrits
+    """
+    if config is None:
+        config = load_config()
+    
+    quantization = get_store_quantization(config)
+    mode = quantization['mode'] if quantization else 'none'
+    total = 0
+    for _, path in selected_shard_paths(config, shards):
+        save_data = read_store(path)
+        documents = save_data.get('documents', [])
+        if save_data.get('embedding_model') is None:
+            raise ValueError("Le vector store contient des embeddings incohérents: lancez d'abord python ingest.py --rebuild")
+        
+        print(f"📦 Quantification {mode} de {len(documents)} chunks{shard_label(config, path)}...")
+        centroids = load_ivf_centroids(path, save_data['embedding_model'])
+        save_store(path, documents, save_data['metadatas'], save_data['embeddings'], save_data['embedding_model'],
+                   ivf_lists=save_data['ivf_lists'] if centroids is not None else None, ivf_centroids=centroids,
+                   dtype=get_store_dtype(config), quantization=quantization)
+        total += len(documents)
+    
+    return total
+
+def evaluate_recall(config=None, queries=200, k=10, seed=0):
+    """
+    Mesure le rappel et la durée de la recherche vectorielle par rapport à la recherche exacte.
+    
+    Les questions sont des chunks de l'index tirés au hasard (sans appel au
+    modèle d'embedding); le chunk de la question est exclu de ses résultats.
+    La référence est le top-k exact sur les vecteurs complets; sont mesurés
+    le classement sur les codes seuls et la recherche configurée (codes,
+    recalcul des candidats et index IVF selon config.yaml).
+    
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+        queries: Nombre de questions
+        k: Nombre de résultats comparés par question
+        seed: Graine du tirage des questions
+    
+    Returns:
+        Dictionnaire des mesures (None si le vector store est vide)
+    """
+    if config is None:
+        config = load_config()
+    
+    path = get_store_path(config)
+    if not store_exists(path):
+        return None
+    shards = load_shards(path, config['models']['embedding_model'], dtype=get_store_dtype(config))
+    
+    # Lignes (globales) et vecteurs des questions: chunks non supprimés tirés au hasard
+    alive = []
+    offset = 0
+    for data in shards:
+        base_rows = np.arange(data.base_count) if data.base_alive is None else np.flatnonzero(data.base_alive)
+        delta_rows = np.arange(data.base_count, data.base_count + len(data.delta_texts))
+        alive.append(np.concatenate([base_rows, delta_rows]).astype(np.int64) + offset)
+        offset += data.base_count + len(data.delta_texts)
+    alive = np.concatenate(alive) if alive else np.zeros(0, dtype=np.int64)
+    if len(alive) < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    query_rows = np.sort(rng.choice(alive, min(queries, len(alive)), replace=False))
+    offsets = np.cumsum([0] + [data.base_count + len(data.delta_texts) for data in shards])
+    vectors = []
+    for row in query_rows:
+        shard = int(np.searchsorted(offsets, row, side='right')) - 1
+        data, row = shards[shard], int(row - offsets[shard])
+        vectors.append(np.asarray(data.base.vectors[row], dtype=np.float32) if row < data.base_count
+                       else data.delta_matrix[row - data.base_count])
+    
+    search_config = config.get('search', {})
+    mode = search_config.get('index', 'auto')
+    use_ivf = mode == 'ivf' or (mode == 'auto' and len(alive) >= search_config.get('ann_min_size', 20000))
+    rerank_candidates = search_config.get('rerank_candidates', DEFAULT_RERANK_CANDIDATES)
+    
+    def open_store(**options):
+        stores = [LocalVectorStore(None, data, nprobe=search_config.get('ivf_nprobe', 16), **options) for data in shards]
+        return stores[0] if read_shard_count(path) is None else ShardedVectorStore(None, stores)
+    
+    def run(store):
+        """Résultats (sans le chunk de la question) et durée moyenne par question (ms)"""
+        store._vector_ranking(vectors[0], k + 1)
+        start = time.perf_counter()
+        rankings = [store._vector_ranking(vector, k + 1)[0] for vector in vectors]
+        latency = (time.perf_counter() - start) / len(vectors) * 1000
+        results = [[row for row in rows if row != query_row][:k] for rows, query_row in zip(rankings, query_rows)]
+        return results, latency
+    
+    exact, exact_latency = run(open_store(use_quantization=False))
+    
+    def measure(name, store):
+        results, latency = run(store)
+        hits = sum(len(set(result) & set(reference)) for result, reference in zip(results, exact))
+        return {'name': name, 'recall': hits / max(1, sum(len(reference) for reference in exact)),
+                'latency_ms': round(latency, 3)}
+    
+    variants = [{'name': 'exact', 'recall': 1.0, 'latency_ms': round(exact_latency, 3)}]
+    quantized = all(data.quantizer is not None for data in shards if data.base_count)
+    if quantized:
+        variants.append(measure('codes', open_store(rerank_candidates=0)))
+        variants.append(measure(f'codes + rerank {rerank_candidates}', open_store(rerank_candidates=rerank_candidates)))
+    if use_ivf:
+        variants.append(measure(f"ivf nprobe {search_config.get('ivf_nprobe', 16)}",
+                                open_store(use_ivf=True, rerank_candidates=rerank_candidates)))
+    
+    vectors_bytes = sum(data.base.vectors.nbytes for data in shards if data.base_count)
+    codes_bytes = sum(data.quantizer.nbytes for data in shards if data.quantizer is not None)
+    return {
+        'chunks': int(len(alive)),
+        'queries': len(vectors),
+        'k': k,
+        'quantization': sorted({data.base.manifest.get('quantization') or 'none' for data in shards if data.base_count}),
+        'rerank_candidates': rerank_candidates,
+        'ivf': use_ivf,
+        'vectors_bytes': int(vectors_bytes),
+        'codes_bytes': int(codes_bytes),
+        # Chunks du journal: non quantifiés, gardés en mémoire en float32
+        'journal_bytes': int(sum(data.delta_matrix.nbytes for data in shards)),
+        'compression': round(vectors_bytes / codes_bytes, 2) if quantized and codes_bytes else None,
+        'variants': variants
     }
-    with open(vectorstore_path, 'wb') as f:
-        pickle.dump(save_data, f)
+
+def get_chunk_id(source, text):
+    """Identifiant d'un chunk: hash de son contenu et de sa source"""
+    return hashlib.sha256(f"{source}\0{text}".encode('utf-8')).hexdigest()[:32]
+
+def get_sources_file(config):
+    """Retourne le chemin du registre des sources indexées"""
+    return config['paths'].get(
+        'sources_file',
+        os.path.join(config['paths']['vectorstore_dir'], 'sources.json')
+    )
+
+def load_sources_registry(config=None):
+    """
+    Charge le registre des sources indexées (fichiers et URLs).
     
-    return new_documents, new_metadatas
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+    
+    Returns:
+        Dictionnaire {source: {'fingerprint', 'chunks', 'indexed_at'}}
+    """
+    if config is None:
+        config = load_config()
+    
+    sources_file = get_sources_file(config)
+    if not os.path.exists(sources_file):
+        return {}
+    
+    try:
+        with open(sources_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+def save_sources_registry(registry, config=None):
+    """
+    Sauvegarde le registre des sources indexées.
+    
+    Args:
+        registry: Dictionnaire {source: {'fingerprint', 'chunks', 'indexed_at'}}
+        config: Configuration (si None, charge depuis config.yaml)
+    """
+    if config is None:
+        config = load_config()
+    
+    sources_file = get_sources_file(config)
+    sources_dir = os.path.dirname(sources_file)
+    if sources_dir:
+        os.makedirs(sources_dir, exist_ok=True)
+    
+    tmp_file = sources_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, sources_file)
+
+def reset_vectorstore(config):
+    """Supprime le vector store et le registre des sources. Retourne True si un index existait"""
+    removed = remove_store(get_store_path(config))
+    sources_file = get_sources_file(config)
+    if os.path.exists(sources_file):
+        os.remove(sources_file)
+    return removed
+
+def get_file_fingerprint(file_path, previous=None):
+    """
+    Calcule l'empreinte d'un fichier (mtime, taille, sha256).
+    
+    Le sha256 n'est recalculé que si la date de modification ou la taille
+    a changé depuis l'empreinte précédente.
+    
+    Args:
+        file_path: Chemin du fichier
+        previous: Empreinte enregistrée lors de la dernière indexation
+    
+    Returns:
+        Tuple (fingerprint, changed)
+    """
+    stat = os.stat(file_path)
+    if previous and previous.get('mtime') == stat.st_mtime and previous.get('size') == stat.st_size:
+        return previous, False
+    
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    
+    fingerprint = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha.hexdigest()}
+    changed = not previous or previous.get('sha256') != fingerprint['sha256']
+    return fingerprint, changed
+
+def rebuild_vectorstore(config=None, shards=None):
+    """
+    Recalcule tous les embeddings du vector store avec le modèle configuré.
+    
+    Utilisé lorsque le modèle d'embedding a changé ou pour migrer un
+    vector store de l'ancien format (sans embeddings). Les shards sont
+    reconstruits un par un.
+    
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+        shards: Numéros des shards à reconstruire (None = tous)
+    
+    Returns:
+        Nombre de chunks réindexés
+    """
+    if config is None:
+        config = load_config()
+    
+    embedding_model = config['models']['embedding_model']
+    embeddings = get_embeddings(config)
+    total = 0
+    rebuilt = []
+    for shard, path in selected_shard_paths(config, shards):
+        save_data = read_store(path)
+        documents = save_data.get('documents', [])
+        metadatas = save_data.get('metadatas', [])
+        
+        print(f"🔄 Recalcul des embeddings de {len(documents)} chunks{shard_label(config, path)} avec {embedding_model}...")
+        all_embeddings = embeddings.embed_documents(documents) if documents else []
+        if documents:
+            print(f"⚡ {embeddings.throughput_report()}")
+        save_store(path, documents, metadatas, all_embeddings, embedding_model, dtype=get_store_dtype(config),
+                   quantization=get_store_quantization(config))
+        total += len(documents)
+        rebuilt.append(shard)
+    
+    # Les anciens centroïdes IVF ne correspondent plus aux nouveaux embeddings
+    if rebuilt and should_build_ann_index(config, load_sources_registry(config)):
+        build_ann_index(config, shards=rebuilt)
+    
+    return total
+
+def reshard_vectorstore(config=None):
+    """
+    Répartit le vector store en storage.shards shards, sans recalculer les embeddings.
+    
+    Les nouveaux shards sont écrits à côté de l'ancien vector store puis publiés
+    en remplaçant shards.json (voir publish_layout): le serveur voit toujours un
+    index complet. Les index IVF sont reconstruits pour chaque shard si nécessaire.
+    
+    Args:
+        config: Configuration (si None, charge depuis config.yaml)
+    
+    Returns:
+        Nombre de chunks répartis
+    """
+    if config is None:
+        config = load_config()
+    
+    vectorstore_path = get_store_path(config)
+    if not store_exists(vectorstore_path):
+        return 0
+    count = get_shard_count(config)
+    
+    # Chunks de chaque nouveau shard (textes, metadatas, embeddings)
+    groups = [([], [], []) for _ in range(count)]
+    embedding_model = None
+    for _, path in selected_shard_paths(config):
+        save_data = read_store(path)
+        if save_data.get('embedding_model') is None or 'embeddings' not in save_data:
+            raise ValueError("Le vector store contient des embeddings incohérents: lancez d'abord python ingest.py --rebuild")
+        embedding_model = save_data['embedding_model']
+        for i, (text, meta) in enumerate(zip(save_data['documents'], save_data['metadatas'])):
+            texts, metadatas, rows = groups[shard_of(meta.get('source'), count)]
+            texts.append(text)
+            metadatas.append(meta)
+            rows.append(save_data['embeddings'][i])
+    
+    layout = new_layout(vectorstore_path)
+    total = 0
+    for shard, (texts, metadatas, rows) in enumerate(groups):
+        if not texts:
+            continue
+        print(f"📦 Shard {shard}: {len(texts)} chunks")
+        path = os.path.join(vectorstore_path, layout, SHARD_DIRNAME.format(shard))
+        save_store(path, texts, metadatas, np.asarray(rows), embedding_model, dtype=get_store_dtype(config),
+                   quantization=get_store_quantization(config))
+        total += len(texts)
+    
+    # Basculer shards.json vers les nouveaux shards (les lecteurs déjà ouverts gardent leurs fichiers mappés)
+    publish_layout(vectorstore_path, count, layout)
+    
+    if should_build_ann_index(config, load_sources_registry(config)):
+        build_ann_index(config)
+    
+    return total
 
 def save_indexed_urls(urls, config=None):
     """
@@ -222,44 +809,132 @@ def reindex_saved_urls(config=None, reset=False):
     
     urls = load_indexed_urls(config)
     
+    # Pages web qui ne font plus partie des URLs sauvegardées (purgées avec la réindexation)
+    removed_urls = []
+    if not reset:
+        registry = load_sources_registry(config)
+        removed_urls = [
+            source for source, entry in registry.items()
+            if entry.get('fingerprint', {}).get('type') == 'web' and source not in urls
+        ]
+        for source in removed_urls:
+            print(f"🧹 {source} ne fait plus partie des URLs sauvegardées, retrait de l'index")
+    
     if not urls:
+        if removed_urls:
+            load_and_index_documents([], config, deleted_sources=removed_urls)
         return True, "Aucune URL sauvegardée à réindexer", 0
     
     print(f"📋 {len(urls)} URLs sauvegardées trouvées")
     
     if reset:
         # Réinitialiser l'index d'abord
-        vectorstore_path = os.path.join(config['paths']['vectorstore_dir'], "vectorstore.pkl")
-        if os.path.exists(vectorstore_path):
-            os.remove(vectorstore_path)
+        if reset_vectorstore(config):
             print("🗑️  Vector store existant supprimé (reset)")
     
-    # Réindexer toutes les URLs
+    # Télécharger toutes les URLs, puis indexer les pages modifiées en une seule passe
+    print(f"🌐 Téléchargement de {len(urls)} URL(s)...")
+    results = fetch_web_documents(urls, config)
+    
+    all_documents = []
+    fingerprints = {}
+    for url, (documents, fingerprint, changed, error) in results.items():
+        if changed:
+            all_documents.extend(documents)
+            fingerprints[url] = fingerprint
+    
+    chunks_per_url = {}
+    index_error = None
+    if all_documents or removed_urls:
+        try:
+            new_docs, new_metas = load_and_index_documents(
+                all_documents, config, fingerprints=fingerprints, deleted_sources=removed_urls
+            )
+            for meta in new_metas:
+                chunks_per_url[meta['source']] = chunks_per_url.get(meta['source'], 0) + 1
+        except Exception as e:
+            index_error = f"Erreur lors de l'indexation: {str(e)}"
+    
+    # Rapport par URL
     total_chunks = 0
     failed_urls = []
+    indexed_urls = []
     
-    for url in urls:
+    for url, (documents, fingerprint, changed, error) in results.items():
         print(f"  🔄 Réindexation de {url}...")
-        success, message, chunks = ingest_urls([url], config)
-        if success:
-            total_chunks += chunks
-            print(f"    ✅ {chunks} chunks ajoutés")
-        else:
+        if error or (changed and index_error):
             failed_urls.append(url)
-            print(f"    ❌ Erreur: {message}")
+            print(f"    ❌ Erreur: {error or index_error}")
+        elif not changed:
+            indexed_urls.append(url)
+            print("    ⏭️  Inchangée depuis la dernière indexation")
+        else:
+            indexed_urls.append(url)
+            total_chunks += chunks_per_url.get(url, 0)
+            print(f"    ✅ {chunks_per_url.get(url, 0)} chunks ajoutés")
+    
+    if indexed_urls:
+        save_indexed_urls(indexed_urls, config)
     
     if failed_urls:
         return False, f"Erreurs lors de la réindexation de {len(failed_urls)} URL(s)", total_chunks
     
     return True, f"Réindexation réussie: {total_chunks} chunks au total", total_chunks
 
-def ingest_urls(urls, config=None):
+def fetch_web_documents(urls, config=None, on_result=None):
+    """
+    Télécharge une liste d'URLs en parallèle avec une session HTTP partagée.
+    
+    Le nombre de téléchargements simultanés, le délai maximum, les nouvelles
+    tentatives et la limite de requêtes par hôte se règlent dans la section
+    web_loader de config.yaml.
+    
+    Args:
+        urls: Liste d'URLs
+        config: Configuration (si None, charge depuis config.yaml)
+        on_result: Fonction appelée avec (url, résultat) à la fin de chaque téléchargement
+    
+    Returns:
+        Dictionnaire ordonné {url: (documents, fingerprint, changed, error)};
+        error vaut None si le téléchargement a réussi
+    """
+    if config is None:
+        config = load_config()
+    
+    registry = load_sources_registry(config)
+    web_config = config.get('web_loader', {})
+    
+    # Récupérer le user_agent depuis la config ou utiliser celui de l'environnement
+    user_agent = web_config.get('user_agent', os.environ.get('USER_AGENT', 'RAG-Documentation/1.0'))
+    
+    results = fetch_urls(
+        urls,
+        previous_fingerprints={url: registry.get(url, {}).get('fingerprint') for url in urls},
+        user_agent=user_agent,
+        max_workers=web_config.get('max_workers', 8),
+        timeout=web_config.get('timeout', 30),
+        retries=web_config.get('retries', 3),
+        backoff_factor=web_config.get('backoff_factor', 0.5),
+        per_host_rate=web_config.get('per_host_rate', 2),
+        on_result=on_result
+    )
+    
+    for documents, fingerprint, changed, error in results.values():
+        if fingerprint is not None:
+            fingerprint['type'] = 'web'
+    
+    return results
+
+def ingest_urls(urls, config=None, progress=None):
     """
     Indexe une ou plusieurs URLs web.
     
     Args:
         urls: Liste d'URLs ou URL unique (string)
         config: Configuration (si None, charge depuis config.yaml)
+        progress: Fonction appelée avec l'étape en cours ('fetching', 'splitting',
+            'embedding', 'writing') et les compteurs (urls_total, urls_fetched,
+            chunks_total, chunks_embedded)
     
     Returns:
         Tuple (success, message, chunks_count)
@@ -272,45 +947,297 @@ def ingest_urls(urls, config=None):
         urls = [urls]
     
     all_documents = []
+    fingerprints = {}
+    unchanged_urls = []
+    errors = []
     
-    # Récupérer le user_agent depuis la config ou utiliser celui de l'environnement
-    user_agent = config.get('web_loader', {}).get('user_agent', os.environ.get('USER_AGENT', 'RAG-Documentation/1.0'))
+    on_result = None
+    if progress is not None:
+        progress(stage='fetching', urls_total=len(set(urls)), urls_fetched=0)
+        fetched = []
+        
+        def report_fetched(url, result):
+            fetched.append(url)
+            progress(urls_fetched=len(fetched))
+        on_result = report_fetched
     
-    # Définir USER_AGENT dans l'environnement pour WebBaseLoader
-    os.environ['USER_AGENT'] = user_agent
+    timings = Timings(INGEST_STAGE_SECONDS)
+    with timings.span('fetch'):
+        results = fetch_web_documents(urls, config, on_result)
     
-    for url in urls:
-        try:
-            loader = WebBaseLoader(url)
-            documents = loader.load()
-            
-            # Ajouter l'URL comme metadata
-            for doc in documents:
-                doc.metadata['source'] = url
-                doc.metadata['type'] = 'web'
-            
+    # Les URLs en erreur n'empêchent pas l'indexation des autres
+    for url, (documents, fingerprint, changed, error) in results.items():
+        if error:
+            errors.append(f"{url}: {error}")
+        elif not changed:
+            unchanged_urls.append(url)
+        else:
+            fingerprints[url] = fingerprint
             all_documents.extend(documents)
-        except Exception as e:
-            return False, f"Erreur lors du chargement de {url}: {str(e)}", 0
+    
+    errors_message = f" | {len(errors)} URL(s) en erreur: " + "; ".join(errors) if errors else ""
+    
+    if not all_documents and unchanged_urls:
+        save_indexed_urls(unchanged_urls, config)
+        return True, f"Aucun changement: {len(unchanged_urls)} URL(s) déjà à jour{errors_message}", 0
     
     if not all_documents:
+        if errors:
+            return False, "Erreur lors du chargement de " + "; ".join(errors), 0
         return False, "Aucun contenu récupéré des URLs", 0
     
     try:
-        new_docs, new_metas = load_and_index_documents(all_documents, config)
+        new_docs, new_metas = load_and_index_documents(all_documents, config, fingerprints=fingerprints,
+                                                       progress=progress, timings=timings)
         chunks_count = len(new_docs)
         
         # Sauvegarder les URLs après indexation réussie
-        save_indexed_urls(urls, config)
+        save_indexed_urls(unchanged_urls + list(fingerprints), config)
         
-        return True, f"Indexation réussie: {chunks_count} chunks ajoutés", chunks_count
+        return True, f"Indexation réussie: {chunks_count} chunks ajoutés{errors_message}", chunks_count
     except Exception as e:
         return False, f"Erreur lors de l'indexation: {str(e)}", 0
 
+def load_and_split_file(file_path, chunk_size, chunk_overlap):
+    """
+    Charge un fichier et le découpe en chunks (exécuté dans un processus du pool).
+    
+    Args:
+        file_path: Chemin du fichier
+        chunk_size: Taille des chunks en caractères
+        chunk_overlap: Chevauchement entre chunks
+    
+    Returns:
+        Tuple (pages_count, splits)
+    """
+    loader = get_document_loader(file_path)
+    documents = loader.load()
+    
+    # Ajouter le nom du fichier comme metadata
+    for doc in documents:
+        doc.metadata['source'] = Path(file_path).name
+        doc.metadata['type'] = 'file'
+    
+    return len(documents), split_documents(documents, chunk_size, chunk_overlap)
+
+def iter_split_files(file_paths, chunk_size, chunk_overlap, workers=1):
+    """
+    Charge et découpe des fichiers en parallèle dans un pool de processus.
+    
+    Les résultats sont produits dès qu'un fichier est terminé, dans l'ordre
+    d'achèvement, pour que l'embedding commence sans attendre les autres fichiers.
+    
+    Args:
+        file_paths: Liste de chemins de fichiers
+        chunk_size: Taille des chunks en caractères
+        chunk_overlap: Chevauchement entre chunks
+        workers: Nombre de processus (1 = chargement séquentiel dans le processus courant)
+    
+    Yields:
+        Tuple (file_path, pages_count, splits, error); error vaut None en cas de succès
+    """
+    if workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                pages_count, splits = load_and_split_file(str(file_path), chunk_size, chunk_overlap)
+                yield file_path, pages_count, splits, None
+            except Exception as e:
+                yield file_path, 0, [], e
+        return
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(file_paths))) as executor:
+        futures = {
+            executor.submit(load_and_split_file, str(file_path), chunk_size, chunk_overlap): file_path
+            for file_path in file_paths
+        }
+        for future in as_completed(futures):
+            try:
+                pages_count, splits = future.result()
+                yield futures[future], pages_count, splits, None
+            except Exception as e:
+                yield futures[future], 0, [], e
+
+class WindowTextSplitter(RecursiveCharacterTextSplitter):
+    """
+    RecursiveCharacterTextSplitter qui découpe un texte lu par fenêtres successives.
+    
+    Les chunks sont identiques à ceux de split_text sur le texte entier (donc
+    leurs chunk_id aussi): le texte est coupé en paragraphes au premier
+    séparateur, comme dans _split_text, et seul l'état de la fusion est gardé
+    d'une fenêtre à l'autre (les paragraphes du chunk en cours et le
+    paragraphe pas encore terminé).
+    """
+    
+    def _join_docs(self, docs, separator):
+        # Appelé en dernier par _merge_splits avec les pièces du chunk en cours
+        self._current_doc = docs
+        return super()._join_docs(docs, separator)
+    
+    def _merge_final(self, splits, separator):
+        """
+        Fusionne des pièces dont la suite n'est pas encore lue.
+        
+        Returns:
+            Tuple (chunks terminés, pièces du chunk en cours): fusionner les pièces
+            du chunk en cours suivies des pièces suivantes donne les mêmes chunks
+            que fusionner toutes les pièces en une fois
+        """
+        chunks = self._merge_splits(splits, separator)
+        current_doc = list(self._current_doc)
+        if super()._join_docs(current_doc, separator) is not None:
+            chunks = chunks[:-1]
+        return chunks, current_doc
+    
+    def split_windows(self, windows):
+        """Découpe le texte formé par les fenêtres; produit les chunks au fur et à mesure"""
+        separator, new_separators = self._separators[0], self._separators[1:]
+        pattern = separator if self._is_separator_regex else re.escape(separator)
+        merge_separator = '' if self._keep_separator else separator
+        buffer = ''
+        found = False
+        good_splits = []
+        
+        def split_piece(piece):
+            """Même traitement d'un paragraphe que la boucle de _split_text"""
+            nonlocal good_splits
+            if self._length_function(piece) < self._chunk_size:
+                good_splits.append(piece)
+                return []
+            chunks = self._merge_splits(good_splits, merge_separator) if good_splits else []
+            good_splits = []
+            return chunks + (self._split_text(piece, new_separators) if new_separators else [piece])
+        
+        for window in windows:
+            buffer += window
+            # Paragraphes terminés: jusqu'à la dernière occurrence du séparateur
+            # (celles qui précèdent ne dépendent pas du texte qui suit)
+            starts = [match.start() for match in re.finditer(pattern, buffer)] if separator else []
+            if not starts or starts[-1] == 0:
+                continue
+            found = True
+            bounds = sorted(set([0] + starts))
+            chunks = []
+            for begin, end in zip(bounds, bounds[1:]):
+                chunks.extend(split_piece(buffer[begin:end]))
+            buffer = buffer[bounds[-1]:]
+            if good_splits:
+                merged, good_splits = self._merge_final(good_splits, merge_separator)
+                chunks.extend(merged)
+            yield from chunks
+        
+        if not found:
+            # Premier séparateur absent du texte: découpage habituel (séparateur suivant)
+            if buffer:
+                yield from self.split_text(buffer)
+            return
+        if buffer:
+            yield from split_piece(buffer)
+        if good_splits:
+            yield from self._merge_splits(good_splits, merge_separator)
+
+def split_text_windows(windows, chunk_size, chunk_overlap):
+    """
+    Découpe un texte lu par fenêtres successives, sans le charger en entier.
+    
+    Les chunks sont les mêmes que ceux du découpage du texte entier
+    (load_and_split_file), quelle que soit la taille des fenêtres. La mémoire
+    utilisée est celle d'une fenêtre plus le paragraphe en cours: un texte
+    sans ligne vide est gardé en entier avant d'être découpé.
+    
+    Args:
+        windows: Itérable de morceaux consécutifs du texte
+        chunk_size: Taille des chunks en caractères
+        chunk_overlap: Chevauchement entre chunks
+    
+    Yields:
+        Textes des chunks, dans l'ordre du texte
+    """
+    text_splitter = WindowTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    yield from text_splitter.split_windows(windows)
+
+def iter_text_windows(file_path, window_chars):
+    """Lit un fichier texte UTF-8 par fenêtres de window_chars caractères"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for window in iter(lambda: f.read(window_chars), ''):
+            yield window
+
+def iter_file_chunks(file_path, chunk_size, chunk_overlap, window_chars=DEFAULT_READ_WINDOW):
+    """
+    Découpe un fichier en chunks au fur et à mesure de sa lecture.
+    
+    Les fichiers texte et markdown sont lus par fenêtres, les PDF page par
+    page; les autres formats (.docx) sont chargés et découpés en entier
+    (load_and_split_file), docx2txt n'extrayant le texte que d'un bloc.
+    
+    La mémoire utilisée ne dépend de la taille du fichier que par les
+    identifiants des chunks déjà produits, gardés pour retirer les doublons
+    du fichier comme load_and_split_file (environ 80 octets par chunk, soit
+    une centaine de Mo pour 1 Go de texte découpé en chunks de 1000 caractères).
+    
+    Args:
+        file_path: Chemin du fichier
+        chunk_size: Taille des chunks en caractères
+        chunk_overlap: Chevauchement entre chunks
+        window_chars: Taille des fenêtres de lecture des fichiers texte
+    
+    Yields:
+        Chunks (documents LangChain avec metadata['chunk_id'])
+    """
+    source = Path(file_path).name
+    ext = Path(file_path).suffix.lower()
+    # Début des identifiants déjà produits, en entiers (plus compacts que les chaînes)
+    seen_chunk_ids = set()
+    
+    if ext == '.pdf':
+        # Une page à la fois: le découpage ne dépasse jamais une page, comme avec load()
+        for page in PyPDFLoader(str(file_path)).lazy_load():
+            page.metadata['source'] = source
+            page.metadata['type'] = 'file'
+            for doc in split_documents([page], chunk_size, chunk_overlap):
+                key = int(doc.metadata['chunk_id'][:16], 16)
+                if key not in seen_chunk_ids:
+                    seen_chunk_ids.add(key)
+                    yield doc
+        return
+    
+    if ext not in STREAMED_EXTENSIONS:
+        yield from load_and_split_file(str(file_path), chunk_size, chunk_overlap)[1]
+        return
+    
+    # Fenêtres assez grandes pour que le report d'un tampon à l'autre reste marginal
+    windows = iter_text_windows(file_path, max(window_chars, 4 * chunk_size))
+    for text in split_text_windows(windows, chunk_size, chunk_overlap):
+        chunk_id = get_chunk_id(source, text)
+        key = int(chunk_id[:16], 16)
+        if key in seen_chunk_ids:
+            continue
+        seen_chunk_ids.add(key)
+        yield Document(page_content=text, metadata={'source': source, 'type': 'file', 'chunk_id': chunk_id})
+
+def iter_batches(items, batch_size):
+    """Regroupe les éléments d'un itérable en listes de batch_size éléments au plus"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 def ingest_documents(reset=False):
     """
     Indexe tous les documents du dossier data/
     
+    Les fichiers sont chargés et découpés en parallèle (ingestion.workers dans
+    config.yaml); les chunks de chaque fichier sont embeddés dès qu'il est prêt.
+    Les fichiers de plus de ingestion.stream_threshold_mb sont lus en flux
+    (fenêtres de texte, pages de PDF) et embeddés puis écrits par lots, sans
+    jamais être chargés en entier.
+    
     Args:
         reset: Si True, supprime le vector store existant avant d'indexer
     """
@@ -318,41 +1245,133 @@ def ingest_documents(reset=False):
     
     data_dir = config['paths']['data_dir']
     
-    # Charger tous les documents
-    all_documents = []
+    # Fichiers à charger
+    files_to_load = []
+    fingerprints = {}
+    present_files = set()
+    unchanged_count = 0
     data_path = Path(data_dir)
     
+    # Empreintes de la dernière indexation (ignorées en cas de reset)
+    registry = {} if reset else load_sources_registry(config)
+    
     print(f"📂 Recherche de documents dans {data_dir}...")
     
     # Formats supportés
     supported_extensions = ['.pdf', '.txt', '.docx', '.doc', '.md', '.markdown']
     
-    for file_path in data_path.iterdir():
+    for file_path in sorted(data_path.iterdir()):
         if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            print(f"  📄 Traitement de {file_path.name}...")
+            present_files.add(file_path.name)
             try:
-                loader = get_document_loader(str(file_path))
-                documents = loader.load()
-                
-                # Ajouter le nom du fichier comme metadata
-                for doc in documents:
-                    doc.metadata['source'] = file_path.name
-                    doc.metadata['type'] = 'file'
-                
-                all_documents.extend(documents)
-                print(f"    ✅ {len(documents)} pages chargées")
+                previous = registry.get(file_path.name, {}).get('fingerprint')
+                fingerprint, changed = get_file_fingerprint(file_path, previous)
             except Exception as e:
+                print(f"  📄 Traitement de {file_path.name}...")
                 print(f"    ❌ Erreur: {e}")
+                continue
+            if not changed:
+                unchanged_count += 1
+                print(f"  📄 {file_path.name}: ⏭️  inchangé depuis la dernière indexation")
+                continue
+            fingerprint['type'] = 'file'
+            files_to_load.append((file_path, fingerprint))
     
-    if not all_documents:
-        print("⚠️  Aucun document trouvé!")
+    # Fichiers indexés qui ont disparu du dossier
+    removed_files = [
+        source for source, entry in registry.items()
+        if entry.get('fingerprint', {}).get('type') == 'file' and source not in present_files
+    ]
+    for source in removed_files:
+        print(f"  🧹 {source} supprimé du dossier, retrait de l'index")
+    
+    if not files_to_load and not removed_files:
+        if unchanged_count:
+            print(f"\n✅ Aucun changement: {unchanged_count} document(s) déjà à jour")
+        else:
+            print("⚠️  Aucun document trouvé!")
         return
     
-    print(f"\n📝 Découpage de {len(all_documents)} documents en chunks...")
+    ingestion_config = config.get('ingestion', {})
+    workers = ingestion_config.get('workers', 0) or os.cpu_count() or 1
+    stream_threshold = ingestion_config.get('stream_threshold_mb', DEFAULT_STREAM_THRESHOLD_MB) * 1024 * 1024
+    read_window = ingestion_config.get('read_window', DEFAULT_READ_WINDOW)
+    write_batch = ingestion_config.get('write_batch', DEFAULT_WRITE_BATCH)
+    chunk_size = config['chunking']['chunk_size']
+    chunk_overlap = config['chunking']['chunk_overlap']
+    file_fingerprints = {file_path: fingerprint for file_path, fingerprint in files_to_load}
+    
+    # Les gros fichiers sont lus en flux dans ce processus, les autres chargés en entier par le pool
+    streamed_files = [
+        file_path for file_path, fingerprint in files_to_load if fingerprint['size'] > stream_threshold
+    ]
+    pooled_files = [file_path for file_path in file_fingerprints if file_path not in streamed_files]
+    
+    if files_to_load:
+        print(f"\n📝 Chargement et découpage de {len(files_to_load)} document(s) ({workers} processus)...")
     
     try:
-        new_docs, new_metas = load_and_index_documents(all_documents, config, reset=reset)
-        chunks_count = len(new_docs)
+        if reset:
+            # Supprimer le vector store existant
+            if reset_vectorstore(config):
+                print("🗑️  Vector store existant supprimé (reset)")
+        
+        embeddings = get_embeddings(config)
+        timings = Timings(INGEST_STAGE_SECONDS)
+        # Les chunks embeddés sont écrits par lots de write_batch: la mémoire ne dépend pas du volume indexé
+        writer = ChunkWriter(config, deleted_sources=removed_files, batch_size=write_batch, timings=timings)
+        chunks_count = 0
+        
+        # Étape load: attente des fichiers chargés et découpés par le pool
+        for file_path, pages_count, splits, error in timings.iterate(iter_split_files(
+            pooled_files, chunk_size, chunk_overlap, workers
+        ), 'load'):
+            print(f"  📄 Traitement de {file_path.name}...")
+            if error is not None:
+                print(f"    ❌ Erreur: {error}")
+                continue
+            print(f"    ✅ {pages_count} pages chargées, {len(splits)} chunks")
+            
+            # Embedder ce fichier pendant que les autres sont encore en cours de chargement
+            if splits:
+                with timings.span('embed'):
+                    chunk_embeddings = embeddings.embed_documents([doc.page_content for doc in splits])
+                writer.add(splits, chunk_embeddings)
+            chunks_count += len(splits)
+            fingerprints[file_path.name] = file_fingerprints[file_path]
+        
+        for file_path in streamed_files:
+            print(f"  📄 Traitement de {file_path.name} (lecture en flux)...")
+            file_chunks = 0
+            try:
+                batches = iter_batches(iter_file_chunks(file_path, chunk_size, chunk_overlap, read_window),
+                                       write_batch)
+                for splits in timings.iterate(batches, 'load'):
+                    with timings.span('embed'):
+                        chunk_embeddings = embeddings.embed_documents([doc.page_content for doc in splits])
+                    writer.add(splits, chunk_embeddings)
+                    file_chunks += len(splits)
+            except Exception as e:
+                # Les lots déjà écrits sont remplacés à la prochaine indexation (fichier absent du registre)
+                print(f"    ❌ Erreur: {e}")
+                continue
+            finally:
+                chunks_count += file_chunks
+            print(f"    ✅ {file_chunks} chunks")
+            fingerprints[file_path.name] = file_fingerprints[file_path]
+        
+        if chunks_count:
+            print(f"⚡ {embeddings.throughput_report()}")
+        
+        if not chunks_count and not removed_files:
+            if unchanged_count:
+                print(f"\n✅ Aucun changement: {unchanged_count} document(s) déjà à jour")
+            else:
+                print("⚠️  Aucun document trouvé!")
+            return
+        
+        writer.finish(fingerprints)
+        print(f"⏱️  Étapes: {timings.summary()}")
         print(f"✅ {chunks_count} chunks créés et indexés")
         print(f"\n🎉 Indexation terminée! {chunks_count} chunks indexés.")
     except Exception as e:
@@ -369,6 +1388,12 @@ Exemples:
   python ingest.py --reset --reindex-urls  # Reset puis réindexe les URLs sauvegardées
   python ingest.py --list-urls        # Liste les URLs sauvegardées
   python ingest.py --reindex-urls     # Réindexe les URLs sauvegardées
+  python ingest.py --rebuild          # Recalcule les embeddings (changement de modèle)
+  python ingest.py --build-index      # Construit l'index approximatif IVF
+  python ingest.py --rebuild --shard 2     # Reconstruit un seul shard
+  python ingest.py --reshard          # Répartit l'index en storage.shards shards
+  python ingest.py --quantize         # Applique storage.quantization à l'index existant
+  python ingest.py --eval-recall      # Mesure le rappel de la recherche quantifiée
         """
     )
     parser.add_argument(
@@ -381,6 +1406,49 @@ Exemples:
         action='store_true',
         help='Réindexe toutes les URLs sauvegardées'
     )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Recalcule tous les embeddings avec le modèle configuré (après un changement de modèle)'
+    )
+    parser.add_argument(
+        '--build-index',
+        action='store_true',
+        help='Construit (ou reconstruit) l\'index approximatif IVF du vector store'
+    )
+    parser.add_argument(
+        '--shard',
+        type=int,
+        action='append',
+        help='Avec --rebuild, --build-index ou --quantize: limite l\'opération à ce shard (option répétable)'
+    )
+    parser.add_argument(
+        '--reshard',
+        action='store_true',
+        help='Répartit le vector store en storage.shards shards (sans recalculer les embeddings)'
+    )
+    parser.add_argument(
+        '--quantize',
+        action='store_true',
+        help='Réécrit le vector store avec les codes de storage.quantization (sans recalculer les embeddings)'
+    )
+    parser.add_argument(
+        '--eval-recall',
+        action='store_true',
+        help='Mesure le rappel et la durée de la recherche (codes, recalcul, IVF) par rapport à la recherche exacte'
+    )
+    parser.add_argument(
+        '--eval-queries',
+        type=int,
+        default=200,
+        help='Avec --eval-recall: nombre de questions (chunks de l\'index tirés au hasard)'
+    )
+    parser.add_argument(
+        '--eval-k',
+        type=int,
+        default=10,
+        help='Avec --eval-recall: nombre de résultats comparés par question'
+    )
     parser.add_argument(
         '--list-urls',
         action='store_true',
@@ -402,6 +1470,62 @@ Exemples:
             print("📋 Aucune URL sauvegardée")
         sys.exit(0)
     
+    # Mesurer le rappel de la recherche configurée
+    if args.eval_recall:
+        report = evaluate_recall(config, queries=args.eval_queries, k=args.eval_k)
+        if report is None:
+            print("⚠️  Vector store vide: rien à évaluer")
+            sys.exit(0)
+        print(f"📏 {report['queries']} questions, rappel@{report['k']} sur {report['chunks']} chunks "
+              f"(quantification: {', '.join(report['quantization'])})\n")
+        for variant in report['variants']:
+            print(f"  {variant['name']:<24} rappel {variant['recall']:.3f}   {variant['latency_ms']:.2f} ms/question")
+        print(f"\n💾 Vecteurs complets: {report['vectors_bytes'] / 1e6:.2f} Mo, "
+              f"codes: {report['codes_bytes'] / 1e6:.2f} Mo (compression {report['compression'] or '-'}×), "
+              f"journal en mémoire: {report['journal_bytes'] / 1e6:.2f} Mo")
+        if not report['compression']:
+            print("⚠️  L'index n'a pas de codes quantifiés: configurez storage.quantization puis lancez python ingest.py --quantize")
+        sys.exit(0)
+    
+    if args.shard:
+        shard_count = len(shard_paths(get_store_path(config)))
+        invalid = [shard for shard in args.shard if not 0 <= shard < shard_count]
+        if invalid:
+            print(f"❌ Shard(s) inexistant(s): {invalid} (le vector store a {shard_count} shard(s))")
+            sys.exit(1)
+    
+    # Répartir le vector store en shards
+    if args.reshard:
+        try:
+            chunks_count = reshard_vectorstore(config)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"\n✅ {chunks_count} chunks répartis en {get_shard_count(config)} shard(s)")
+        sys.exit(0)
+    
+    # Recalculer les embeddings avec le modèle configuré
+    if args.rebuild:
+        chunks_count = rebuild_vectorstore(config, shards=args.shard)
+        print(f"\n✅ {chunks_count} chunks réindexés avec {config['models']['embedding_model']}")
+        sys.exit(0)
+    
+    # Appliquer la quantification configurée à l'index existant
+    if args.quantize:
+        try:
+            chunks_count = quantize_vectorstore(config, shards=args.shard)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"\n✅ {chunks_count} chunks quantifiés")
+        sys.exit(0)
+    
+    # Construire l'index approximatif
+    if args.build_index:
+        nlist = build_ann_index(config, shards=args.shard)
+        print(f"\n✅ Index IVF construit: {nlist} clusters")
+        sys.exit(0)
+    
     # Réindexer les URLs sauvegardées
     if args.reindex_urls:
         success, message, total_chunks = reindex_saved_urls(config, reset=args.reset)
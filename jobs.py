@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""File de tâches d'indexation exécutées en arrière-plan"""
+
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+
+# Nombre de tâches terminées conservées pour /api/jobs/<id>
+MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    """Tâche d'indexation: état, progression et résultat"""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Étape en cours et compteurs (urls_total, urls_fetched, chunks_total, chunks_embedded...)
+        self.progress = {'stage': 'queued'}
+        self._stage_started_at = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def update(self, **fields):
+        """Met à jour la progression (appelé par la tâche pendant son exécution)"""
+        with self._lock:
+            if 'stage' in fields and fields['stage'] != self.progress.get('stage'):
+                self._stage_started_at = time.time()
+            self.progress.update(fields)
+
+    def _eta(self):
+        """Temps restant estimé (secondes) pour l'étape en cours, d'après son débit actuel"""
+        stage = self.progress.get('stage')
+        counters = {'fetching': ('urls_fetched', 'urls_total'), 'embedding': ('chunks_embedded', 'chunks_total')}
+        if stage not in counters or self._stage_started_at is None:
+            return None
+        done = self.progress.get(counters[stage][0], 0)
+        total = self.progress.get(counters[stage][1], 0)
+        if not done or not total:
+            return None
+        elapsed = time.time() - self._stage_started_at
+        return round(elapsed / done * (total - done), 1)
+
+    def wait(self, timeout=None):
+        """Attend la fin de la tâche. Retourne True si elle est terminée"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        """État de la tâche renvoyé par /api/jobs/<id>"""
+        with self._lock:
+            elapsed_until = self.finished_at or time.time()
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'eta_seconds': self._eta() if self.status == 'running' else None,
+                'elapsed_seconds': round(elapsed_until - self.started_at, 1) if self.started_at else 0.0,
+                'created_at': self.created_at,
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class JobQueue:
+    """
+    File de tâches exécutées une par une par un thread dédié (lancé à la première tâche).
+
+    Toutes les écritures dans un même vector store passent par la même file:
+    deux indexations soumises en même temps ne peuvent pas s'écraser.
+    """
+
+    def __init__(self, name='jobs'):
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._name = name
+        self._worker = None
+
+    def submit(self, kind, func, **params):
+        """
+        Ajoute une tâche à la file.
+
+        Args:
+            kind: Type de tâche (affiché dans /api/jobs/<id>)
+            func: Fonction exécutée avec (job, **params); sa valeur de retour est le résultat
+            params: Paramètres de la tâche
+
+        Returns:
+            Instance de Job
+        """
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._worker.start()
+        self._queue.put((job, func))
+        return job
+
+    def get(self, job_id):
+        """Retourne la tâche job_id, ou None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending_count(self):
+        """Nombre de tâches en attente ou en cours"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+
+    def _prune(self):
+        """Oublie les tâches terminées les plus anciennes (appelé sous verrou)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('done', 'error')]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job, func = self._queue.get()
+            with job._lock:
+                job.status = 'running'
+                job.started_at = time.time()
+            try:
+                result = func(job, **job.params)
+                with job._lock:
+                    job.result = result
+                    job.status = 'done'
+                    job.progress['stage'] = 'done'
+            except Exception as e:
+                with job._lock:
+                    job.error = str(e)
+                    job.status = 'error'
+                    job.progress['stage'] = 'error'
+            finally:
+                with job._lock:
+                    job.finished_at = time.time()
+                job._done.set()
+                self._queue.task_done()
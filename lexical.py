@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Index lexical (BM25) et fusion avec la recherche vectorielle"""
+
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# Paramètres BM25 (saturation de la fréquence et normalisation par la longueur)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Constante de la fusion RRF: score = Σ 1 / (RRF_K + rang)
+RRF_K = 60
+# Les tokens plus longs (données encodées, URLs interminables) ne sont pas indexés
+MAX_TOKEN_LENGTH = 64
+
+# Mots, nombres et identifiants composés (AB-123, v2.1, fichier_config...)
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./:]\w+)*')
+SEPARATOR_PATTERN = re.compile(r'[-./:]')
+ACCENT_PATTERN = re.compile('[\u0300-\u036f]')
+
+
+def tokenize(text):
+    """
+    Découpe un texte en termes (minuscules, sans accents).
+
+    Un identifiant composé donne le terme complet et chacune de ses parties:
+    "RT-2045" est retrouvé par "rt-2045" comme par "2045".
+    """
+    text = ACCENT_PATTERN.sub('', unicodedata.normalize('NFKD', text.lower()))
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if len(token) <= MAX_TOKEN_LENGTH:
+            tokens.append(token)
+        if SEPARATOR_PATTERN.search(token):
+            tokens.extend(part for part in SEPARATOR_PATTERN.split(token) if part and len(part) <= MAX_TOKEN_LENGTH)
+    return tokens
+
+
+def build_postings(texts):
+    """
+    Construit l'index inversé BM25 d'une liste de textes.
+
+    Returns:
+        Tuple (terms, offsets, docs, tfs, lengths): termes triés, début des
+        listes de chaque terme, numéros de chunks et fréquences (listes
+        concaténées) et nombre de termes de chaque chunk
+    """
+    postings = {}
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[doc] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    terms = sorted(postings)
+    sizes = np.array([len(postings[term]) for term in terms], dtype=np.int64)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    entries = [entry for term in terms for entry in postings[term]]
+    docs = np.array([doc for doc, _ in entries], dtype=np.int32)
+    tfs = np.minimum([tf for _, tf in entries], np.iinfo(np.uint16).max).astype(np.uint16)
+    # Tableau de longueur fixe: recherche d'un terme par dichotomie, mappable en mémoire
+    terms = np.array(terms, dtype=f'<U{max((len(term) for term in terms), default=1)}')
+    return terms, offsets, docs, tfs, lengths
+
+
+class BM25Postings:
+    """Index inversé d'un ensemble de chunks (tableaux éventuellement mappés en mémoire)"""
+
+    def __init__(self, terms, offsets, docs, tfs, lengths):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.count = len(lengths)
+        self.total_length = int(np.sum(lengths, dtype=np.int64))
+
+    @classmethod
+    def from_texts(cls, texts):
+        return cls(*build_postings(list(texts)))
+
+    def postings(self, term):
+        """Chunks contenant le terme et fréquences (None si le terme est absent)"""
+        i = int(np.searchsorted(self.terms, term))
+        if i >= len(self.terms) or self.terms[i] != term:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+
+class LexicalIndex:
+    """
+    Recherche BM25 sur plusieurs index inversés (segment sur disque et delta
+    du journal), numérotés comme les lignes de StoreData.
+
+    Les statistiques (nombre de chunks, longueur moyenne, fréquence des
+    termes) sont calculées sur l'ensemble des parties.
+    """
+
+    def __init__(self, parts, alive=None, k1=BM25_K1, b=BM25_B):
+        # parts: liste de (première ligne, BM25Postings)
+        self.parts = parts
+        # Lignes non supprimées de la première partie (None = toutes)
+        self.alive = alive
+        self.k1 = k1
+        self.b = b
+        self.count = sum(part.count for _, part in parts)
+        self.total_length = sum(part.total_length for _, part in parts)
+        self.avg_length = self.total_length / self.count if self.count else 0.0
+
+    def _matches(self, term):
+        """Listes (première ligne, partie, (docs, tfs)) des parties qui contiennent le terme"""
+        matches = [(first, part, part.postings(term)) for first, part in self.parts]
+        return [(first, part, found) for first, part, found in matches if found is not None]
+
+    def term_stats(self, query_text):
+        """
+        Statistiques de l'index pour une question (recherche répartie sur plusieurs index).
+
+        Returns:
+            Tuple (count, total_length, {terme: nombre de chunks qui le contiennent})
+        """
+        df = {
+            term: sum(len(found[0]) for _, _, found in self._matches(term))
+            for term in set(tokenize(query_text))
+        }
+        return self.count, self.total_length, df
+
+    def search(self, query_text, k, allowed=None, stats=None):
+        """
+        Retourne les k chunks les mieux classés par BM25 pour la question.
+
+        Args:
+            query_text: Texte de la question
+            k: Nombre de chunks
+            allowed: Lignes auxquelles limiter la recherche (None = toutes)
+            stats: Statistiques (count, total_length, df) de l'ensemble des index
+                d'une recherche répartie, sommées depuis term_stats (None = celles de cet index)
+
+        Returns:
+            Tuple (rows, scores) triés par score décroissant
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if not self.count or not self.avg_length:
+            return empty
+        count, avg_length, global_df = self.count, self.avg_length, None
+        if stats is not None:
+            count, total_length, global_df = stats
+            avg_length = total_length / count
+
+        all_rows = []
+        all_scores = []
+        for term in set(tokenize(query_text)):
+            matches = self._matches(term)
+            df = sum(len(found[0]) for _, _, found in matches)
+            if not df:
+                continue
+            if global_df is not None:
+                df = global_df[term]
+            idf = np.log(1.0 + (count - df + 0.5) / (df + 0.5))
+            for first, part, (docs, tfs) in matches:
+                tfs = np.asarray(tfs, dtype=np.float32)
+                norm = self.k1 * (1.0 - self.b + self.b * part.lengths[docs] / avg_length)
+                all_rows.append(np.asarray(docs, dtype=np.int64) + first)
+                all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+        if not all_rows:
+            return empty
+
+        # Somme des contributions des termes pour chaque chunk
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        if self.alive is not None:
+            first_count = self.parts[0][1].count if self.parts else 0
+            keep = rows >= first_count
+            keep[~keep] = self.alive[rows[~keep]]
+            rows, scores = rows[keep], scores[keep]
+        if allowed is not None:
+            keep = np.isin(rows, allowed)
+            rows, scores = rows[keep], scores[keep]
+
+        k = min(k, len(rows))
+        if not k:
+            return empty
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top], scores[top]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """
+    Fusionne des classements par rang réciproque (RRF).
+
+    Args:
+        rankings: Listes de lignes, chacune triée du meilleur au moins bon résultat
+        k: Nombre de lignes à retourner
+        rrf_k: Constante de lissage des rangs
+
+    Returns:
+        Liste des k lignes de meilleur score fusionné
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused, key=lambda row: -fused[row])[:k]
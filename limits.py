@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Limites de concurrence vers le serveur de modèles (mode de service asynchrone)"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+# Valeurs par défaut (surchargées par la section server de config.yaml)
+DEFAULT_MAX_CONCURRENT_EMBEDDINGS = 8
+DEFAULT_MAX_CONCURRENT_GENERATIONS = 4
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_QUEUE_TIMEOUT = 10
+DEFAULT_RETRY_AFTER = 5
+
+
+class Overloaded(Exception):
+    """Trop de requêtes en attente: le client doit réessayer plus tard (HTTP 429)"""
+
+    def __init__(self, message, retry_after=DEFAULT_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimit:
+    """
+    Nombre maximum d'appels simultanés, avec une file d'attente bornée.
+
+    Au-delà de max_concurrent appels en cours, les requêtes attendent leur
+    tour; si la file est pleine ou si l'attente dépasse timeout secondes,
+    Overloaded est levée au lieu d'accumuler les requêtes en mémoire.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue=DEFAULT_MAX_QUEUE,
+                 timeout=DEFAULT_QUEUE_TIMEOUT, retry_after=DEFAULT_RETRY_AFTER):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Créé à la première utilisation, dans la boucle d'événements du serveur
+        self._semaphore = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Réserve une place pour la durée du bloc async with"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"Serveur surchargé ({self.name}): réessayez plus tard", self.retry_after)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"Serveur surchargé ({self.name}): délai d'attente dépassé", self.retry_after)
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def report(self):
+        """État de la limite pour /api/status (appels en cours, en attente et refusés)"""
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'max_concurrent': self.max_concurrent
+        }
+
+
+def create_limits(config):
+    """Crée les limites configurées; retourne (embeddings, générations)"""
+    server_config = config.get('server', {})
+    max_queue = server_config.get('max_queue', DEFAULT_MAX_QUEUE)
+    timeout = server_config.get('queue_timeout', DEFAULT_QUEUE_TIMEOUT)
+    retry_after = server_config.get('retry_after', DEFAULT_RETRY_AFTER)
+    embeddings = ConcurrencyLimit(
+        'embeddings',
+        server_config.get('max_concurrent_embeddings', DEFAULT_MAX_CONCURRENT_EMBEDDINGS),
+        max_queue, timeout, retry_after
+    )
+    generations = ConcurrencyLimit(
+        'génération',
+        server_config.get('max_concurrent_generations', DEFAULT_MAX_CONCURRENT_GENERATIONS),
+        max_queue, timeout, retry_after
+    )
+    return embeddings, generations
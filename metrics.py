@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mesure de la durée des étapes (questions, indexation) et métriques au format Prometheus.
+
+Les métriques sont tenues en mémoire par le processus (sans dépendance) et
+exposées par la route /metrics. Une mesure coûte un appel à
+time.perf_counter et une incrémentation sous verrou: elle reste active en
+production.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+_END = object()
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Métrique étiquetée: une valeur (ou un histogramme) par combinaison d'étiquettes"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+
+class Counter(Metric):
+    """Compteur croissant (requêtes, chunks indexés...)"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Histogramme de durées (secondes): compte par intervalle, somme et nombre d'observations"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Comptes par intervalle (le dernier pour +Inf), somme
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    Métrique lue au moment de l'export (taille de l'index, statistiques des caches).
+
+    La fonction retourne une valeur, un dictionnaire {valeurs des étiquettes: valeur}
+    ou None (métrique absente).
+    """
+
+    def __init__(self, name, help_text, function, kind='gauge', labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.function = function
+
+    def collect(self):
+        values = self.function()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} '
+            f'{_format_value(value)}'
+            for key, value in sorted(values.items())
+        ]
+
+
+class Registry:
+    """Ensemble des métriques exportées par /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Ajoute (ou remplace, par nom) une métrique; retourne la métrique"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Texte de l'export au format Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.collect()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'rag_requests_total', 'Requêtes HTTP traitées', ('route', 'method', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'rag_request_duration_seconds', "Durée des requêtes HTTP (jusqu'au premier octet pour le streaming)",
+    ('route', 'method')))
+QUERY_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'rag_query_stage_duration_seconds', 'Durée des étapes des questions (cache, embed, search, prompt, generate)',
+    ('stage',)))
+INGEST_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'rag_ingest_stage_duration_seconds',
+    "Durée des étapes de l'indexation (fetch, load = chargement et découpage des fichiers, split, embed, write)",
+    ('stage',)))
+CHUNKS_INDEXED = REGISTRY.register(Counter(
+    'rag_chunks_indexed_total', 'Chunks ajoutés au vector store'))
+ANSWER_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'rag_answer_cache_lookups_total', 'Consultations du cache des réponses (exact, semantic, miss)', ('result',)))
+EMBEDDING_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'rag_embedding_cache_lookups_total', "Textes cherchés dans le cache d'embeddings (query ou document, hit ou miss)",
+    ('kind', 'result')))
+
+
+class Timings:
+    """
+    Durée des étapes d'une opération (une question, une indexation).
+
+    Chaque étape mesurée est ajoutée à l'histogramme et cumulée pour le
+    détail renvoyé avec la réponse.
+    """
+
+    def __init__(self, histogram=QUERY_STAGE_SECONDS):
+        self.histogram = histogram
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def span(self, stage):
+        """Mesure la durée du bloc comme étape stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def iterate(self, iterable, stage):
+        """Parcourt un itérable en comptant l'attente de chaque élément dans l'étape stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.span(stage):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def add(self, stage, seconds):
+        """Ajoute une durée (secondes) à une étape"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.histogram.observe(seconds, stage=stage)
+
+    def to_dict(self):
+        """Durées en millisecondes par étape, et durée totale depuis la création"""
+        timings = {f'{stage}_ms': round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        timings['total_ms'] = round((time.perf_counter() - self.start) * 1000, 2)
+        return timings
+
+    def summary(self):
+        """Résumé lisible des étapes (messages de la ligne de commande)"""
+        return ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in self.stages.items())
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pipeline de question-réponse (recherche + génération) réutilisé entre les requêtes"""
+
+import os
+import time
+import asyncio
+import requests
+from langchain_ollama import OllamaLLM
+from lexical import RRF_K
+from context import DEFAULT_DUPLICATE_THRESHOLD, SEPARATOR, estimate_tokens, pack_context
+from metrics import ANSWER_CACHE_LOOKUPS, Timings
+
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+# Délai maximum (secondes) de la vérification de santé du serveur de modèles
+HEALTH_CHECK_TIMEOUT = 2
+# Délai maximum (secondes) du chargement d'un modèle en mémoire par Ollama (préchauffage)
+WARMUP_TIMEOUT = 300
+# Après un échec du modèle d'embedding, les recherches sont lexicales (BM25) pendant ce délai (secondes)
+EMBEDDING_RETRY_DELAY = 30
+
+PROMPT_TEMPLATE = """Utilise les extraits de documents suivants pour répondre à la question. 
+Si tu ne trouves pas la réponse dans les documents, dis-le clairement.
+
+Contexte:
+{context}
+
+Question: {question}
+
+Réponse:"""
+
+
+def get_ollama_url(config):
+    """Retourne l'URL du serveur Ollama (models.base_url, sinon OLLAMA_HOST, sinon l'adresse locale)"""
+    url = config['models'].get('base_url') or os.environ.get('OLLAMA_HOST') or DEFAULT_OLLAMA_URL
+    if '://' not in url:
+        url = 'http://' + url
+    return url.rstrip('/')
+
+
+def warm_up_models(config):
+    """
+    Fait charger les modèles en mémoire par Ollama (préchauffage au démarrage).
+
+    Une génération sans prompt charge le modèle de génération sans rien
+    générer; un embedding d'un mot charge le modèle d'embedding (sauf en
+    recherche lexicale seule). La première question ne paie plus le
+    chargement des modèles. Un échec n'empêche pas le démarrage.
+
+    Returns:
+        True si tous les modèles ont été chargés
+    """
+    ollama_url = get_ollama_url(config)
+    requests_to_send = [('/api/generate', {'model': config['models']['generation_model'], 'prompt': '', 'stream': False})]
+    if config['search'].get('retrieval', 'hybrid') != 'lexical':
+        requests_to_send.append(('/api/embed', {'model': config['models']['embedding_model'], 'input': 'warmup'}))
+
+    ok = True
+    with requests.Session() as session:
+        for path, payload in requests_to_send:
+            try:
+                session.post(f"{ollama_url}{path}", json=payload, timeout=WARMUP_TIMEOUT).raise_for_status()
+            except requests.RequestException as e:
+                print(f"⚠️  Préchauffage du modèle '{payload['model']}' impossible: {e}")
+                ok = False
+    return ok
+
+
+class QueryPipeline:
+    """
+    Recherche des chunks pertinents, construction du prompt et génération.
+
+    Créé une fois au démarrage (et à chaque rechargement du vector store):
+    le LLM et la session HTTP de vérification de santé gardent leurs
+    connexions ouvertes d'une requête à l'autre.
+    """
+
+    def __init__(self, config, vectorstore, answer_cache=None):
+        self.config = config
+        self.vectorstore = vectorstore
+        search_config = config['search']
+        self.top_k = search_config['top_k']
+        # "hybrid" (BM25 + vecteurs), "vector" ou "lexical"
+        self.retrieval = search_config.get('retrieval', 'hybrid')
+        self.hybrid_candidates = search_config.get('hybrid_candidates', 20)
+        self.rrf_k = search_config.get('rrf_k', RRF_K)
+        # Assemblage du contexte: budget de tokens du prompt, fusion des chunks voisins et doublons
+        context_config = config.get('context', {})
+        self.max_tokens = config['models'].get('max_tokens')
+        self.max_overlap = config.get('chunking', {}).get('chunk_overlap')
+        self.merge_overlaps = context_config.get('merge_overlaps', True)
+        self.duplicate_threshold = context_config.get('duplicate_threshold', DEFAULT_DUPLICATE_THRESHOLD)
+        # Jusqu'à cette date (time.monotonic), le modèle d'embedding est considéré indisponible
+        self._embedding_down_until = 0.0
+        self.ollama_url = get_ollama_url(config)
+
+        # Cache des réponses, valable pour ce vector store uniquement
+        self.answer_cache = answer_cache
+        self.cache_generation = answer_cache.generation if answer_cache is not None else None
+
+        llm_kwargs = {
+            'model': config['models']['generation_model'],
+            'temperature': config['models']['temperature']
+        }
+        if config['models'].get('base_url'):
+            llm_kwargs['base_url'] = config['models']['base_url']
+        self.llm = OllamaLLM(**llm_kwargs)
+
+        # Session HTTP (keep-alive) pour les vérifications de santé
+        self._session = requests.Session()
+
+    def lookup(self, query_text, metadata_filter=None, timings=None):
+        """
+        Cherche une réponse en cache pour la question.
+
+        Le niveau exact est consulté sans calculer d'embedding; en cas d'échec,
+        l'embedding de la question est calculé (et réutilisé pour la recherche).
+        Les questions filtrées ne passent pas par le cache.
+
+        Args:
+            timings: Timings de la requête (étapes cache et embed)
+
+        Returns:
+            Tuple (response, embedding); response vaut None si la réponse n'est pas en cache
+        """
+        if self.answer_cache is None or metadata_filter is not None:
+            return None, None
+        timings = timings or Timings()
+        with timings.span('cache'):
+            response = self.answer_cache.get_exact(query_text)
+        if response is not None:
+            return self._cache_hit(response, 'exact'), None
+        with timings.span('embed'):
+            embedding = self.embed(query_text)
+        if embedding is None:
+            return None, None
+        with timings.span('cache'):
+            response = self.answer_cache.get_similar(embedding)
+        if response is not None:
+            return self._cache_hit(response, 'semantic'), embedding
+        ANSWER_CACHE_LOOKUPS.inc(result='miss')
+        return None, embedding
+
+    def _cache_hit(self, response, level):
+        ANSWER_CACHE_LOOKUPS.inc(result=level)
+        return dict(response, cached=level)
+
+    def embedding_degraded(self):
+        """True si le modèle d'embedding a échoué récemment (recherche lexicale seule)"""
+        return time.monotonic() < self._embedding_down_until
+
+    def embedding_enabled(self):
+        """True si les questions sont embeddées (recherche non lexicale, modèle d'embedding disponible)"""
+        return self.retrieval != 'lexical' and not self.embedding_degraded()
+
+    def _embedding_failed(self, error):
+        print(f"⚠️  Modèle d'embedding indisponible ({error}): recherche lexicale seule pendant {EMBEDDING_RETRY_DELAY} s")
+        self._embedding_down_until = time.monotonic() + EMBEDDING_RETRY_DELAY
+
+    def embed(self, query_text):
+        """
+        Calcule l'embedding de la question.
+
+        Returns:
+            Embedding, ou None si la recherche doit se passer du modèle
+            d'embedding (mode lexical, ou serveur de modèles en échec)
+        """
+        if not self.embedding_enabled():
+            return None
+        try:
+            return self.vectorstore.embeddings.embed_query(query_text)
+        except Exception as e:
+            self._embedding_failed(e)
+            return None
+
+    def search(self, query_text, embedding, metadata_filter=None):
+        """Chunks pertinents selon le mode de recherche (BM25 seul si embedding vaut None)"""
+        if embedding is None:
+            return self.vectorstore.lexical_search(query_text, k=self.top_k, filter=metadata_filter)
+        if self.retrieval == 'vector':
+            return self.vectorstore.similarity_search_by_vector(embedding, k=self.top_k, filter=metadata_filter)
+        return self.vectorstore.hybrid_search(
+            query_text, embedding, k=self.top_k, candidates=self.hybrid_candidates, rrf_k=self.rrf_k,
+            filter=metadata_filter
+        )
+
+    def remember(self, query_text, embedding, response):
+        """Met en cache la réponse à une question"""
+        if self.answer_cache is not None:
+            self.answer_cache.put(query_text, embedding, response, generation=self.cache_generation)
+
+    def retrieve(self, query_text, embedding=None, metadata_filter=None, timings=None):
+        """
+        Récupère les chunks pertinents et construit le prompt de génération.
+
+        Args:
+            query_text: Question de l'utilisateur
+            embedding: Embedding de la question s'il est déjà calculé
+            metadata_filter: MetadataFilter limitant la recherche (None = tous les chunks)
+            timings: Timings de la requête (étapes embed, search et prompt)
+
+        Returns:
+            Tuple (prompt, sources, docs, prompt_info)
+        """
+        timings = timings or Timings()
+        if embedding is None:
+            with timings.span('embed'):
+                embedding = self.embed(query_text)
+        with timings.span('search'):
+            docs = self.search(query_text, embedding, metadata_filter)
+        with timings.span('prompt'):
+            return self.build_prompt(query_text, docs)
+
+    def retrieve_batch(self, query_texts):
+        """
+        Version par lot de retrieve: les questions sont embeddées en un seul
+        lot et le top-k vectoriel est calculé sur la matrice des questions.
+
+        Returns:
+            Liste de tuples (prompt, sources, docs, prompt_info), dans l'ordre des questions
+        """
+        embeddings = None
+        if query_texts and self.embedding_enabled():
+            try:
+                embeddings = self.vectorstore.embeddings.embed_documents(list(query_texts))
+            except Exception as e:
+                self._embedding_failed(e)
+
+        if embeddings is None:
+            docs_lists = [self.search(query_text, None) for query_text in query_texts]
+        else:
+            docs_lists = self.vectorstore.batch_search(
+                query_texts, embeddings, k=self.top_k, candidates=self.hybrid_candidates,
+                rrf_k=self.rrf_k, hybrid=self.retrieval != 'vector'
+            )
+        return [self.build_prompt(query_text, docs) for query_text, docs in zip(query_texts, docs_lists)]
+
+    def build_prompt(self, query_text, docs):
+        """
+        Construit le prompt de génération.
+
+        Les chunks voisins qui se chevauchent sont fusionnés, les passages
+        quasi identiques retirés, et le contexte est limité au budget
+        models.max_tokens (question et consignes comprises).
+
+        Returns:
+            Tuple (prompt, sources, docs, prompt_info); prompt_info décrit la taille du prompt produit
+        """
+        reserved_tokens = estimate_tokens(PROMPT_TEMPLATE.format(context='', question=query_text))
+        passages, prompt_info = pack_context(
+            docs, self.max_tokens, reserved_tokens, max_overlap=self.max_overlap,
+            merge=self.merge_overlaps, duplicate_threshold=self.duplicate_threshold
+        )
+        context = SEPARATOR.join(passage.text for passage in passages)
+        prompt = PROMPT_TEMPLATE.format(context=context, question=query_text)
+        prompt_info['chars'] = len(prompt)
+        prompt_info['tokens'] = estimate_tokens(prompt)
+        prompt_info['max_tokens'] = self.max_tokens
+
+        # Extraire les sources des passages retenus
+        sources = list(set([passage.metadata.get('source', 'Inconnu') for passage in passages]))
+
+        return prompt, sources, docs, prompt_info
+
+    def finish(self, query_text, embedding, answer, sources, docs, prompt_info=None, metadata_filter=None):
+        """Met en cache et retourne la réponse générée (dictionnaire renvoyé par /api/query)"""
+        response = {
+            'answer': answer,
+            'sources': sources,
+            'chunks_found': len(docs),
+            'prompt': prompt_info
+        }
+        if metadata_filter is None:
+            self.remember(query_text, embedding, response)
+        return dict(response, cached=False)
+
+    def invoke(self, query_text, metadata_filter=None, timings=None):
+        """
+        Répond à une question; retourne le dictionnaire renvoyé par /api/query.
+
+        Args:
+            timings: Timings de la requête, complété par la durée de chaque étape
+        """
+        timings = timings or Timings()
+        cached, embedding = self.lookup(query_text, metadata_filter, timings)
+        if cached is not None:
+            return cached
+
+        prompt, sources, docs, prompt_info = self.retrieve(query_text, embedding, metadata_filter, timings)
+        with timings.span('generate'):
+            answer = self.llm.invoke(prompt)
+        return self.finish(query_text, embedding, answer, sources, docs, prompt_info, metadata_filter)
+
+    def stream(self, prompt):
+        """Génère la réponse à un prompt token par token"""
+        return self.llm.stream(prompt)
+
+    # Variantes asynchrones (mode de service ASGI): les appels au serveur de
+    # modèles et la recherche ne bloquent pas la boucle d'événements
+
+    async def alookup(self, query_text, metadata_filter=None, timings=None, embed=None):
+        """
+        Version asynchrone de lookup.
+
+        Args:
+            embed: Coroutine qui calcule l'embedding de la question (None = aembed)
+        """
+        if self.answer_cache is None or metadata_filter is not None:
+            return None, None
+        timings = timings or Timings()
+        with timings.span('cache'):
+            response = self.answer_cache.get_exact(query_text)
+        if response is not None:
+            return self._cache_hit(response, 'exact'), None
+        with timings.span('embed'):
+            embedding = await (embed or self.aembed)(query_text)
+        if embedding is None:
+            return None, None
+        with timings.span('cache'):
+            response = self.answer_cache.get_similar(embedding)
+        if response is not None:
+            return self._cache_hit(response, 'semantic'), embedding
+        ANSWER_CACHE_LOOKUPS.inc(result='miss')
+        return None, embedding
+
+    async def aembed(self, query_text):
+        """Version asynchrone de embed"""
+        if not self.embedding_enabled():
+            return None
+        try:
+            return await self.vectorstore.embeddings.aembed_query(query_text)
+        except Exception as e:
+            self._embedding_failed(e)
+            return None
+
+    async def aretrieve(self, query_text, embedding=None, metadata_filter=None, timings=None, embed=None):
+        """
+        Version asynchrone de retrieve.
+
+        Args:
+            embed: Coroutine qui calcule l'embedding de la question (None = aembed)
+        """
+        timings = timings or Timings()
+        if embedding is None:
+            with timings.span('embed'):
+                embedding = await (embed or self.aembed)(query_text)
+        # Le calcul des scores (NumPy) s'exécute dans un thread
+        with timings.span('search'):
+            docs = await asyncio.to_thread(self.search, query_text, embedding, metadata_filter)
+        with timings.span('prompt'):
+            return self.build_prompt(query_text, docs)
+
+    async def agenerate(self, prompt):
+        """Génère la réponse complète à un prompt"""
+        return await self.llm.ainvoke(prompt)
+
+    def astream(self, prompt):
+        """Génère la réponse à un prompt token par token (itérateur asynchrone)"""
+        return self.llm.astream(prompt)
+
+    def check_health(self):
+        """
+        Vérifie que le serveur de modèles répond et que le modèle de génération est disponible.
+
+        Liste les modèles (/api/tags) au lieu de lancer une génération: la
+        vérification coûte quelques millisecondes.
+
+        Returns:
+            Tuple (ok, message)
+        """
+        try:
+            response = self._session.get(f"{self.ollama_url}/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+            models = {model.get('name') for model in response.json().get('models', [])}
+        except (requests.RequestException, ValueError) as e:
+            return False, str(e)
+
+        generation_model = self.config['models']['generation_model']
+        if generation_model not in models and f"{generation_model}:latest" not in models:
+            return False, f"Modèle '{generation_model}' non disponible"
+        return True, "OK"
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quantification des embeddings: codes compacts pour le classement approximatif.
+
+- int8: quantification scalaire par dimension (1 octet par valeur, 4× plus
+  compact que float32)
+- pq: quantification par produit (le vecteur est découpé en sous-vecteurs,
+  chacun remplacé par le numéro du plus proche de 256 centroïdes: 1 octet
+  par sous-vecteur, 16× plus compact avec 4 dimensions par sous-vecteur)
+
+Les codes servent à classer tous les chunks (ou les candidats IVF); les
+meilleurs candidats sont ensuite recalculés avec les vecteurs complets
+(voir LocalVectorStore).
+"""
+
+import os
+
+import numpy as np
+
+QUANTIZATION_MODES = ('none', 'int8', 'pq')
+# Fichiers des codes d'un segment
+CODES_FILENAME = 'quant_codes.npy'
+SCALE_FILENAME = 'quant_scale.npy'
+PQ_CENTROIDS_FILENAME = 'pq_centroids.npy'
+# Centroïdes par sous-espace (codes sur un octet)
+PQ_CENTROIDS = 256
+# Dimensions par sous-vecteur par défaut (16× plus compact que float32)
+PQ_DEFAULT_SUBVECTOR_DIM = 4
+# Vecteurs d'entraînement du k-means de chaque sous-espace
+PQ_TRAINING_SAMPLES = 8192
+PQ_KMEANS_ITERATIONS = 8
+# Nombre de lignes traitées à la fois (encodage et calcul des scores): un bloc
+# converti en float32 reste dans le cache du processeur
+QUANTIZE_BLOCK_SIZE = 4096
+
+
+def default_subvectors(dim):
+    """Nombre de sous-vecteurs par défaut: le plus grand diviseur de dim d'au plus dim / 4"""
+    for subvectors in range(max(1, dim // PQ_DEFAULT_SUBVECTOR_DIM), 0, -1):
+        if dim % subvectors == 0:
+            return subvectors
+    return 1
+
+
+class ScalarQuantizer:
+    """
+    Quantification int8: chaque dimension est divisée par son échelle
+    (valeur absolue maximale / 127) puis arrondie.
+
+    Le produit scalaire approché est codes @ (question × échelle).
+    """
+
+    kind = 'int8'
+
+    def __init__(self, scale, codes=None):
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.codes = codes
+
+    @classmethod
+    def train(cls, matrix):
+        """Calcule l'échelle de chaque dimension sur les embeddings normalisés"""
+        absmax = np.zeros(matrix.shape[1], dtype=np.float32)
+        for start in range(0, matrix.shape[0], QUANTIZE_BLOCK_SIZE):
+            block = np.abs(np.asarray(matrix[start:start + QUANTIZE_BLOCK_SIZE], dtype=np.float32))
+            absmax = np.maximum(absmax, block.max(axis=0))
+        absmax[absmax == 0] = 1.0
+        return cls(absmax / 127.0)
+
+    def encode(self, matrix):
+        """Codes int8 des lignes de la matrice"""
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, matrix.shape[0], QUANTIZE_BLOCK_SIZE):
+            block = np.asarray(matrix[start:start + QUANTIZE_BLOCK_SIZE], dtype=np.float32)
+            codes[start:start + len(block)] = np.clip(np.rint(block / self.scale), -127, 127)
+        return codes
+
+    def save(self, directory):
+        np.save(os.path.join(directory, SCALE_FILENAME), self.scale)
+        np.save(os.path.join(directory, CODES_FILENAME), self.codes)
+
+    @classmethod
+    def load(cls, directory):
+        return cls(np.load(os.path.join(directory, SCALE_FILENAME)),
+                   np.load(os.path.join(directory, CODES_FILENAME), mmap_mode='r'))
+
+    def scores(self, query, rows=None):
+        """
+        Produits scalaires approchés entre la question (ou un lot: dimension × questions) et des lignes.
+
+        Args:
+            rows: Lignes à classer (None = toutes)
+        """
+        query = query * (self.scale if query.ndim == 1 else self.scale[:, None])
+        count = self.codes.shape[0] if rows is None else len(rows)
+        scores = np.empty((count,) + query.shape[1:], dtype=np.float32)
+        for start in range(0, count, QUANTIZE_BLOCK_SIZE):
+            block = self.codes[start:start + QUANTIZE_BLOCK_SIZE] if rows is None \
+                else self.codes[rows[start:start + QUANTIZE_BLOCK_SIZE]]
+            scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+        return scores
+
+    @property
+    def nbytes(self):
+        """Taille des codes et de l'échelle (octets)"""
+        return self.codes.nbytes + self.scale.nbytes
+
+
+def _nearest_centroids(vectors, centroids):
+    """Centroïde le plus proche (distance euclidienne) de chaque vecteur"""
+    return np.argmax(vectors @ centroids.T - 0.5 * np.einsum('kd,kd->k', centroids, centroids), axis=1)
+
+
+def _kmeans(sample, k, rng):
+    """k-means euclidien d'un sous-espace"""
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(PQ_KMEANS_ITERATIONS):
+        assignments = _nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack([
+            np.bincount(assignments, weights=sample[:, d], minlength=k) for d in range(sample.shape[1])
+        ], axis=1)
+        nonempty = counts > 0
+        centroids[nonempty] = (sums[nonempty] / counts[nonempty, None]).astype(np.float32)
+        # Un centroïde vide est réinitialisé sur un vecteur tiré au hasard
+        empty = ~nonempty
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+    return centroids
+
+
+class ProductQuantizer:
+    """
+    Quantification par produit: le vecteur est découpé en sous-vecteurs, et
+    chacun est codé par le numéro de son centroïde le plus proche.
+
+    Le produit scalaire approché est la somme, sur les sous-vecteurs, des
+    produits de la question par les centroïdes (table calculée une fois par
+    question). Les codes sont rangés par sous-vecteur (sous-vecteurs × lignes):
+    le parcours lit chaque colonne de codes d'un seul tenant.
+    """
+
+    kind = 'pq'
+
+    def __init__(self, centroids, codes=None):
+        # centroids: sous-vecteurs × centroïdes × dimensions du sous-vecteur
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.subvectors, _, self.subvector_dim = self.centroids.shape
+        self.codes = codes
+
+    @classmethod
+    def train(cls, matrix, subvectors=0, seed=0):
+        """Entraîne les centroïdes de chaque sous-espace sur un échantillon des embeddings"""
+        rng = np.random.default_rng(seed)
+        count, dim = matrix.shape
+        subvectors = subvectors or default_subvectors(dim)
+        if dim % subvectors:
+            raise ValueError(f"storage.pq_subvectors ({subvectors}) doit diviser la dimension des embeddings ({dim})")
+        sample_size = min(count, PQ_TRAINING_SAMPLES)
+        sample_rows = np.sort(rng.choice(count, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        k = min(PQ_CENTROIDS, sample_size)
+        subvector_dim = dim // subvectors
+        centroids = np.zeros((subvectors, PQ_CENTROIDS, subvector_dim), dtype=np.float32)
+        for j in range(subvectors):
+            centroids[j, :k] = _kmeans(np.ascontiguousarray(sample[:, j * subvector_dim:(j + 1) * subvector_dim]), k, rng)
+        if k < PQ_CENTROIDS:
+            # Petit index: les centroïdes en trop ne sont jamais choisis
+            centroids[:, k:] = centroids[:, :1]
+        return cls(centroids)
+
+    def encode(self, matrix):
+        """Codes uint8 (sous-vecteurs × lignes) des lignes de la matrice"""
+        codes = np.empty((self.subvectors, matrix.shape[0]), dtype=np.uint8)
+        for start in range(0, matrix.shape[0], QUANTIZE_BLOCK_SIZE):
+            block = np.asarray(matrix[start:start + QUANTIZE_BLOCK_SIZE], dtype=np.float32)
+            for j in range(self.subvectors):
+                part = block[:, j * self.subvector_dim:(j + 1) * self.subvector_dim]
+                codes[j, start:start + len(block)] = _nearest_centroids(part, self.centroids[j])
+        return codes
+
+    def save(self, directory):
+        np.save(os.path.join(directory, PQ_CENTROIDS_FILENAME), self.centroids)
+        np.save(os.path.join(directory, CODES_FILENAME), self.codes)
+
+    @classmethod
+    def load(cls, directory):
+        return cls(np.load(os.path.join(directory, PQ_CENTROIDS_FILENAME)),
+                   np.load(os.path.join(directory, CODES_FILENAME), mmap_mode='r'))
+
+    def _tables(self, query):
+        """Produits de la question par les centroïdes de chaque sous-espace (sous-vecteurs × centroïdes)"""
+        return np.einsum('jkd,jd->jk', self.centroids, query.reshape(self.subvectors, self.subvector_dim))
+
+    def scores(self, query, rows=None):
+        """
+        Produits scalaires approchés entre la question (ou un lot: dimension × questions) et des lignes.
+
+        Args:
+            rows: Lignes à classer (None = toutes)
+        """
+        if query.ndim == 2:
+            return np.stack([self.scores(np.ascontiguousarray(q), rows) for q in query.T], axis=1)
+        tables = self._tables(query)
+        codes = self.codes if rows is None else self.codes[:, rows]
+        scores = np.zeros(codes.shape[1], dtype=np.float32)
+        for j in range(self.subvectors):
+            scores += tables[j].take(codes[j])
+        return scores
+
+    @property
+    def nbytes(self):
+        """Taille des codes et des centroïdes (octets)"""
+        return self.codes.nbytes + self.centroids.nbytes
+
+
+def train_quantizer(matrix, mode, subvectors=0):
+    """
+    Entraîne un quantificateur et encode la matrice.
+
+    Args:
+        matrix: Embeddings normalisés (une ligne par chunk)
+        mode: 'int8' ou 'pq'
+        subvectors: PQ: nombre de sous-vecteurs (0 = dimension / 4)
+
+    Returns:
+        Quantificateur avec ses codes
+    """
+    quantizer = ScalarQuantizer.train(matrix) if mode == 'int8' else ProductQuantizer.train(matrix, subvectors)
+    quantizer.codes = quantizer.encode(matrix)
+    return quantizer
+
+
+def load_quantizer(directory, mode):
+    """Ouvre les codes d'un segment (mappés en mémoire)"""
+    return ScalarQuantizer.load(directory) if mode == 'int8' else ProductQuantizer.load(directory)
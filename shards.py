@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vector store partitionné en shards.
+
+Chaque shard est un vector store complet (versions, journal, index IVF et
+BM25) dans index/shard-NNN/ (index/layout-NNNNNN/shard-NNN/ après une
+nouvelle répartition): il est indexé, reconstruit et ouvert
+indépendamment des autres. Tous les chunks d'une source sont dans le même
+shard (hash de la source): réindexer une source n'écrit que dans son shard.
+
+Les recherches sont lancées en parallèle sur tous les shards (threads: NumPy
+libère le GIL pendant les produits matriciels) et les top-k de chaque shard
+sont fusionnés par score.
+"""
+
+import os
+import json
+import shutil
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.vectorstores import VectorStore
+from lexical import RRF_K, reciprocal_rank_fusion
+from store import (LEGACY_STORE_FILENAME, LOG_SUFFIX, OPEN_RETRIES, SHARDS_FILENAME, LocalVectorStore, store_exists,
+                   load_store, normalize_rows)
+
+SHARD_DIRNAME = 'shard-{:03d}'
+# Dossier d'une répartition écrite par python ingest.py --reshard (publiée par shards.json)
+LAYOUT_DIRNAME = 'layout-{:06d}'
+MAX_SHARDS = 1024
+
+_executor = None
+
+
+def get_shard_count(config):
+    """Retourne le nombre de shards configuré (storage.shards, 1 = vector store unique)"""
+    count = config.get('storage', {}).get('shards', 1)
+    if not isinstance(count, int) or not 1 <= count <= MAX_SHARDS:
+        raise ValueError(f"storage.shards doit être un entier entre 1 et {MAX_SHARDS} (reçu: {count})")
+    return count
+
+
+def shard_of(source, count):
+    """Numéro du shard d'une source (stable d'un processus et d'une exécution à l'autre)"""
+    return zlib.crc32(str(source or '').encode('utf-8')) % count
+
+
+def _read_shards_file(path):
+    """Contenu de shards.json ({'count': int, 'layout': dossier optionnel}, None = vector store non partitionné)"""
+    try:
+        with open(os.path.join(path, SHARDS_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_shard_count(path):
+    """Nombre de shards du vector store sur disque (None = vector store unique, non partitionné)"""
+    shards = _read_shards_file(path)
+    return None if shards is None else shards['count']
+
+
+def shard_paths(path):
+    """Dossiers des shards du vector store (le dossier lui-même s'il n'est pas partitionné)"""
+    shards = _read_shards_file(path)
+    if shards is None:
+        return [path]
+    root = os.path.join(path, shards['layout']) if shards.get('layout') else path
+    return [os.path.join(root, SHARD_DIRNAME.format(i)) for i in range(shards['count'])]
+
+
+def create_shards(path, count, layout=None):
+    """
+    Crée un vector store vide partitionné en count shards (les shards sont créés à leur première écriture).
+
+    Args:
+        layout: Dossier (dans path) qui contient les shards (None = path lui-même)
+    """
+    os.makedirs(path, exist_ok=True)
+    shards = {'count': count}
+    if layout:
+        shards['layout'] = layout
+    tmp_file = os.path.join(path, SHARDS_FILENAME + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(shards, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, os.path.join(path, SHARDS_FILENAME))
+    # Rendre le remplacement durable avant toute suppression de l'ancienne répartition
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def new_layout(path):
+    """Nom du dossier d'une nouvelle répartition des shards (pas encore publiée)"""
+    numbers = [
+        int(name[len('layout-'):]) for name in (os.listdir(path) if os.path.isdir(path) else [])
+        if name.startswith('layout-') and name[len('layout-'):].isdigit()
+    ]
+    return LAYOUT_DIRNAME.format(max(numbers, default=0) + 1)
+
+
+def publish_layout(path, count, layout):
+    """
+    Publie une répartition écrite dans path/layout, puis supprime l'ancienne.
+
+    Le remplacement de shards.json est atomique: un lecteur voit l'ancienne
+    ou la nouvelle répartition, jamais un index absent. Les processus qui
+    ont déjà ouvert l'ancienne gardent leurs fichiers mappés en mémoire.
+    """
+    create_shards(path, count, layout)
+    # Ancien vector store (unique ou partitionné) et répartitions interrompues
+    for entry in os.listdir(path):
+        if entry in (SHARDS_FILENAME, layout):
+            continue
+        entry_path = os.path.join(path, entry)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path, ignore_errors=True)
+        else:
+            os.remove(entry_path)
+    legacy_path = os.path.join(os.path.dirname(path), LEGACY_STORE_FILENAME)
+    for obsolete in (path + LOG_SUFFIX, legacy_path, legacy_path + LOG_SUFFIX):
+        if os.path.exists(obsolete):
+            os.remove(obsolete)
+
+
+def _search_executor():
+    """Threads partagés par les recherches sur les shards (créés au premier usage)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='shard-search')
+    return _executor
+
+
+def parallel_map(function, items):
+    """Applique function à chaque élément en parallèle; résultats dans l'ordre des éléments"""
+    items = list(items)
+    if len(items) < 2:
+        return [function(item) for item in items]
+    return list(_search_executor().map(function, items))
+
+
+def load_shards(path, embedding_model=None, dtype='float32'):
+    """
+    Ouvre les shards du vector store en parallèle.
+
+    Returns:
+        Liste de StoreData (un par shard existant, dans l'ordre des shards)
+
+    Raises:
+        EmbeddingModelMismatch: Si un shard ne correspond pas au modèle d'embedding
+    """
+    for attempt in range(OPEN_RETRIES):
+        shards = _read_shards_file(path)
+        paths = [shard_path for shard_path in shard_paths(path) if store_exists(shard_path)]
+        try:
+            stores = parallel_map(lambda shard_path: load_store(shard_path, embedding_model, dtype=dtype), paths)
+        except FileNotFoundError:
+            # Répartition remplacée (python ingest.py --reshard) pendant l'ouverture
+            if attempt == OPEN_RETRIES - 1:
+                raise
+            continue
+        if _read_shards_file(path) == shards or attempt == OPEN_RETRIES - 1:
+            return stores
+
+
+class ShardedStoreData:
+    """Contenu de l'ensemble des shards (taille et versions, pour /api/status et /metrics)"""
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    def __len__(self):
+        return sum(len(data) for data in self.shards)
+
+    @property
+    def version(self):
+        """Versions des shards, dans l'ordre des shards"""
+        return ','.join(data.version or '-' for data in self.shards)
+
+
+def _top(rankings, k):
+    """
+    Fusionne les classements des shards (lignes globales et scores) en un top-k.
+
+    Args:
+        rankings: Liste de (rows, scores), déjà décalés en lignes globales
+    """
+    rows = [r for r, _ in rankings if len(r)]
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows = np.concatenate(rows)
+    scores = np.concatenate([s for r, s in rankings if len(r)])
+    order = np.argsort(-scores, kind='stable')[:k]
+    return rows[order], scores[order]
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Recherche répartie sur des LocalVectorStore (un par shard).
+
+    Les lignes sont numérotées à la suite d'un shard à l'autre; chaque
+    recherche calcule le top-k de chaque shard en parallèle puis les fusionne.
+    Le classement BM25 utilise les statistiques (IDF, longueur moyenne) de
+    l'ensemble des shards, sommées avant la recherche: il est identique à
+    celui d'un vector store unique.
+    """
+
+    def __init__(self, embedding, shards):
+        self._embedding_function = embedding
+        self.shards = list(shards)
+        self._data = ShardedStoreData([shard.data for shard in self.shards])
+        self._update_offsets()
+
+    def _update_offsets(self):
+        """Calcule la première ligne (globale) de chaque shard"""
+        counts = [shard.data.base_count + len(shard.data.delta_texts) for shard in self.shards]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    @property
+    def data(self):
+        """Contenu (instantané) des shards"""
+        return self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def _document(self, row):
+        shard = int(np.searchsorted(self._offsets, row, side='right')) - 1
+        return self.shards[shard]._document(int(row - self._offsets[shard]))
+
+    def _fan_out(self, function):
+        """Applique function(index, shard) aux shards non vides, en parallèle"""
+        targets = [(i, shard) for i, shard in enumerate(self.shards) if len(shard)]
+        return parallel_map(lambda target: function(*target), targets)
+
+    def _shard_vector_ranking(self, shard_index, shard, embedding, k, metadata_filter):
+        rows, scores = shard._vector_ranking(embedding, k, shard._allowed_rows(metadata_filter))
+        return rows + self._offsets[shard_index], scores
+
+    def _vector_ranking(self, embedding, k, metadata_filter=None):
+        """Lignes (globales) des k chunks les plus proches de l'embedding et leurs similarités, triées"""
+        return _top(self._fan_out(
+            lambda i, shard: self._shard_vector_ranking(i, shard, embedding, k, metadata_filter)), k)
+
+    def _lexical_stats(self, queries):
+        """Statistiques BM25 de l'ensemble des shards pour chaque question"""
+        per_shard = self._fan_out(lambda i, shard: [shard.data.lexical().term_stats(query) for query in queries])
+        stats = []
+        for q in range(len(queries)):
+            count = sum(shard_stats[q][0] for shard_stats in per_shard)
+            total_length = sum(shard_stats[q][1] for shard_stats in per_shard)
+            df = {}
+            for shard_stats in per_shard:
+                for term, term_df in shard_stats[q][2].items():
+                    df[term] = df.get(term, 0) + term_df
+            stats.append((count, total_length, df))
+        return stats
+
+    def _lexical_ranking(self, shard_index, shard, query, k, metadata_filter, stats):
+        rows, scores = shard.data.lexical().search(query, k, shard._allowed_rows(metadata_filter), stats)
+        return rows + self._offsets[shard_index], scores
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """Retourne les k chunks les plus proches avec leur distance cosinus (filter: MetadataFilter)"""
+        rows, scores = self._vector_ranking(embedding, k, filter)
+        return [(self._document(row), float(1.0 - score)) for row, score in zip(rows, scores)]
+
+    def lexical_search(self, query, k=4, filter=None):
+        """Retourne les k chunks les mieux classés par BM25 (sans appel au modèle d'embedding)"""
+        if len(self._data) == 0:
+            return []
+        stats = self._lexical_stats([query])[0]
+        rows, _ = _top(self._fan_out(lambda i, shard: self._lexical_ranking(i, shard, query, k, filter, stats)), k)
+        return [self._document(row) for row in rows]
+
+    def hybrid_search(self, query, embedding, k=4, candidates=None, rrf_k=RRF_K, filter=None):
+        """Recherche hybride: classements vectoriel et BM25 de tous les shards fusionnés par RRF"""
+        if len(self._data) == 0:
+            return []
+        candidates = max(k, candidates or k)
+        stats = self._lexical_stats([query])[0]
+
+        def search(i, shard):
+            return (self._shard_vector_ranking(i, shard, embedding, candidates, filter),
+                    self._lexical_ranking(i, shard, query, candidates, filter, stats))
+
+        results = self._fan_out(search)
+        vector_rows, _ = _top([vector for vector, _ in results], candidates)
+        lexical_rows, _ = _top([lexical for _, lexical in results], candidates)
+        rows = reciprocal_rank_fusion([vector_rows, lexical_rows], k, rrf_k)
+        return [self._document(row) for row in rows]
+
+    def batch_search(self, queries, embeddings, k=4, candidates=None, rrf_k=RRF_K, hybrid=True):
+        """Recherche pour un lot de questions (top-k vectoriel de chaque shard calculé sur la matrice des questions)"""
+        if len(self._data) == 0 or not len(queries):
+            return [[] for _ in queries]
+        candidates = max(k, candidates or k) if hybrid else k
+        stats = self._lexical_stats(queries) if hybrid else None
+
+        def search(i, shard):
+            offset = self._offsets[i]
+            vector = [(rows + offset, scores) for rows, scores in shard._batch_vector_rankings(embeddings, candidates)]
+            lexical = []
+            if hybrid:
+                lexical = [self._lexical_ranking(i, shard, query, candidates, None, query_stats)
+                           for query, query_stats in zip(queries, stats)]
+            return vector, lexical
+
+        results = self._fan_out(search)
+        documents = []
+        for q in range(len(queries)):
+            vector_rows, _ = _top([vector[q] for vector, _ in results], candidates)
+            if hybrid:
+                lexical_rows, _ = _top([lexical[q] for _, lexical in results], candidates)
+                rows = reciprocal_rank_fusion([vector_rows, lexical_rows], k, rrf_k)
+            else:
+                rows = vector_rows[:k]
+            documents.append([self._document(row) for row in rows])
+        return documents
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        """
+        Ajoute des chunks en mémoire (comme LocalVectorStore.add_texts), chacun
+        dans le shard de sa source comme à l'indexation.
+
+        Returns:
+            Numéros de ligne (globaux) des chunks ajoutés, dans l'ordre des textes
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas or [{} for _ in texts])
+        vectors = normalize_rows(np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32))
+        rows_per_shard = {}
+        for i, meta in enumerate(metadatas):
+            rows_per_shard.setdefault(shard_of(meta.get('source'), len(self.shards)), []).append(i)
+
+        local_rows = {}
+        for shard, rows in rows_per_shard.items():
+            data = self.shards[shard].data
+            start = data.base_count + len(data.delta_texts)
+            data.append([texts[i] for i in rows], [metadatas[i] for i in rows], vectors[rows])
+            local_rows.update((i, (shard, start + position)) for position, i in enumerate(rows))
+        self._update_offsets()
+        return [str(int(self._offsets[shard] + row)) for shard, row in (local_rows[i] for i in range(len(texts)))]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, shard_count=2, **kwargs):
+        """Crée un vector store partitionné en mémoire (shard_count shards, répartition par source)"""
+        shard_count = get_shard_count({'storage': {'shards': shard_count}})
+        store = cls(embedding, [LocalVectorStore(embedding) for _ in range(shard_count)])
+        store.add_texts(texts, metadatas)
+        return store
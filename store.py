@@ -0,0 +1,1289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Stockage persistant du vector store (textes, metadatas et embeddings)"""
+
+import os
+import json
+import pickle
+import shutil
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from ann import IVFIndex, assign_ivf, inverted_lists
+from lexical import RRF_K, BM25Postings, LexicalIndex, build_postings, reciprocal_rank_fusion
+from quantization import QUANTIZATION_MODES, ProductQuantizer, train_quantizer, load_quantizer
+
+# Version du format sur disque:
+# 1 = pickle, textes seuls; 2 = pickle, textes + matrice d'embeddings;
+# 3 = dossier mappé en mémoire (matrice contiguë, textes indexés par offsets, metadatas en colonnes)
+STORE_FORMAT_VERSION = 3
+STORE_DIRNAME = 'index'
+LEGACY_STORE_FILENAME = 'vectorstore.pkl'
+MANIFEST_FILENAME = 'manifest.json'
+# Chaque sauvegarde complète crée une nouvelle version (versions/vNNNNNN);
+# le fichier CURRENT désigne la version active et est remplacé atomiquement
+VERSIONS_DIRNAME = 'versions'
+CURRENT_FILENAME = 'CURRENT'
+# Nombre de versions conservées (la version active et les précédentes, encore utilisées
+# par les lecteurs qui les ont ouvertes avant la bascule)
+KEEP_VERSIONS = 3
+# Nombre de tentatives d'ouverture si la version active change pendant la lecture
+OPEN_RETRIES = 5
+# Journal des chunks ajoutés à une version depuis sa création (append-only)
+JOURNAL_FILENAME = 'journal.log'
+LOG_SUFFIX = '.log'
+# Vector store partitionné: nombre de shards (chaque shard est un vector store complet, voir shards.py)
+SHARDS_FILENAME = 'shards.json'
+STORAGE_DTYPES = ('float32', 'float16')
+# Au-delà de ce nombre de valeurs distinctes, une colonne de metadata n'est plus encodée par dictionnaire
+DICTIONARY_MAX_VALUES = 65536
+# Nombre de lignes converties à la fois pour calculer les scores d'une matrice float16
+SCORE_BLOCK_SIZE = 65536
+# Nombre maximum de scores calculés à la fois pour un lot de questions (lignes × questions)
+BATCH_SCORE_BUDGET = 1 << 24
+# Index quantifié: candidats recalculés avec les vecteurs complets (0 = classement approché seul)
+DEFAULT_RERANK_CANDIDATES = 100
+# Taille du journal (non quantifié, gardé en mémoire) au-delà de laquelle la version est réécrite
+# avec ses codes, en proportion de la matrice du segment
+QUANTIZED_JOURNAL_RATIO = 0.1
+# Tableaux de l'index lexical BM25 d'un segment (fichiers bm25_<nom>.npy)
+BM25_ARRAYS = ('terms', 'offsets', 'docs', 'tfs', 'lengths')
+# Metadatas qui définissent les partitions d'un segment (lignes contiguës filtrables sans parcours)
+PARTITION_KEYS = ('source', 'type', 'indexed_at')
+
+
+class EmbeddingModelMismatch(Exception):
+    """Le vector store sur disque ne correspond pas au modèle d'embedding configuré"""
+
+
+def get_store_path(config):
+    """Retourne le chemin du dossier du vector store"""
+    return os.path.join(config['paths']['vectorstore_dir'], STORE_DIRNAME)
+
+
+def get_store_dtype(config):
+    """Retourne le type des embeddings sur disque ('float32' ou 'float16')"""
+    dtype = config.get('storage', {}).get('dtype', 'float32')
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"storage.dtype doit valoir {' ou '.join(STORAGE_DTYPES)} (reçu: {dtype})")
+    return dtype
+
+
+def get_store_quantization(config):
+    """
+    Retourne la quantification des embeddings configurée (storage.quantization).
+
+    Returns:
+        None (pas de quantification) ou dictionnaire {'mode': 'int8' ou 'pq', 'subvectors': int}
+    """
+    storage = config.get('storage', {})
+    mode = storage.get('quantization', 'none') or 'none'
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"storage.quantization doit valoir {', '.join(QUANTIZATION_MODES)} (reçu: {mode})")
+    subvectors = storage.get('pq_subvectors', 0) or 0
+    if not isinstance(subvectors, int) or subvectors < 0:
+        raise ValueError(f"storage.pq_subvectors doit être un entier positif (reçu: {subvectors})")
+    if mode == 'none':
+        return None
+    return {'mode': mode, 'subvectors': subvectors}
+
+
+def _legacy_path(path):
+    """Chemin de l'ancien vector store pickle (formats 1 et 2)"""
+    return os.path.join(os.path.dirname(path), LEGACY_STORE_FILENAME)
+
+
+def _current_version(path):
+    """
+    Retourne (nom, dossier, journal) de la version active du vector store, ou (None, None, None).
+
+    Un dossier sans versions (manifeste à la racine) est traité comme une version unique.
+    """
+    try:
+        with open(os.path.join(path, CURRENT_FILENAME), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+        version_dir = os.path.join(path, VERSIONS_DIRNAME, name)
+        return name, version_dir, os.path.join(version_dir, JOURNAL_FILENAME)
+    except FileNotFoundError:
+        if os.path.exists(os.path.join(path, MANIFEST_FILENAME)):
+            return '', path, path + LOG_SUFFIX
+        return None, None, None
+
+
+def store_exists(path):
+    """Indique si un vector store (nouveau ou ancien format, unique ou partitionné) existe"""
+    return (_current_version(path)[0] is not None or os.path.exists(_legacy_path(path))
+            or os.path.exists(os.path.join(path, SHARDS_FILENAME)))
+
+
+def _write_strings(directory, name, strings):
+    """Écrit une colonne de chaînes: blob UTF-8 concaténé + offsets (int64)"""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(os.path.join(directory, f'{name}.bin'), 'wb') as f:
+        position = 0
+        for i, value in enumerate(strings):
+            data = value.encode('utf-8')
+            f.write(data)
+            position += len(data)
+            offsets[i + 1] = position
+    np.save(os.path.join(directory, f'{name}.idx.npy'), offsets)
+
+
+class StringColumn:
+    """Colonne de chaînes mappée en mémoire (une ligne est lue sans charger les autres)"""
+
+    def __init__(self, directory, name):
+        self._offsets = np.load(os.path.join(directory, f'{name}.idx.npy'), mmap_mode='r')
+        blob_path = os.path.join(directory, f'{name}.bin')
+        if os.path.getsize(blob_path):
+            self._blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+
+
+def _json_key(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _write_metadata(directory, metadatas):
+    """
+    Écrit les metadatas en colonnes.
+
+    Les colonnes à faible cardinalité (source, type...) sont encodées par
+    dictionnaire (codes int32); les autres sont stockées en chaînes JSON.
+
+    Returns:
+        Description des colonnes pour le manifeste
+    """
+    names = sorted({key for meta in metadatas for key in meta})
+    # Un dictionnaire n'est utile que si les valeurs se répètent (source, type, page...)
+    max_values = min(DICTIONARY_MAX_VALUES, max(16, len(metadatas) // 2))
+    columns = {}
+    for name in names:
+        keys = {}
+        values = []
+        # -1 = metadata absente pour ce chunk
+        codes = np.full(len(metadatas), -1, dtype=np.int32)
+        for i, meta in enumerate(metadatas):
+            if name not in meta:
+                continue
+            key = _json_key(meta[name])
+            if key not in keys:
+                if len(values) >= max_values:
+                    break
+                keys[key] = len(values)
+                values.append(json.loads(key))
+            codes[i] = keys[key]
+        else:
+            np.save(os.path.join(directory, f'meta.{name}.codes.npy'), codes)
+            columns[name] = {'kind': 'dictionary', 'values': values}
+            continue
+
+        # Trop de valeurs distinctes: chaînes JSON ('' = metadata absente)
+        _write_strings(directory, f'meta.{name}', [
+            _json_key(meta[name]) if name in meta else '' for meta in metadatas
+        ])
+        columns[name] = {'kind': 'strings'}
+    return columns
+
+
+class MetadataColumns:
+    """Metadatas en colonnes mappées en mémoire"""
+
+    def __init__(self, directory, columns):
+        self._columns = {}
+        for name, column in columns.items():
+            if column['kind'] == 'dictionary':
+                codes = np.load(os.path.join(directory, f'meta.{name}.codes.npy'), mmap_mode='r')
+                self._columns[name] = ('dictionary', codes, column['values'])
+            else:
+                self._columns[name] = ('strings', StringColumn(directory, f'meta.{name}'), None)
+
+    def dictionary(self, name):
+        """Retourne (codes, values) d'une colonne encodée par dictionnaire, ou None"""
+        column = self._columns.get(name)
+        if column is None or column[0] != 'dictionary':
+            return None
+        return column[1], column[2]
+
+    def row(self, i):
+        """Reconstruit le dictionnaire de metadatas d'un chunk"""
+        meta = {}
+        for name, (kind, data, values) in self._columns.items():
+            if kind == 'dictionary':
+                code = data[i]
+                if code >= 0:
+                    meta[name] = values[code]
+            else:
+                raw = data[i]
+                if raw:
+                    meta[name] = json.loads(raw)
+        return meta
+
+
+def _fsync_path(path):
+    """Force l'écriture sur disque d'un fichier ou d'un dossier (ignoré si le système ne le permet pas)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _fsync_directory(directory):
+    """Force l'écriture sur disque de tous les fichiers d'un dossier, puis du dossier"""
+    for name in os.listdir(directory):
+        _fsync_path(os.path.join(directory, name))
+    _fsync_path(directory)
+
+
+def _partitions(metadatas):
+    """Plages de lignes consécutives de mêmes source, type et date d'indexation"""
+    partitions = []
+    for i, meta in enumerate(metadatas):
+        values = {name: meta.get(name) for name in PARTITION_KEYS}
+        if partitions and all(partitions[-1][name] == value for name, value in values.items()):
+            partitions[-1]['end'] = i + 1
+        else:
+            partitions.append(dict(values, start=i, end=i + 1))
+    return partitions
+
+
+def write_segment(directory, texts, metadatas, matrix, embedding_model, dtype='float32',
+                  ivf_lists=None, ivf_centroids=None, quantization=None):
+    """
+    Écrit un segment (dossier) complet du vector store.
+
+    Args:
+        directory: Dossier à créer
+        texts: Textes des chunks
+        metadatas: Metadatas des chunks
+        matrix: Embeddings normalisés (une ligne par chunk)
+        embedding_model: Nom du modèle d'embedding
+        dtype: Type de la matrice sur disque ('float32' ou 'float16')
+        ivf_lists: Cluster IVF de chaque chunk (None = pas d'index IVF)
+        ivf_centroids: Centroïdes de l'index IVF
+        quantization: Codes compacts à calculer (voir get_store_quantization, None = aucun)
+    """
+    os.makedirs(directory)
+
+    np.save(os.path.join(directory, 'vectors.npy'), np.ascontiguousarray(matrix, dtype=dtype))
+    _write_strings(directory, 'texts', texts)
+    columns = _write_metadata(directory, metadatas)
+
+    has_ivf = ivf_lists is not None and ivf_centroids is not None
+    if has_ivf:
+        order, offsets = inverted_lists(ivf_lists, len(ivf_centroids))
+        np.save(os.path.join(directory, 'ivf_centroids.npy'), np.asarray(ivf_centroids, dtype=np.float32))
+        np.save(os.path.join(directory, 'ivf_lists.npy'), np.asarray(ivf_lists, dtype=np.int32))
+        np.save(os.path.join(directory, 'ivf_order.npy'), order)
+        np.save(os.path.join(directory, 'ivf_offsets.npy'), offsets)
+
+    # Codes quantifiés, calculés sur les vecteurs float32 (avant conversion en dtype)
+    quantizer = None
+    if quantization is not None and len(texts):
+        quantizer = train_quantizer(matrix, quantization['mode'], quantization['subvectors'])
+        quantizer.save(directory)
+
+    # Index inversé BM25, construit une fois ici plutôt qu'à chaque ouverture
+    for name, array in zip(BM25_ARRAYS, build_postings(texts)):
+        np.save(os.path.join(directory, f'bm25_{name}.npy'), array)
+
+    # Le manifeste est écrit en dernier: un dossier sans manifeste est incomplet
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'embedding_model': embedding_model,
+        'embedding_dim': int(matrix.shape[1]),
+        'count': len(texts),
+        'dtype': dtype,
+        'ivf': has_ivf,
+        'bm25': True,
+        'quantization': quantizer.kind if quantizer is not None else None,
+        'pq_subvectors': quantizer.subvectors if isinstance(quantizer, ProductQuantizer) else None,
+        'metadata_columns': columns,
+        'partitions': _partitions(metadatas)
+    }
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    _fsync_directory(directory)
+
+
+class Segment:
+    """Segment du vector store ouvert en lecture (matrice, textes et metadatas mappés en mémoire)"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.directory = directory
+        self.count = self.manifest['count']
+        self.embedding_model = self.manifest['embedding_model']
+        self.embedding_dim = self.manifest['embedding_dim']
+        self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        self.texts = StringColumn(directory, 'texts')
+        self.metadata = MetadataColumns(directory, self.manifest['metadata_columns'])
+
+        self.ivf_centroids = None
+        self.ivf_lists = None
+        self.ivf = None
+        if self.manifest.get('ivf'):
+            self.ivf_centroids = np.load(os.path.join(directory, 'ivf_centroids.npy'))
+            self.ivf_lists = np.load(os.path.join(directory, 'ivf_lists.npy'), mmap_mode='r')
+            self.ivf = IVFIndex(
+                self.ivf_centroids,
+                np.load(os.path.join(directory, 'ivf_order.npy'), mmap_mode='r'),
+                np.load(os.path.join(directory, 'ivf_offsets.npy'))
+            )
+
+        # Codes quantifiés (classement approché, voir LocalVectorStore)
+        self.quantizer = None
+        if self.manifest.get('quantization'):
+            self.quantizer = load_quantizer(directory, self.manifest['quantization'])
+
+        # Segments écrits avant les partitions: calculées au premier filtrage
+        self.partitions = self.manifest.get('partitions')
+
+        # Segments écrits avant l'index BM25: construit en mémoire à la première recherche lexicale
+        self.bm25 = None
+        if self.manifest.get('bm25'):
+            self.bm25 = BM25Postings(*(
+                np.load(os.path.join(directory, f'bm25_{name}.npy'), mmap_mode='r') for name in BM25_ARRAYS
+            ))
+
+    def partition_rows(self, metadata_filter):
+        """Lignes du segment retenues par un filtre, triées, sans lire les vecteurs ni les metadatas"""
+        if self.partitions is None:
+            self.partitions = self._scan_partitions()
+        parts = [
+            np.arange(partition['start'], partition['end']) if 'rows' not in partition else partition['rows']
+            for partition in self.partitions
+            if metadata_filter.matches(partition['source'], partition['type'], partition['indexed_at'])
+        ]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(parts)
+        return rows if 'partitions' in self.manifest else np.sort(rows)
+
+    def _scan_partitions(self):
+        """Partitions d'un segment non regroupé par source (lignes listées une par une)"""
+        groups = {}
+        for i in range(self.count):
+            meta = self.metadata.row(i)
+            key = _json_key([meta.get(name) for name in PARTITION_KEYS])
+            groups.setdefault(key, []).append(i)
+        return [
+            dict(zip(PARTITION_KEYS, json.loads(key)), rows=np.array(rows, dtype=np.int64))
+            for key, rows in groups.items()
+        ]
+
+
+def save_store(path, texts, metadatas, embeddings, embedding_model, ivf_lists=None,
+               ivf_centroids=None, dtype='float32', quantization=None):
+    """
+    Sauvegarde les textes, metadatas et la matrice d'embeddings.
+
+    Args:
+        path: Dossier du vector store
+        texts: Liste des textes des chunks
+        metadatas: Liste des metadatas des chunks
+        embeddings: Matrice (ou liste de vecteurs) d'embeddings, une ligne par chunk
+        embedding_model: Nom du modèle d'embedding utilisé
+        ivf_lists: Cluster IVF de chaque chunk (None = pas d'index IVF)
+        ivf_centroids: Centroïdes de l'index IVF
+        dtype: Type de la matrice sur disque ('float32' ou 'float16')
+        quantization: Codes compacts à calculer (voir get_store_quantization, None = aucun)
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if not len(texts):
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    elif matrix.ndim != 2:
+        matrix = matrix.reshape(len(texts), -1)
+
+    if len(texts) != len(metadatas) or len(texts) != matrix.shape[0]:
+        raise ValueError("Le nombre de textes, de metadatas et d'embeddings doit être identique")
+    if len(texts):
+        matrix = normalize_rows(matrix)
+
+    # Chunks regroupés par partition (source, type, date): une recherche limitée
+    # à une source ne lit que ses lignes, contiguës dans le fichier
+    texts = list(texts)
+    metadatas = list(metadatas)
+    keys = [_json_key([meta.get(name) for name in PARTITION_KEYS]) for meta in metadatas]
+    order = sorted(range(len(texts)), key=keys.__getitem__)
+    if order != list(range(len(texts))):
+        texts = [texts[i] for i in order]
+        metadatas = [metadatas[i] for i in order]
+        matrix = matrix[order]
+        if ivf_lists is not None:
+            ivf_lists = np.asarray(ivf_lists)[order]
+
+    # Écrire une nouvelle version complète, puis basculer le pointeur CURRENT:
+    # un lecteur voit l'ancienne ou la nouvelle version, jamais un index partiel
+    versions_dir = os.path.join(path, VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+    versions = _list_versions(path)
+    name = f"v{(int(versions[-1][1:]) + 1) if versions else 1:06d}"
+    tmp_dir = os.path.join(versions_dir, name + '.tmp')
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    write_segment(tmp_dir, texts, metadatas, matrix, embedding_model, dtype=dtype,
+                  ivf_lists=ivf_lists, ivf_centroids=ivf_centroids, quantization=quantization)
+    os.replace(tmp_dir, os.path.join(versions_dir, name))
+    _fsync_path(versions_dir)
+
+    current_tmp = os.path.join(path, CURRENT_FILENAME + '.tmp')
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(name + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(path, CURRENT_FILENAME))
+    _fsync_path(path)
+
+    # Le journal de l'ancienne version est intégré à la nouvelle; l'ancien format est remplacé
+    for obsolete in (path + LOG_SUFFIX, _legacy_path(path), _legacy_path(path) + LOG_SUFFIX):
+        if os.path.exists(obsolete):
+            os.remove(obsolete)
+    collect_old_versions(path)
+
+
+def _list_versions(path):
+    """Noms des versions complètes du vector store, de la plus ancienne à la plus récente"""
+    versions_dir = os.path.join(path, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(versions_dir)
+        if name.startswith('v') and name[1:].isdigit()
+    )
+
+
+def collect_old_versions(path, keep=KEEP_VERSIONS):
+    """
+    Supprime les versions les plus anciennes du vector store (la version active est toujours gardée).
+
+    Les processus qui ont déjà ouvert une ancienne version continuent de la
+    lire: les fichiers mappés en mémoire restent valides jusqu'à leur fermeture.
+    Une suppression impossible (fichier encore ouvert sous Windows) est
+    retentée lors de la sauvegarde suivante.
+
+    Returns:
+        Liste des versions supprimées
+    """
+    current = _current_version(path)[0]
+    removed = []
+    for name in _list_versions(path)[:-max(1, keep)]:
+        if name == current:
+            continue
+        shutil.rmtree(os.path.join(path, VERSIONS_DIRNAME, name), ignore_errors=True)
+        removed.append(name)
+
+    # Fichiers d'un dossier sans versions (format précédent) et versions interrompues
+    if current:
+        for entry in os.listdir(path):
+            entry_path = os.path.join(path, entry)
+            if entry in (VERSIONS_DIRNAME, CURRENT_FILENAME):
+                continue
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path, ignore_errors=True)
+            else:
+                os.remove(entry_path)
+        versions_dir = os.path.join(path, VERSIONS_DIRNAME)
+        for entry in os.listdir(versions_dir):
+            if entry.endswith('.tmp'):
+                shutil.rmtree(os.path.join(versions_dir, entry), ignore_errors=True)
+    return removed
+
+
+def append_to_store(path, texts, metadatas, embeddings, embedding_model, deleted_sources=None,
+                    ivf_lists=None, dtype='float32', quantization=None):
+    """
+    Ajoute des chunks au vector store sans relire ni réécrire l'existant.
+
+    Les nouveaux chunks sont ajoutés à la fin du journal de la version active;
+    le coût ne dépend que du nombre de chunks ajoutés, pas de la taille de l'index.
+
+    Args:
+        path: Dossier du vector store
+        texts: Liste des textes des nouveaux chunks
+        metadatas: Liste des metadatas des nouveaux chunks
+        embeddings: Embeddings des nouveaux chunks
+        embedding_model: Nom du modèle d'embedding utilisé
+        deleted_sources: Sources dont les chunks déjà indexés doivent être supprimés
+            (remplacés par les nouveaux chunks du même enregistrement)
+        ivf_lists: Cluster IVF de chaque nouveau chunk (None = pas d'index IVF)
+        dtype: Type de la matrice si le vector store doit être créé
+        quantization: Codes compacts si le vector store doit être créé (les chunks du
+            journal ne sont quantifiés qu'à la réécriture de la version, voir quantization_outdated)
+    """
+    deleted_sources = sorted(set(deleted_sources or []))
+    if not texts and not deleted_sources:
+        return
+
+    if not store_exists(path):
+        # Rien à supprimer dans un vector store inexistant
+        if texts:
+            save_store(path, texts, metadatas, embeddings, embedding_model, dtype=dtype,
+                       quantization=quantization)
+        return
+
+    if texts:
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    if len(texts) != len(metadatas):
+        raise ValueError("Le nombre de textes, de metadatas et d'embeddings doit être identique")
+
+    record = {
+        'documents': list(texts),
+        'metadatas': list(metadatas),
+        'embeddings': matrix,
+        'embedding_model': embedding_model,
+        'deleted_sources': deleted_sources,
+        'ivf_lists': None if ivf_lists is None else np.asarray(ivf_lists, dtype=np.int32)
+    }
+    # Un vector store encore au format pickle garde son propre journal jusqu'à sa conversion
+    journal_path = _current_version(path)[2] or _legacy_path(path) + LOG_SUFFIX
+    with open(journal_path, 'ab') as f:
+        pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def quantization_outdated(path, quantization):
+    """
+    Indique si la version active doit être réécrite pour appliquer la quantification configurée.
+
+    C'est le cas si ses codes ne correspondent pas à la configuration, ou si
+    le journal (chunks non quantifiés, gardés en mémoire par la recherche)
+    dépasse QUANTIZED_JOURNAL_RATIO de la matrice du segment.
+    """
+    version_dir, journal_path = _current_version(path)[1:]
+    if version_dir is None:
+        return False
+    with open(os.path.join(version_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if quantization is None:
+        return bool(manifest.get('quantization'))
+    if not manifest['count']:
+        return False
+    if manifest.get('quantization') != quantization['mode']:
+        return True
+    if quantization['mode'] == 'pq' and quantization['subvectors'] not in (0, manifest.get('pq_subvectors')):
+        return True
+    journal_size = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+    return journal_size > QUANTIZED_JOURNAL_RATIO * os.path.getsize(os.path.join(version_dir, 'vectors.npy'))
+
+
+def remove_store(path):
+    """Supprime le vector store et son journal (tous formats). Retourne True si quelque chose a été supprimé"""
+    removed = False
+    if os.path.exists(path):
+        shutil.rmtree(path)
+        removed = True
+    for file_path in (path + LOG_SUFFIX, _legacy_path(path), _legacy_path(path) + LOG_SUFFIX):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            removed = True
+    return removed
+
+
+def _read_log(log_path):
+    """Lit les enregistrements du journal (un enregistrement tronqué en fin de fichier est ignoré)"""
+    records = []
+    if not os.path.exists(log_path):
+        return records
+    with open(log_path, 'rb') as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except EOFError:
+                break
+            except pickle.UnpicklingError:
+                print(f"⚠️  Enregistrement incomplet ignoré à la fin de {log_path}")
+                break
+    return records
+
+
+def _deleted_positions(records, first_position=1):
+    """Dernier enregistrement ayant supprimé chaque source (positions à partir de first_position)"""
+    deleted_at = {}
+    for position, record in enumerate(records, first_position):
+        for source in record.get('deleted_sources', []):
+            deleted_at[source] = position
+    return deleted_at
+
+
+def _merge_records(records, deleted_at, first_position=1):
+    """
+    Fusionne des enregistrements en tenant compte des suppressions.
+
+    Les suppressions d'un enregistrement s'appliquent aux chunks des
+    enregistrements précédents uniquement.
+
+    Returns:
+        Tuple (documents, metadatas, matrices, ivf_lists, models)
+    """
+    documents = []
+    metadatas = []
+    matrices = []
+    ivf_lists = []
+    models = set()
+    for position, record in enumerate(records, first_position):
+        record_documents = record.get('documents', [])
+        keep = [
+            i for i, meta in enumerate(record.get('metadatas', []))
+            if deleted_at.get(meta.get('source'), -1) <= position
+        ]
+        if not keep:
+            continue
+        documents.extend(record_documents[i] for i in keep)
+        metadatas.extend(record['metadatas'][i] for i in keep)
+        models.add(record.get('embedding_model'))
+        if 'embeddings' in record:
+            matrices.append(np.asarray(record['embeddings'])[keep])
+            # -1 = chunk pas encore affecté à un cluster IVF
+            record_lists = record.get('ivf_lists')
+            if record_lists is None:
+                record_lists = np.full(len(record_documents), -1, dtype=np.int32)
+            ivf_lists.append(np.asarray(record_lists)[keep])
+    return documents, metadatas, matrices, ivf_lists, models
+
+
+def _read_legacy_store(path):
+    """Lit un vector store pickle (formats 1 et 2), journal inclus"""
+    legacy_path = _legacy_path(path)
+    with open(legacy_path, 'rb') as f:
+        save_data = pickle.load(f)
+
+    # Le fichier de base est l'enregistrement 0, le journal commence à 1
+    records = [save_data] + _read_log(legacy_path + LOG_SUFFIX)
+    documents, metadatas, matrices, _, models = _merge_records(
+        records, _deleted_positions(records, 0), 0
+    )
+
+    save_data['documents'] = documents
+    save_data['metadatas'] = metadatas
+    if 'embeddings' in save_data:
+        if len({m.shape[1] for m in matrices}) > 1 or len(models) > 1:
+            # Journal écrit avec un autre modèle: l'index doit être reconstruit
+            save_data['embedding_model'] = None
+        elif matrices:
+            save_data['embeddings'] = np.vstack(matrices)
+            save_data['embedding_dim'] = int(save_data['embeddings'].shape[1])
+        else:
+            save_data['embeddings'] = np.zeros((0, 0), dtype=np.float32)
+        save_data['ivf_lists'] = None
+    return save_data
+
+
+def read_store(path):
+    """
+    Lit tout le contenu du vector store en mémoire (tous formats confondus), journal inclus.
+
+    Réservé aux opérations hors ligne (reconstruction, index IVF); le serveur
+    utilise load_store, qui mappe les fichiers sans les copier.
+
+    Returns:
+        Dictionnaire avec documents, metadatas, embeddings, embedding_model,
+        embedding_dim et ivf_lists (-1 = chunk sans cluster IVF)
+    """
+    if _current_version(path)[0] is None:
+        return _read_legacy_store(path)
+
+    data = StoreData.open(path)
+    base = data.base
+    rows = np.arange(base.count) if data.base_alive is None else np.flatnonzero(data.base_alive)
+
+    documents = [base.texts[i] for i in rows] + data.delta_texts
+    metadatas = [base.metadata.row(i) for i in rows] + data.delta_metadatas
+    matrices = []
+    ivf_lists = []
+    if data.embedding_model is None:
+        # Embeddings de modèles différents: seuls les textes sont utilisables
+        rows = []
+    elif len(rows):
+        matrices.append(np.asarray(base.vectors[rows], dtype=np.float32))
+        ivf_lists.append(
+            np.asarray(base.ivf_lists[rows]) if base.ivf_lists is not None
+            else np.full(len(rows), -1, dtype=np.int32)
+        )
+    if data.delta_texts and data.embedding_model is not None:
+        matrices.append(data.delta_matrix)
+        ivf_lists.append(data.delta_ivf_lists)
+
+    embeddings = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+    return {
+        'format_version': STORE_FORMAT_VERSION,
+        'documents': documents,
+        'metadatas': metadatas,
+        'embeddings': embeddings,
+        'embedding_model': data.embedding_model,
+        'embedding_dim': data.embedding_dim,
+        'ivf_lists': np.concatenate(ivf_lists) if ivf_lists else np.zeros(0, dtype=np.int32)
+    }
+
+
+def load_ivf_centroids(path, embedding_model=None):
+    """Charge les centroïdes de l'index IVF (None s'ils n'existent pas ou ne correspondent pas au modèle)"""
+    version_dir = _current_version(path)[1]
+    if version_dir is None:
+        return None
+    with open(os.path.join(version_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not manifest.get('ivf'):
+        return None
+    if embedding_model is not None and manifest['embedding_model'] != embedding_model:
+        return None
+    return np.load(os.path.join(version_dir, 'ivf_centroids.npy'))
+
+
+def _migrate_legacy_store(path, dtype='float32'):
+    """
+    Convertit un vector store pickle (format 2) vers le format mappé, sans recalcul.
+
+    Returns:
+        True si la conversion a eu lieu
+    """
+    save_data = _read_legacy_store(path)
+    if 'embeddings' not in save_data or save_data.get('embedding_model') is None:
+        return False
+    print("🔄 Conversion du vector store vers le format mappé en mémoire...")
+    save_store(path, save_data['documents'], save_data['metadatas'], save_data['embeddings'],
+               save_data['embedding_model'], dtype=dtype)
+    return True
+
+
+def load_store(path, embedding_model=None, dtype='float32'):
+    """
+    Ouvre le vector store et vérifie qu'il est utilisable sans recalcul.
+
+    La matrice, les textes et les metadatas sont mappés en mémoire: plusieurs
+    processus qui ouvrent le même index partagent les mêmes pages.
+
+    Args:
+        path: Dossier du vector store
+        embedding_model: Modèle d'embedding attendu (None = pas de vérification)
+        dtype: Type de la matrice si un ancien vector store doit être converti
+
+    Returns:
+        Instance de StoreData
+
+    Raises:
+        EmbeddingModelMismatch: Si le vector store ne contient pas d'embeddings
+            ou s'ils ont été calculés avec un autre modèle
+    """
+    if _current_version(path)[0] is None:
+        if not _migrate_legacy_store(path, dtype):
+            raise EmbeddingModelMismatch(
+                "Le vector store est dans l'ancien format (sans embeddings)"
+            )
+
+    data = StoreData.open(path)
+
+    if data.embedding_model is None:
+        raise EmbeddingModelMismatch("Le journal du vector store contient des embeddings de modèles différents")
+    if embedding_model is not None and data.embedding_model != embedding_model:
+        raise EmbeddingModelMismatch(
+            f"Le vector store a été construit avec '{data.embedding_model}' "
+            f"mais le modèle configuré est '{embedding_model}'"
+        )
+
+    return data
+
+
+class StoreData:
+    """
+    Contenu du vector store vu par la recherche: un segment mappé en mémoire
+    (base) et les chunks ajoutés depuis par le journal (delta, en mémoire).
+
+    Les lignes sont numérotées de 0 à base_count - 1 pour le segment,
+    puis à la suite pour le delta.
+    """
+
+    def __init__(self, base=None, base_alive=None, delta_texts=None, delta_metadatas=None,
+                 delta_matrix=None, delta_ivf_lists=None, embedding_model=None, embedding_dim=0):
+        self.base = base
+        self.base_count = base.count if base is not None else 0
+        # Lignes du segment non supprimées par le journal (None = toutes)
+        self.base_alive = base_alive
+        self.delta_texts = list(delta_texts or [])
+        self.delta_metadatas = list(delta_metadatas or [])
+        if delta_matrix is None:
+            delta_matrix = np.zeros((0, embedding_dim), dtype=np.float32)
+        self.delta_matrix = delta_matrix
+        if delta_ivf_lists is None:
+            delta_ivf_lists = np.full(len(self.delta_texts), -1, dtype=np.int32)
+        self.delta_ivf_lists = delta_ivf_lists
+        self.embedding_model = embedding_model
+        self.embedding_dim = embedding_dim
+        # Version du vector store sur disque (None = contenu en mémoire uniquement)
+        self.version = None
+        # Index BM25 de la base et du delta (construit à la première recherche lexicale)
+        self._lexical = None
+
+    @classmethod
+    def open(cls, path):
+        """
+        Ouvre la version active du vector store et applique son journal.
+
+        Le résultat est un instantané cohérent: les sauvegardes suivantes
+        créent de nouvelles versions sans modifier celle-ci.
+        """
+        for attempt in range(OPEN_RETRIES):
+            version, version_dir, journal_path = _current_version(path)
+            if version is None:
+                raise FileNotFoundError(f"Vector store introuvable: {path}")
+            try:
+                base = Segment(version_dir)
+                records = _read_log(journal_path)
+                break
+            except FileNotFoundError:
+                # Version supprimée entre la lecture de CURRENT et son ouverture
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+        data = cls._from_segment(base, records)
+        data.version = version
+        return data
+
+    @classmethod
+    def _from_segment(cls, base, records):
+        """Applique les enregistrements du journal à un segment"""
+        deleted_at = _deleted_positions(records)
+
+        # Lignes du segment supprimées par le journal
+        base_alive = None
+        if deleted_at and base.count:
+            source_column = base.metadata.dictionary('source')
+            if source_column is not None:
+                codes, values = source_column
+                deleted_codes = [code for code, value in enumerate(values) if value in deleted_at]
+                base_alive = ~np.isin(codes, deleted_codes)
+            else:
+                base_alive = np.array([
+                    base.metadata.row(i).get('source') not in deleted_at for i in range(base.count)
+                ], dtype=bool)
+
+        documents, metadatas, matrices, ivf_lists, models = _merge_records(records, deleted_at)
+        embedding_model = base.embedding_model
+        embedding_dim = base.embedding_dim
+        if not documents:
+            return cls(base, base_alive, embedding_model=embedding_model, embedding_dim=embedding_dim)
+
+        dims = {m.shape[1] for m in matrices}
+        if base.count:
+            dims.add(base.embedding_dim)
+            models.add(base.embedding_model)
+        if len(dims) > 1 or len(models) > 1:
+            # Journal écrit avec un autre modèle: les textes sont gardés pour la reconstruction
+            return cls(base, base_alive, documents, metadatas, embedding_model=None, embedding_dim=embedding_dim)
+
+        delta_matrix = normalize_rows(np.vstack(matrices).astype(np.float32))
+        delta_lists = np.concatenate(ivf_lists)
+        # Les chunks ajoutés avant l'entraînement de l'index IVF sont affectés à ses clusters
+        missing = delta_lists < 0
+        if base.ivf_centroids is not None and missing.any():
+            delta_lists[missing] = assign_ivf(delta_matrix[missing], base.ivf_centroids)
+
+        return cls(base, base_alive, documents, metadatas, delta_matrix, delta_lists,
+                   next(iter(models)), int(delta_matrix.shape[1]))
+
+    @classmethod
+    def from_arrays(cls, texts, metadatas, embeddings, embedding_model=None):
+        """Crée un contenu en mémoire (sans segment) à partir de chunks déjà embeddés"""
+        texts = list(texts)
+        if not texts:
+            return cls(embedding_model=embedding_model)
+        matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1))
+        return cls(delta_texts=texts, delta_metadatas=metadatas or [{} for _ in texts],
+                   delta_matrix=matrix, embedding_model=embedding_model, embedding_dim=matrix.shape[1])
+
+    def __len__(self):
+        alive = self.base_count if self.base_alive is None else int(self.base_alive.sum())
+        return alive + len(self.delta_texts)
+
+    def text(self, row):
+        if row < self.base_count:
+            return self.base.texts[row]
+        return self.delta_texts[row - self.base_count]
+
+    def metadata(self, row):
+        if row < self.base_count:
+            return self.base.metadata.row(row)
+        return dict(self.delta_metadatas[row - self.base_count])
+
+    def append(self, texts, metadatas, matrix):
+        """Ajoute au delta des chunks dont les embeddings sont déjà normalisés"""
+        self.delta_texts.extend(texts)
+        self.delta_metadatas.extend(metadatas)
+        self.delta_matrix = matrix if not len(self.delta_matrix) else np.vstack([self.delta_matrix, matrix])
+        self.delta_ivf_lists = np.concatenate([self.delta_ivf_lists, np.full(len(texts), -1, dtype=np.int32)])
+        self.embedding_dim = int(matrix.shape[1])
+        self._lexical = None
+
+    def filter_rows(self, metadata_filter):
+        """
+        Lignes retenues par un filtre de metadatas.
+
+        Le segment est filtré par ses partitions précalculées; seul le delta
+        du journal (en mémoire) est parcouru chunk par chunk.
+        """
+        rows = np.zeros(0, dtype=np.int64)
+        if self.base_count:
+            rows = self.base.partition_rows(metadata_filter)
+            if self.base_alive is not None:
+                rows = rows[self.base_alive[rows]]
+        delta_rows = [
+            self.base_count + i for i, meta in enumerate(self.delta_metadatas)
+            if metadata_filter.matches(meta.get('source'), meta.get('type'), meta.get('indexed_at'))
+        ]
+        if delta_rows:
+            rows = np.concatenate([rows, np.array(delta_rows, dtype=np.int64)])
+        return rows
+
+    def lexical(self):
+        """Index BM25 de toutes les lignes (le delta du journal est indexé en mémoire)"""
+        index = self._lexical
+        if index is None:
+            parts = []
+            if self.base_count:
+                if self.base.bm25 is None:
+                    self.base.bm25 = BM25Postings.from_texts(self.base.texts[i] for i in range(self.base_count))
+                parts.append((0, self.base.bm25))
+            if self.delta_texts:
+                parts.append((self.base_count, BM25Postings.from_texts(self.delta_texts)))
+            index = LexicalIndex(parts, self.base_alive if self.base_count else None)
+            # Deux requêtes simultanées peuvent le construire deux fois: le résultat est identique
+            self._lexical = index
+        return index
+
+    @property
+    def quantizer(self):
+        """Codes quantifiés du segment (None = pas de quantification)"""
+        return self.base.quantizer if self.base is not None else None
+
+    def scores(self, query, rows=None, coarse=False):
+        """
+        Similarité cosinus entre la question normalisée et des lignes de l'index.
+
+        Args:
+            query: Embedding normalisé de la question
+            rows: Numéros de lignes à comparer (None = toutes)
+            coarse: Scores approchés du segment, calculés sur ses codes quantifiés
+                (le delta du journal, en mémoire, est toujours comparé exactement)
+
+        Returns:
+            Tuple (rows, scores); les lignes supprimées ont un score de -inf
+        """
+        quantizer = self.quantizer if coarse else None
+        if rows is None:
+            parts = []
+            if self.base_count:
+                parts.append(quantizer.scores(query) if quantizer is not None else _dot(self.base.vectors, query))
+            if self.delta_texts:
+                parts.append(self.delta_matrix @ query)
+            scores = np.concatenate(parts)
+            rows = np.arange(len(scores))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            in_base = rows < self.base_count
+            scores = np.empty(len(rows), dtype=np.float32)
+            if in_base.any():
+                # Lecture des seules lignes candidates, dans l'ordre du fichier
+                base_rows = rows[in_base]
+                if quantizer is not None:
+                    scores[in_base] = quantizer.scores(query, base_rows)
+                else:
+                    scores[in_base] = np.asarray(self.base.vectors[base_rows], dtype=np.float32) @ query
+            if not in_base.all():
+                scores[~in_base] = self.delta_matrix[rows[~in_base] - self.base_count] @ query
+
+        if self.base_alive is not None:
+            in_base = rows < self.base_count
+            dead = np.zeros(len(rows), dtype=bool)
+            dead[in_base] = ~self.base_alive[rows[in_base]]
+            scores[dead] = -np.inf
+        return rows, scores
+
+    def batch_scores(self, queries, coarse=False):
+        """
+        Similarités entre un lot de questions normalisées et toutes les lignes de l'index.
+
+        Args:
+            coarse: Scores approchés du segment, calculés sur ses codes quantifiés
+
+        Returns:
+            Matrice (questions × lignes); les lignes supprimées ont un score de -inf
+        """
+        queries_t = np.ascontiguousarray(queries.T, dtype=np.float32)
+        quantizer = self.quantizer if coarse else None
+        parts = []
+        if self.base_count:
+            parts.append(quantizer.scores(queries_t) if quantizer is not None else _dot(self.base.vectors, queries_t))
+        if self.delta_texts:
+            parts.append(self.delta_matrix @ queries_t)
+        scores = np.concatenate(parts, axis=0).T
+        if self.base_alive is not None:
+            scores[:, np.flatnonzero(~self.base_alive)] = -np.inf
+        return scores
+
+    def ivf_candidates(self, query, nprobe):
+        """Lignes des nprobe clusters IVF les plus proches (None si le segment n'a pas d'index IVF)"""
+        if self.base is None or self.base.ivf is None:
+            return None
+        probe = self.base.ivf.probe(query, nprobe)
+        base_rows = np.sort(self.base.ivf.candidates(query, nprobe, probe=probe))
+        delta_rows = np.flatnonzero(np.isin(self.delta_ivf_lists, probe)) + self.base_count
+        return np.concatenate([base_rows, delta_rows])
+
+
+def _dot(matrix, query):
+    """
+    Produit de la matrice par une question (vecteur) ou un lot de questions
+    (dimension × questions); une matrice float16 est convertie par blocs pour borner la mémoire.
+    """
+    if matrix.dtype == np.float32:
+        return np.asarray(matrix @ query)
+    scores = np.empty((matrix.shape[0],) + query.shape[1:], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_SIZE):
+        block = np.asarray(matrix[start:start + SCORE_BLOCK_SIZE], dtype=np.float32)
+        scores[start:start + len(block)] = block @ query
+    return scores
+
+
+def _top_indices(scores, k):
+    """Indices des k meilleurs scores finis, triés par score décroissant"""
+    k = min(k, len(scores))
+    if not k:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store construit à partir d'embeddings déjà calculés.
+
+    La recherche (similarité cosinus) est vectorisée avec NumPy directement
+    sur la matrice mappée en mémoire; seule la question est envoyée au modèle
+    d'embedding. Les Document ne sont créés que pour les k résultats.
+
+    Si le segment a des codes quantifiés, le classement est fait sur les
+    codes puis les rerank_candidates meilleurs candidats sont recalculés avec
+    les vecteurs complets: seules leurs lignes de la matrice sont lues.
+    """
+
+    def __init__(self, embedding, data=None, use_ivf=False, nprobe=16, use_quantization=True,
+                 rerank_candidates=DEFAULT_RERANK_CANDIDATES):
+        self._embedding_function = embedding
+        self._data = data if data is not None else StoreData()
+        # Index approximatif IVF (False = recherche exacte)
+        self.use_ivf = use_ivf
+        self.nprobe = nprobe
+        # Classement sur les codes quantifiés du segment s'il en a (False = vecteurs complets)
+        self.use_quantization = use_quantization
+        # Candidats du classement quantifié recalculés exactement (0 = scores approchés seuls)
+        self.rerank_candidates = rerank_candidates
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    @property
+    def data(self):
+        """Contenu (instantané) du vector store"""
+        return self._data
+
+    @property
+    def quantized(self):
+        """Indique si le classement vectoriel est fait sur les codes quantifiés"""
+        return self.use_quantization and self._data.quantizer is not None
+
+    def __len__(self):
+        return len(self._data)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = normalize_rows(np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32))
+        start = self._data.base_count + len(self._data.delta_texts)
+        self._data.append(texts, list(metadatas or [{} for _ in texts]), vectors)
+        return [str(i) for i in range(start, start + len(texts))]
+
+    def _vector_ranking(self, embedding, k, allowed=None):
+        """
+        Lignes des k chunks les plus proches de l'embedding et leurs similarités, triées.
+
+        Args:
+            allowed: Lignes auxquelles limiter la recherche (None = toutes)
+        """
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        rows = self._data.ivf_candidates(query, self.nprobe) if self.use_ivf else None
+        if rows is not None and allowed is not None:
+            rows = rows[np.isin(rows, allowed)]
+        if rows is not None and len(rows) < k:
+            rows = None
+        if rows is None:
+            rows = allowed
+        if rows is not None and not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        if not self.quantized:
+            rows, scores = self._data.scores(query, rows)
+        else:
+            rows, scores = self._data.scores(query, rows, coarse=True)
+            if self.rerank_candidates:
+                rows, scores = self._rerank(query, rows[_top_indices(scores, max(k, self.rerank_candidates))])
+
+        top = _top_indices(scores, k)
+        return rows[top], scores[top]
+
+    def _rerank(self, query, rows):
+        """Scores exacts des candidats du classement quantifié (lignes lues dans l'ordre du fichier)"""
+        return self._data.scores(query, np.sort(rows))
+
+    def _batch_vector_rankings(self, embeddings, k):
+        """
+        Top-k d'un lot de questions: un produit matriciel par bloc de
+        questions au lieu d'un parcours de l'index par question (sur les
+        codes quantifiés s'il y en a, suivi du recalcul exact des candidats).
+
+        Returns:
+            Liste de tuples (rows, scores), un par question, triés par similarité décroissante
+        """
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        # Lignes supprimées comprises: ce sont les colonnes de la matrice des scores
+        count = self._data.base_count + len(self._data.delta_texts)
+        final_k = k
+        coarse = self.quantized
+        if coarse and self.rerank_candidates:
+            k = max(k, self.rerank_candidates)
+        k = min(k, count)
+        block = max(1, BATCH_SCORE_BUDGET // max(1, count))
+        rankings = []
+        for start in range(0, len(queries), block):
+            scores = self._data.batch_scores(queries[start:start + block], coarse=coarse)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            rankings.extend(
+                (rows[np.isfinite(row_scores)], row_scores[np.isfinite(row_scores)])
+                for rows, row_scores in zip(top, top_scores)
+            )
+        if coarse and self.rerank_candidates:
+            # Candidats de chaque question recalculés avec les vecteurs complets
+            for i, (query, (rows, _)) in enumerate(zip(queries, rankings)):
+                rows, scores = self._rerank(query, rows)
+                top = _top_indices(scores, final_k)
+                rankings[i] = (rows[top], scores[top])
+        return rankings
+
+    def batch_search(self, queries, embeddings, k=4, candidates=None, rrf_k=RRF_K, hybrid=True):
+        """
+        Recherche pour un lot de questions (top-k vectoriel calculé sur la matrice des questions).
+
+        Args:
+            queries: Textes des questions (recherche BM25 si hybrid)
+            embeddings: Embeddings des questions, dans le même ordre
+            k: Nombre de chunks par question
+            candidates: Mode hybride: résultats de chaque méthode avant la fusion
+            rrf_k: Constante de la fusion RRF
+            hybrid: Fusionner avec le classement BM25 (sinon recherche vectorielle seule)
+
+        Returns:
+            Liste de listes de Document (une par question)
+        """
+        if len(self._data) == 0 or not len(queries):
+            return [[] for _ in queries]
+        candidates = max(k, candidates or k) if hybrid else k
+        rankings = self._batch_vector_rankings(embeddings, candidates)
+        results = []
+        for query, (vector_rows, _) in zip(queries, rankings):
+            if hybrid:
+                lexical_rows, _ = self._data.lexical().search(query, candidates)
+                rows = reciprocal_rank_fusion([vector_rows, lexical_rows], k, rrf_k)
+            else:
+                rows = vector_rows[:k]
+            results.append([self._document(row) for row in rows])
+        return results
+
+    def _allowed_rows(self, metadata_filter):
+        """Lignes retenues par le filtre (None = pas de filtre)"""
+        return None if metadata_filter is None else self._data.filter_rows(metadata_filter)
+
+    def _document(self, row):
+        return Document(page_content=self._data.text(row), metadata=self._data.metadata(row))
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """Retourne les k chunks les plus proches avec leur distance cosinus (filter: MetadataFilter)"""
+        if len(self._data) == 0:
+            return []
+        rows, scores = self._vector_ranking(embedding, k, self._allowed_rows(filter))
+        return [(self._document(row), float(1.0 - score)) for row, score in zip(rows, scores)]
+
+    def lexical_search(self, query, k=4, filter=None):
+        """Retourne les k chunks les mieux classés par BM25 (sans appel au modèle d'embedding)"""
+        if len(self._data) == 0:
+            return []
+        rows, _ = self._data.lexical().search(query, k, self._allowed_rows(filter))
+        return [self._document(row) for row in rows]
+
+    def hybrid_search(self, query, embedding, k=4, candidates=None, rrf_k=RRF_K, filter=None):
+        """
+        Recherche hybride: classements vectoriel et BM25 fusionnés par rang réciproque (RRF).
+
+        Args:
+            query: Texte de la question (recherche BM25)
+            embedding: Embedding de la question (recherche vectorielle)
+            k: Nombre de chunks retournés, coupé après la fusion
+            candidates: Nombre de résultats de chaque méthode avant la fusion (au moins k)
+            rrf_k: Constante de la fusion RRF
+            filter: MetadataFilter limitant la recherche (None = tous les chunks)
+        """
+        if len(self._data) == 0:
+            return []
+        candidates = max(k, candidates or k)
+        allowed = self._allowed_rows(filter)
+        vector_rows, _ = self._vector_ranking(embedding, candidates, allowed)
+        lexical_rows, _ = self._data.lexical().search(query, candidates, allowed)
+        rows = reciprocal_rank_fusion([vector_rows, lexical_rows], k, rrf_k)
+        return [self._document(row) for row in rows]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        texts = list(texts)
+        vectors = embedding.embed_documents(texts) if texts else None
+        return cls(embedding, StoreData.from_arrays(texts, metadatas, vectors))
+
+
+def normalize_rows(matrix):
+    """Normalise chaque ligne (norme L2) pour calculer la similarité cosinus par produit scalaire"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
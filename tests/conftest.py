@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Configuration commune des tests: modules du projet importables, configuration et serveur HTTP local"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Configuration du projet (config.yaml) dont les fichiers sont écrits dans un dossier temporaire"""
+    with open(os.path.join(ROOT, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['paths'] = {
+        'data_dir': str(tmp_path / 'data'),
+        'vectorstore_dir': str(tmp_path / 'vectorstore'),
+        'urls_file': str(tmp_path / 'vectorstore' / 'indexed_urls.json'),
+        'sources_file': str(tmp_path / 'vectorstore' / 'sources.json'),
+    }
+    config['embeddings']['cache_path'] = ''
+    os.makedirs(config['paths']['data_dir'])
+    return config
+
+
+@pytest.fixture
+def serve():
+    """
+    Démarre un serveur HTTP local (handler donné) sur un port libre.
+
+    Returns:
+        Fonction serve(handler_class) -> URL de base du serveur
+    """
+    servers = []
+
+    def start(handler_class):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
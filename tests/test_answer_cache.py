@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Tests du cache des réponses (questions identiques, questions proches, TTL et éviction LRU)"""
+
+import numpy as np
+import pytest
+
+import answer_cache
+from answer_cache import AnswerCache, create_answer_cache, normalize_query
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge du cache avancée à la main (secondes)"""
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def rotated(cosine, dim=8):
+    """Vecteur (non normalisé) dont la similarité cosinus avec le premier axe vaut cosine"""
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[0], vector[1] = cosine, np.sqrt(1.0 - cosine ** 2)
+    return list(vector * 3.0)
+
+
+AXIS = rotated(1.0)
+
+
+def test_exact_level_uses_the_normalized_question():
+    cache = AnswerCache()
+    cache.put("Comment lancer l'indexation ?", None, {'answer': 'python ingest.py'})
+
+    assert normalize_query("  COMMENT   lancer l'indexation?! ") == "comment lancer l'indexation"
+    assert cache.get_exact("comment lancer  l'indexation") == {'answer': 'python ingest.py'}
+    assert cache.get_exact("Comment lancer le serveur ?") is None
+    # Entrée sans embedding: jamais trouvée par similarité
+    assert cache.get_similar(AXIS) is None
+
+
+@pytest.mark.parametrize('cosine, hit', [(1.0, True), (0.96, True), (0.94, False), (0.0, False)])
+def test_semantic_level_threshold(cosine, hit):
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put('question en cache', AXIS, 'réponse')
+
+    assert cache.get_similar(rotated(cosine)) == ('réponse' if hit else None)
+    assert cache.stats == {'exact_hits': 0, 'semantic_hits': int(hit), 'misses': int(not hit)}
+
+
+def test_semantic_level_returns_the_closest_question():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put('proche', rotated(0.97), 'proche')
+    cache.put('plus proche', rotated(0.99), 'plus proche')
+
+    assert cache.get_similar(AXIS) == 'plus proche'
+    # Question d'une autre dimension que les entrées (changement de modèle): aucune comparaison
+    assert cache.get_similar([1.0, 0.0]) is None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl=60)
+    cache.put('question', AXIS, 'réponse')
+
+    clock[0] += 60
+    assert cache.get_exact('question') == 'réponse'
+    clock[0] += 1
+    assert cache.get_exact('question') is None
+    assert cache.get_similar(AXIS) is None
+    assert cache.report()['entries'] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = AnswerCache(ttl=0)
+    cache.put('question', AXIS, 'réponse')
+
+    clock[0] += 10 ** 9
+    assert cache.get_similar(AXIS) == 'réponse'
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = AnswerCache(max_entries=2)
+    cache.put('a', rotated(1.0), 'a')
+    cache.put('b', rotated(0.0), 'b')
+
+    # Une lecture (exacte ou par similarité) rend l'entrée récente
+    assert cache.get_exact('a') == 'a'
+    cache.put('c', None, 'c')
+    assert [cache.get_exact(key) for key in 'abc'] == ['a', None, 'c']
+
+    assert cache.get_similar(rotated(1.0)) == 'a'
+    cache.put('d', None, 'd')
+    assert [cache.get_exact(key) for key in 'acd'] == ['a', None, 'd']
+    # Une entrée remplacée n'est comptée qu'une fois
+    cache.put('d', None, 'd2')
+    assert cache.report()['entries'] == 2 and cache.get_exact('d') == 'd2'
+
+
+def test_answers_computed_before_a_clear_are_ignored():
+    cache = AnswerCache()
+    generation = cache.generation
+    cache.put('avant', AXIS, 'ancien index')
+
+    cache.clear()
+    cache.put('question', AXIS, 'ancien index', generation=generation)
+    assert cache.get_exact('avant') is None and cache.get_exact('question') is None
+    cache.put('question', AXIS, 'nouvel index', generation=cache.generation)
+    assert cache.get_similar(AXIS) == 'nouvel index'
+
+
+def test_report_and_configuration():
+    cache = create_answer_cache({'answer_cache': {'max_entries': 3, 'ttl': 10, 'similarity_threshold': 0.9}})
+    assert (cache.max_entries, cache.ttl, cache.similarity_threshold) == (3, 10, 0.9)
+    assert create_answer_cache({'answer_cache': {'enabled': False}}) is None
+
+    cache.put('question', AXIS, 'réponse')
+    cache.get_exact('question')
+    cache.get_similar(AXIS)
+    cache.get_similar(rotated(0.0))
+    assert cache.report() == {'exact_hits': 1, 'semantic_hits': 1, 'misses': 1, 'entries': 1, 'hit_rate': 0.667}
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Tests du mode de service asynchrone (ASGI) avec le serveur Ollama simulé de benchmark.py"""
+
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+import app as web
+from asgi import AsyncQueryApp
+from benchmark import STUB_ANSWER, StubOllamaHandler, stub_embedding
+from store import get_store_path, save_store
+
+TEXTS = [
+    "Installer le serveur avec pip install -r requirements.txt",
+    "Configurer le modèle d'embedding dans config.yaml",
+    "Lancer l'indexation avec python ingest.py --rebuild",
+    "Le serveur Flask répond sur le port 5000",
+    "Le mode async limite les appels simultanés vers Ollama",
+]
+QUERY = {'query': "Comment lancer l'indexation ?"}
+
+
+class SlowOllamaHandler(StubOllamaHandler):
+    generate_latency = 1.0
+
+
+def start_web(config, monkeypatch, base_url, **server):
+    """Index de TEXTS servi par le module app (chargement synchrone, configuration de test)"""
+    config['models']['base_url'] = base_url
+    config['answer_cache']['enabled'] = False
+    config['server'].update(server)
+    vectors = np.array([stub_embedding(text, StubOllamaHandler.dimension) for text in TEXTS], dtype=np.float32)
+    metadatas = [{'source': f'doc{i}.md', 'type': 'md', 'indexed_at': '2024-01-15T12:00:00'}
+                 for i in range(len(TEXTS))]
+    save_store(get_store_path(config), TEXTS, metadatas, vectors, config['models']['embedding_model'])
+
+    monkeypatch.setattr(web, 'config', config)
+    monkeypatch.setattr(web, 'load_config', lambda: config)
+    monkeypatch.setattr(web, 'answer_cache', None)
+    monkeypatch.setattr(web, 'concurrency_limits', {})
+    monkeypatch.setattr(web, 'startup', {'status': 'warming', 'time_to_ready': None, 'stages': {}, 'error': None})
+    web.warm_up()
+    assert web.startup['status'] == 'ready'
+    return AsyncQueryApp(web)
+
+
+async def call(asgi_app, method, path, data=None, disconnect_after=None):
+    """
+    Envoie une requête à l'application ASGI.
+
+    Returns:
+        Tuple (status, en-têtes, corps); status vaut None si aucune réponse n'a été commencée
+    """
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'root_path': '', 'headers': [(b'content-type', b'application/json')],
+             'client': ('127.0.0.1', 1234), 'server': ('127.0.0.1', 80)}
+    body = json.dumps(data).encode('utf-8') if data is not None else b''
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'headers': {}, 'body': b''}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if disconnect_after is not None:
+            await asyncio.sleep(disconnect_after)
+            return {'type': 'http.disconnect'}
+        # Client connecté jusqu'à la fin de la réponse
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(message.get('headers', []))
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await asyncio.wait_for(asgi_app(scope, receive, send), timeout=10)
+    return response['status'], response['headers'], response['body']
+
+
+def sse_events(body):
+    """Liste (événement, données) d'un flux Server-Sent Events"""
+    events = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_query_json_contract_matches_flask(config, monkeypatch, serve):
+    asgi_app = start_web(config, monkeypatch, serve(StubOllamaHandler))
+    client = web.app.test_client()
+    timed = dict(QUERY, timings=True)
+    invalid = [{}, {'query': ''}, {'query': 'question', 'filters': {'indexed_after': 'hier'}}]
+
+    # Une seule boucle d'événements, comme dans le serveur (le client Ollama y est lié)
+    async def scenario():
+        return [await call(asgi_app, 'POST', '/api/query', data) for data in [QUERY, timed] + invalid]
+
+    (status, headers, body), (_, _, timed_body), *errors = asyncio.run(scenario())
+
+    expected = client.post('/api/query', json=QUERY)
+    assert expected.status_code == status == 200
+    assert headers[b'content-type'] == b'application/json'
+    response = json.loads(body)
+    assert response == expected.get_json()
+    assert set(response) >= {'answer', 'sources', 'chunks_found'}
+
+    # Détail des durées demandé: mêmes étapes que la route Flask
+    assert set(json.loads(timed_body)['timings']) == set(client.post('/api/query', json=timed).get_json()['timings'])
+
+    # Erreurs de validation: même code et même message
+    for data, (status, _, body) in zip(invalid, errors):
+        expected = client.post('/api/query', json=data)
+        assert expected.status_code == status == 400
+        assert json.loads(body) == expected.get_json()
+
+
+def test_stream_events_match_flask(config, monkeypatch, serve):
+    asgi_app = start_web(config, monkeypatch, serve(StubOllamaHandler))
+
+    expected = sse_events(web.app.test_client().post('/api/query/stream', json=QUERY).get_data())
+    status, headers, body = asyncio.run(call(asgi_app, 'POST', '/api/query/stream', QUERY))
+
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/event-stream')
+    events = sse_events(body)
+    assert events == expected
+    assert [event for event, _ in events] == ['sources'] + ['token'] * (len(events) - 2) + ['done']
+
+
+def test_overloaded_generations_return_429(config, monkeypatch, serve):
+    asgi_app = start_web(config, monkeypatch, serve(StubOllamaHandler),
+                         max_concurrent_generations=1, max_queue=0, retry_after=7)
+
+    async def scenario():
+        # Une génération en cours occupe la seule place, la file d'attente est vide
+        async with asgi_app.generations_limit.slot():
+            rejected = [await call(asgi_app, 'POST', path, QUERY) for path in ('/api/query', '/api/query/stream')]
+        # Place libérée: la question est traitée
+        accepted = await call(asgi_app, 'POST', '/api/query', QUERY)
+        return rejected, accepted, await call(asgi_app, 'GET', '/api/status')
+
+    rejected, accepted, (status, _, body) = asyncio.run(scenario())
+
+    for status_code, headers, error in rejected:
+        assert status_code == 429
+        assert headers[b'retry-after'] == b'7'
+        assert headers[b'content-type'] == b'application/json'
+        assert 'error' in json.loads(error)
+    assert accepted[0] == 200
+
+    # Refus comptés dans /api/status (servi par Flask)
+    limits = json.loads(body)['limits']
+    assert status == 200
+    assert limits['generations'] == {'active': 0, 'waiting': 0, 'rejected': 2, 'max_concurrent': 1}
+    assert limits['embeddings']['rejected'] == 0
+
+
+def test_concurrent_queries_beyond_the_queue_are_rejected(config, monkeypatch, serve):
+    asgi_app = start_web(config, monkeypatch, serve(SlowOllamaHandler),
+                         max_concurrent_generations=1, max_queue=0)
+
+    async def scenario():
+        first = asyncio.ensure_future(call(asgi_app, 'POST', '/api/query', QUERY))
+        # Deuxième question pendant la génération de la première
+        while not asgi_app.generations_limit.active:
+            await asyncio.sleep(0.01)
+        second = await call(asgi_app, 'POST', '/api/query', QUERY)
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first[0], second[0]) == (200, 429)
+    assert asgi_app.generations_limit.active == 0
+
+
+@pytest.mark.parametrize('path', ['/api/query', '/api/query/stream'])
+def test_disconnect_cancels_the_generation(config, monkeypatch, serve, path):
+    asgi_app = start_web(config, monkeypatch, serve(SlowOllamaHandler), max_concurrent_generations=1)
+
+    start = time.perf_counter()
+    status, _, body = asyncio.run(call(asgi_app, 'POST', path, QUERY, disconnect_after=0.2))
+
+    # Pas d'attente de la fin de la génération (1 s), place libérée
+    assert time.perf_counter() - start < SlowOllamaHandler.generate_latency
+    if path == '/api/query':
+        assert status is None
+    else:
+        # Flux interrompu avant la fin de la réponse, sans événement 'done'
+        events = [event for event, _ in sse_events(body)]
+        assert status == 200
+        assert events[0] == 'sources' and 'done' not in events
+        assert len(events) < 1 + len(STUB_ANSWER)
+    assert asgi_app.generations_limit.active == 0
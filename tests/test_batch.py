@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Tests des questions par lot (générations limitées et annulées avec le lot)"""
+
+import threading
+import time
+
+import pytest
+
+from batch import parse_batch_items, parse_concurrency, run_batch
+
+
+class SlowLLM:
+    """Modèle simulé: chaque génération dure delay secondes"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.started = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def invoke(self, prompt):
+        with self.lock:
+            self.started += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return f'réponse à {prompt}'
+
+
+class FakePipeline:
+    def __init__(self, llm):
+        self.llm = llm
+
+    def retrieve_batch(self, queries):
+        return [(f'prompt {query}', [], [], {'tokens': 1}) for query in queries]
+
+
+def test_results_in_order_with_bounded_concurrency():
+    llm = SlowLLM()
+    items = parse_batch_items([f'q{i}' for i in range(10)])
+    results = list(run_batch(FakePipeline(llm), items, max_concurrency=3))
+    assert [result['answer'] for result in results] == [f'réponse à prompt q{i}' for i in range(10)]
+    assert llm.max_in_flight <= 3
+    assert llm.started == 10
+
+
+def test_closing_the_batch_stops_generations():
+    llm = SlowLLM()
+    results = run_batch(FakePipeline(llm), parse_batch_items([f'q{i}' for i in range(100)]), max_concurrency=2)
+    assert next(results)['id'] == 0
+    start = time.perf_counter()
+    results.close()
+    # Fermeture sans attendre les générations en cours
+    assert time.perf_counter() - start < 0.04
+    time.sleep(0.2)
+    # Première réponse, deux générations en cours au plus au moment de la fermeture
+    assert llm.started <= 3
+
+
+def test_generation_errors_are_reported_per_question():
+    class FailingLLM(SlowLLM):
+        def invoke(self, prompt):
+            if prompt.endswith('q1'):
+                raise RuntimeError('modèle indisponible')
+            return super().invoke(prompt)
+
+    results = list(run_batch(FakePipeline(FailingLLM(0)), parse_batch_items(['q0', 'q1', 'q2'])))
+    assert 'answer' in results[0] and 'answer' in results[2]
+    assert results[1]['error'] == 'Erreur: modèle indisponible'
+
+
+def test_parse_concurrency():
+    assert parse_concurrency(None, 4) == 4
+    assert parse_concurrency(2, 4) == 2
+    assert parse_concurrency(16, 4) == 4
+    for value in ('abc', '2', 0, -1, 1.5, True):
+        with pytest.raises(ValueError):
+            parse_concurrency(value, 4)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'assemblage du contexte (budget de tokens, fusion des voisins, doublons)"""
+
+import os
+import random
+
+import pytest
+import yaml
+from langchain_core.documents import Document
+
+from conftest import ROOT
+from context import CHARS_PER_TOKEN, MIN_TRUNCATED_TOKENS, SEPARATOR, estimate_tokens, pack_context
+from pipeline import PROMPT_TEMPLATE
+
+
+def chunk(seed, size=1000):
+    """Texte de size caractères (mots de 6 lettres), différent pour chaque seed"""
+    rng = random.Random(seed)
+    return ' '.join(''.join(rng.choice('abcdefgh') for _ in range(6)) for _ in range(size // 7 + 1))[:size]
+
+
+def docs(count=5, size=1000):
+    return [Document(page_content=chunk(i, size), metadata={'source': f'doc{i}.md'}) for i in range(count)]
+
+
+def context_tokens(passages):
+    return sum(estimate_tokens(passage.text) for passage in passages) + \
+        estimate_tokens(SEPARATOR) * max(0, len(passages) - 1)
+
+
+@pytest.mark.parametrize('max_tokens', [None, 0])
+def test_unlimited_budget_keeps_every_chunk(max_tokens):
+    passages, report = pack_context(docs(), max_tokens)
+
+    assert [passage.text for passage in passages] == [doc.page_content for doc in docs()]
+    assert (report['passages'], report['chunks_dropped'], report['truncated']) == (5, 0, False)
+
+
+def test_budget_truncates_the_last_passage_and_drops_the_rest():
+    budget = 600
+    passages, report = pack_context(docs(), budget + 50, reserved_tokens=50)
+
+    # Deux chunks entiers (250 tokens chacun), le troisième coupé à la fin d'un mot
+    assert [passage.text for passage in passages[:2]] == [doc.page_content for doc in docs()[:2]]
+    cut = passages[2].text
+    assert docs()[2].page_content.startswith(cut) and docs()[2].page_content[len(cut)] == ' '
+    assert len(cut) <= (budget - 500 - 2 * estimate_tokens(SEPARATOR)) * CHARS_PER_TOKEN
+    assert report == {'chunks': 5, 'passages': 3, 'chunks_merged': 0, 'duplicates_removed': 0,
+                      'chunks_dropped': 2, 'truncated': True, 'context_tokens': context_tokens(passages)}
+    assert report['context_tokens'] <= budget
+
+
+def test_exact_budget_is_not_truncated():
+    budget = 2 * 250 + estimate_tokens(SEPARATOR)
+    passages, report = pack_context(docs(), budget)
+
+    assert len(passages) == 2 and not report['truncated']
+    assert report['context_tokens'] == budget
+
+
+def test_too_small_remainder_drops_the_passage():
+    # Place restante inférieure à MIN_TRUNCATED_TOKENS après le premier chunk: pas de passage coupé
+    budget = 250 + estimate_tokens(SEPARATOR) + MIN_TRUNCATED_TOKENS - 1
+    passages, report = pack_context(docs(), budget)
+
+    assert len(passages) == 1 and not report['truncated']
+    assert report['chunks_dropped'] == 4
+
+
+def test_default_budget_cuts_top_k_contexts():
+    """Le budget par défaut (config.yaml) ne contient pas top_k chunks de chunk_size caractères"""
+    with open(os.path.join(ROOT, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    top_k, chunk_size = config['search']['top_k'], config['chunking']['chunk_size']
+    reserved = estimate_tokens(PROMPT_TEMPLATE.format(context='', question="Comment lancer l'indexation ?"))
+
+    _, report = pack_context(docs(top_k, chunk_size), config['models']['max_tokens'], reserved)
+    assert (report['passages'], report['chunks_dropped'], report['truncated']) == (top_k - 1, 1, True)
+
+    # 1536 tokens (valeur indiquée dans config.yaml) gardent tous les chunks
+    _, report = pack_context(docs(top_k, chunk_size), 1536, reserved)
+    assert (report['passages'], report['truncated']) == (top_k, False)
+
+
+def test_neighbours_are_merged_before_the_budget():
+    text = chunk(0, 1800)
+    # Deux chunks consécutifs d'une même source (200 caractères de chevauchement), le second mieux classé
+    first, second = text[:1000], text[800:]
+    passages, report = pack_context([Document(page_content=second, metadata={'source': 'a.md'}),
+                                     Document(page_content=chunk(1), metadata={'source': 'b.md'}),
+                                     Document(page_content=first, metadata={'source': 'a.md'})], 700)
+
+    assert [passage.text for passage in passages] == [text, chunk(1)[:len(passages[1].text)]]
+    assert report['chunks_merged'] == 1 and report['truncated']
+
+
+def test_duplicates_are_removed_before_the_budget():
+    near_copy = chunk(0).replace('a', 'b', 1)
+    passages, report = pack_context([Document(page_content=chunk(0), metadata={'source': 'a.md'}),
+                                     Document(page_content=near_copy, metadata={'source': 'b.md'}),
+                                     Document(page_content=chunk(0)[:500], metadata={'source': 'c.md'}),
+                                     Document(page_content=chunk(1), metadata={'source': 'd.md'})], 600)
+
+    assert [passage.metadata['source'] for passage in passages] == ['a.md', 'd.md']
+    assert report['duplicates_removed'] == 2 and not report['truncated']
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Tests du client d'embedding (serveur Ollama simulé du banc d'essai)"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_ollama import OllamaEmbeddings
+
+from benchmark import StubOllamaHandler, stub_embedding
+from embedder import CachedEmbeddings
+
+DIMENSION = 16
+TEXTS = [f'chunk numéro {i}' for i in range(100)]
+
+
+class RecordingHandler(StubOllamaHandler):
+    """Serveur simulé qui enregistre la taille des lots et le nombre de requêtes simultanées"""
+
+    dimension = DIMENSION
+    lock = threading.Lock()
+    batches = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_POST(self):
+        if self.path != '/api/embed':
+            return super().do_POST()
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            # Laisser le temps aux autres lots d'arriver
+            time.sleep(0.05)
+            super().do_POST()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def send_json(self, data, status=200):
+        if 'embeddings' in data:
+            with type(self).lock:
+                type(self).batches.append(len(data['embeddings']))
+        super().send_json(data, status)
+
+
+@pytest.fixture
+def stub(serve):
+    handler = type('Handler', (RecordingHandler,), {'batches': [], 'in_flight': 0, 'max_in_flight': 0,
+                                                     'lock': threading.Lock()})
+    return handler, serve(handler)
+
+
+def client(base_url, cache_path=None, model='mxbai-embed-large', batch_size=16, max_concurrency=3):
+    return CachedEmbeddings(OllamaEmbeddings(model=model, base_url=base_url), model, batch_size=batch_size,
+                            max_concurrency=max_concurrency, cache_path=cache_path)
+
+
+def test_batches_and_concurrency_limit(stub):
+    handler, base_url = stub
+    vectors = client(base_url).embed_documents(TEXTS)
+
+    assert sorted(handler.batches) == [4] + [16] * 6
+    assert 1 < handler.max_in_flight <= 3
+    assert len(vectors) == len(TEXTS)
+    assert vectors[7] == pytest.approx(stub_embedding(TEXTS[7], DIMENSION), abs=1e-6)
+
+
+def test_duplicate_texts_are_embedded_once(stub):
+    handler, base_url = stub
+    vectors = client(base_url).embed_documents(['même texte'] * 10 + ['autre'])
+    assert sum(handler.batches) == 2
+    assert vectors[0] == vectors[9]
+
+
+def test_cache_hits_make_no_model_calls(stub, tmp_path):
+    handler, base_url = stub
+    cache_path = str(tmp_path / 'cache.sqlite')
+    first = client(base_url, cache_path).embed_documents(TEXTS)
+    calls = len(handler.batches)
+
+    embeddings = client(base_url, cache_path)
+    again = embeddings.embed_documents(TEXTS)
+    assert len(handler.batches) == calls
+    assert np.allclose(again, first)
+    assert embeddings.stats['cache_hits'] == len(TEXTS)
+    assert embeddings.stats['computed'] == 0
+
+    # Seuls les textes nouveaux sont envoyés au modèle
+    embeddings.embed_documents(TEXTS + ['nouveau chunk'])
+    assert handler.batches[calls:] == [1]
+
+
+def test_cache_key_includes_model(stub, tmp_path):
+    handler, base_url = stub
+    cache_path = str(tmp_path / 'cache.sqlite')
+    client(base_url, cache_path).embed_documents(TEXTS[:10])
+    calls = len(handler.batches)
+
+    other = client(base_url, cache_path, model='nomic-embed-text')
+    other.embed_documents(TEXTS[:10])
+    assert sum(handler.batches[calls:]) == 10
+    assert other.stats['cache_hits'] == 0
+
+
+def test_query_cache(stub, tmp_path):
+    handler, base_url = stub
+    cache_path = str(tmp_path / 'cache.sqlite')
+    embeddings = client(base_url, cache_path)
+    vector = embeddings.embed_query('question')
+    calls = len(handler.batches)
+    assert client(base_url, cache_path).embed_query('question') == pytest.approx(vector)
+    assert len(handler.batches) == calls
+    # Les questions ne partagent pas les clés des documents
+    embeddings.embed_documents(['question'])
+    assert len(handler.batches) == calls + 1
+
+
+def test_throughput_report(stub, tmp_path):
+    _, base_url = stub
+    embeddings = client(base_url, str(tmp_path / 'cache.sqlite'))
+    embeddings.embed_documents(TEXTS)
+    embeddings.embed_documents(TEXTS[:40])
+
+    stats = embeddings.stats
+    assert stats['texts'] == 140
+    assert stats['cache_hits'] == 40
+    assert stats['computed'] == 100
+    assert stats['seconds'] > 0
+    report = embeddings.throughput_report()
+    assert report.startswith(f"140 chunks embeddés en {stats['seconds']:.1f}s ")
+    assert f"({140 / stats['seconds']:.1f} chunks/s, 40 depuis le cache, 100 calculés)" in report
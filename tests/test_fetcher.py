@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Tests du téléchargement des pages web (serveur HTTP local à la place des sites)"""
+
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from fetcher import fetch_urls
+
+PAGE = '<html lang="fr"><head><title>Titre</title></head><body><p>Déjà été à Genève</p></body></html>'
+
+
+def make_handler():
+    """Handler dont les routes enregistrent les requêtes reçues (chemin, en-têtes, instant)"""
+    requests_seen = []
+    lock = threading.Lock()
+    failures = {'/flaky': 2}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_page(self, body, content_type='text/html', status=200, headers=()):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                requests_seen.append((self.path, dict(self.headers), time.monotonic()))
+            if self.path == '/missing':
+                self.send_page(b'introuvable', status=404)
+            elif self.path == '/flaky':
+                with lock:
+                    remaining = failures['/flaky']
+                    failures['/flaky'] = max(0, remaining - 1)
+                if remaining:
+                    self.send_page(b'indisponible', status=503)
+                else:
+                    self.send_page(PAGE.encode('utf-8'), 'text/html; charset=utf-8')
+            elif self.path == '/slow':
+                time.sleep(1.0)
+                self.send_page(PAGE.encode('utf-8'))
+            elif self.path == '/etag':
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_page(b'', status=304)
+                else:
+                    self.send_page(PAGE.encode('utf-8'), 'text/html; charset=utf-8', headers=[('ETag', '"v1"')])
+            elif self.path == '/last-modified':
+                modified = 'Wed, 01 Jan 2025 00:00:00 GMT'
+                if self.headers.get('If-Modified-Since') == modified:
+                    self.send_page(b'', status=304)
+                else:
+                    self.send_page(PAGE.encode('utf-8'), 'text/html; charset=utf-8',
+                                   headers=[('Last-Modified', modified)])
+            elif self.path == '/latin1':
+                self.send_page(PAGE.encode('iso-8859-1'), 'text/html; charset=iso-8859-1')
+            else:
+                # Page UTF-8 sans charset dans l'en-tête
+                self.send_page(PAGE.encode('utf-8'))
+
+    return Handler, requests_seen
+
+
+def fetch(urls, **kwargs):
+    options = dict(retries=0, backoff_factor=0, per_host_rate=0, timeout=5)
+    options.update(kwargs)
+    return fetch_urls(urls, **options)
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{sock.getsockname()[1]}/'
+
+
+def test_partial_results_with_errors_per_url(serve):
+    handler, _ = make_handler()
+    base = serve(handler)
+    refused = unused_url()
+    results = fetch([f'{base}/page', f'{base}/missing', refused])
+
+    documents, fingerprint, changed, error = results[f'{base}/page']
+    assert error is None and changed
+    assert documents[0].metadata['source'] == f'{base}/page'
+    assert fingerprint['sha256']
+    assert '404' in results[f'{base}/missing'][3]
+    assert results[refused][3]
+    assert results[refused][0] == []
+
+
+def test_retries_on_server_errors(serve):
+    handler, requests_seen = make_handler()
+    base = serve(handler)
+    documents, _, _, error = fetch([f'{base}/flaky'], retries=3)[f'{base}/flaky']
+    assert error is None
+    assert documents
+    assert [path for path, _, _ in requests_seen] == ['/flaky'] * 3
+
+
+def test_server_errors_without_retries_are_reported(serve):
+    handler, requests_seen = make_handler()
+    base = serve(handler)
+    _, _, _, error = fetch([f'{base}/flaky'])[f'{base}/flaky']
+    assert '503' in error
+    assert len(requests_seen) == 1
+
+
+def test_timeout(serve):
+    handler, _ = make_handler()
+    base = serve(handler)
+    start = time.perf_counter()
+    results = fetch([f'{base}/slow', f'{base}/page'], timeout=0.2)
+    assert time.perf_counter() - start < 0.9
+    assert results[f'{base}/slow'][3]
+    assert results[f'{base}/page'][3] is None
+
+
+def test_per_host_rate_limit(serve):
+    handler, requests_seen = make_handler()
+    base = serve(handler)
+    urls = [f'{base}/page{i}' for i in range(4)]
+    results = fetch(urls, per_host_rate=5, max_workers=4)
+    assert all(error is None for _, _, _, error in results.values())
+    times = sorted(seen for _, _, seen in requests_seen)
+    # 5 requêtes par seconde: au moins 0,2 s entre deux requêtes vers le même hôte
+    assert all(later - earlier >= 0.15 for earlier, later in zip(times, times[1:]))
+
+
+def test_etag_reuse(serve):
+    handler, requests_seen = make_handler()
+    base = serve(handler)
+    url = f'{base}/etag'
+    _, fingerprint, changed, _ = fetch([url])[url]
+    assert changed and fingerprint['etag'] == '"v1"'
+
+    documents, again, changed, error = fetch([url], previous_fingerprints={url: fingerprint})[url]
+    assert error is None and not changed and documents == []
+    assert again == fingerprint
+    assert requests_seen[-1][1].get('If-None-Match') == '"v1"'
+
+
+def test_last_modified_reuse(serve):
+    handler, requests_seen = make_handler()
+    base = serve(handler)
+    url = f'{base}/last-modified'
+    _, fingerprint, _, _ = fetch([url])[url]
+    assert fingerprint['last_modified']
+
+    documents, _, changed, _ = fetch([url], previous_fingerprints={url: fingerprint})[url]
+    assert not changed and documents == []
+    assert requests_seen[-1][1].get('If-Modified-Since') == fingerprint['last_modified']
+
+
+def test_unchanged_content_without_validators(serve):
+    handler, _ = make_handler()
+    base = serve(handler)
+    url = f'{base}/page'
+    _, fingerprint, _, _ = fetch([url])[url]
+    documents, _, changed, _ = fetch([url], previous_fingerprints={url: fingerprint})[url]
+    assert not changed and documents == []
+
+
+def test_utf8_page_without_charset(serve):
+    handler, _ = make_handler()
+    base = serve(handler)
+    documents, _, _, error = fetch([f'{base}/page'])[f'{base}/page']
+    assert error is None
+    assert 'Déjà été à Genève' in documents[0].page_content
+    assert documents[0].metadata['title'] == 'Titre'
+    assert documents[0].metadata['language'] == 'fr'
+
+
+def test_declared_charset_is_used(serve):
+    handler, _ = make_handler()
+    base = serve(handler)
+    documents, _, _, error = fetch([f'{base}/latin1'])[f'{base}/latin1']
+    assert error is None
+    assert 'Déjà été à Genève' in documents[0].page_content
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Tests des filtres de recherche (lecture du champ "filters" et sélection des chunks)"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from filters import MetadataFilter
+
+
+@pytest.mark.parametrize('data', [None, {}])
+def test_no_filter(data):
+    assert MetadataFilter.from_dict(data) is None
+
+
+def test_parse_filters():
+    metadata_filter = MetadataFilter.from_dict({
+        'source': ['a.pdf', 'https://docs.example.com/page'], 'type': 'url',
+        'indexed_after': '2024-05-01', 'indexed_before': '2024-05-31T12:30:00'
+    })
+
+    assert metadata_filter.sources == {'a.pdf', 'https://docs.example.com/page'}
+    assert metadata_filter.types == {'url'}
+    assert metadata_filter.indexed_after == datetime(2024, 5, 1)
+    assert metadata_filter.indexed_before == datetime(2024, 5, 31, 12, 30)
+
+
+@pytest.mark.parametrize('data, message', [
+    (['a.pdf'], "doit être un objet"),
+    ({'sources': 'a.pdf'}, "Filtres inconnus: sources"),
+    ({'source': []}, "Filtre 'source'"),
+    ({'source': ['a.pdf', 3]}, "Filtre 'source'"),
+    ({'type': {'pdf': True}}, "Filtre 'type'"),
+    ({'indexed_after': 'hier'}, "Filtre 'indexed_after': date ISO 8601"),
+    ({'indexed_after': '2024-13-01'}, "Filtre 'indexed_after': date ISO 8601"),
+    ({'indexed_before': '31/05/2024'}, "Filtre 'indexed_before': date ISO 8601"),
+    ({'indexed_before': ''}, "Filtre 'indexed_before': date ISO 8601"),
+    ({'indexed_after': 20240501}, "Filtre 'indexed_after': date ISO 8601"),
+])
+def test_invalid_filters(data, message):
+    with pytest.raises(ValueError, match=message):
+        MetadataFilter.from_dict(data)
+
+
+def test_matches_source_and_type():
+    metadata_filter = MetadataFilter.from_dict({'source': ['a.pdf', 'b.md'], 'type': 'file'})
+
+    assert metadata_filter.matches('a.pdf', 'file', None)
+    assert not metadata_filter.matches('c.pdf', 'file', None)
+    assert not metadata_filter.matches('a.pdf', 'url', None)
+
+
+def test_matches_half_open_date_interval():
+    metadata_filter = MetadataFilter.from_dict({'indexed_after': '2024-05-01', 'indexed_before': '2024-06-01'})
+
+    assert metadata_filter.matches('a.pdf', 'file', '2024-05-01T00:00:00')
+    assert metadata_filter.matches('a.pdf', 'file', '2024-05-31T23:59:59.999999')
+    assert not metadata_filter.matches('a.pdf', 'file', '2024-06-01T00:00:00')
+    assert not metadata_filter.matches('a.pdf', 'file', '2024-04-30T23:59:59')
+    # Chunks sans date (ou date illisible): exclus d'un filtre par date
+    assert not metadata_filter.matches('a.pdf', 'file', None)
+    assert not metadata_filter.matches('a.pdf', 'file', 'inconnue')
+
+
+def test_dates_with_time_zone_are_compared_in_local_time():
+    local = datetime(2024, 5, 1, 12, 0).astimezone()
+    other_zone = local.astimezone(timezone(local.utcoffset() + timedelta(hours=3)))
+    metadata_filter = MetadataFilter.from_dict({'indexed_after': other_zone.isoformat()})
+
+    assert metadata_filter.indexed_after == datetime(2024, 5, 1, 12, 0)
+    assert metadata_filter.matches('a.pdf', 'file', '2024-05-01T12:00:00')
+    assert not metadata_filter.matches('a.pdf', 'file', (local - timedelta(seconds=1)).isoformat())
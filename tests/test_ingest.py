@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Tests de l'indexation (doublons, sources inchangées, découpage en flux, PDF page par page, mémoire bornée)"""
+
+import os
+import random
+import tracemalloc
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import ingest
+from ingest import (ingest_documents, iter_file_chunks, load_and_split_file, load_sources_registry, split_documents,
+                    split_text_windows)
+from store import _current_version, get_store_path, read_store
+
+
+def random_text(seed):
+    """Paragraphes de longueurs variées (certains plus longs qu'un chunk), séparés par une ou plusieurs lignes vides"""
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(rng.randint(5, 40)):
+        words = [''.join(rng.choice('abcdefghij') for _ in range(rng.randint(1, 12)))
+                 for _ in range(rng.randint(1, 400 if rng.random() < 0.2 else 60))]
+        lines = [' '.join(words[i:i + rng.randint(3, 15)]) for i in range(0, len(words), 15)]
+        paragraphs.append('\n'.join(lines) + rng.choice(['\n\n', '\n\n\n', '\n', ' \n\n']))
+    return ''.join(paragraphs)
+
+
+def windows(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+@pytest.mark.parametrize('seed', range(30))
+@pytest.mark.parametrize('chunk_size, chunk_overlap', [(1000, 200), (300, 50)])
+def test_windowed_split_matches_full_split(seed, chunk_size, chunk_overlap):
+    text = random_text(seed)
+    full = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_text(text)
+
+    for size in (1, 97, chunk_size, 4000):
+        assert list(split_text_windows(windows(text, size), chunk_size, chunk_overlap)) == full
+
+
+def test_windowed_split_without_blank_lines():
+    text = '\n'.join(f'ligne {i} ' + 'mot ' * (i % 40) for i in range(300))
+    full = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100).split_text(text)
+
+    assert list(split_text_windows(windows(text, 1000), 500, 100)) == full
+
+
+def write_pdf(path, pages):
+    """Écrit un PDF minimal: une page par texte, une ligne de la page par ligne du texte"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        lines = ' '.join(f'({line}) Tj 0 -14 Td' for line in text.split('\n'))
+        stream = f'BT /F1 10 Tf 20 800 Td {lines} ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(content))
+        content += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(content)
+    content += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    content += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    content += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def test_pdf_is_split_page_by_page(tmp_path, monkeypatch):
+    path = tmp_path / 'guide.pdf'
+    rng = random.Random(0)
+    write_pdf(path, ['\n'.join(f'page {page} ligne {line} ' + ' '.join(rng.choice(['mot', 'texte', 'index'])
+                                                                      for _ in range(8)) for line in range(40))
+                     for page in range(5)])
+    pages_read = []
+    lazy_load = ingest.PyPDFLoader.lazy_load
+
+    def recording_lazy_load(loader):
+        for page in lazy_load(loader):
+            pages_read.append(page.metadata['page'])
+            yield page
+    monkeypatch.setattr(ingest.PyPDFLoader, 'lazy_load', recording_lazy_load)
+
+    chunks = iter_file_chunks(path, 500, 100)
+    first = next(chunks)
+    # Le premier chunk est produit dès la lecture de la première page
+    assert pages_read == [0]
+    assert first.metadata['source'] == 'guide.pdf'
+
+    streamed = [first] + list(chunks)
+    assert pages_read == list(range(5))
+    _, loaded = load_and_split_file(str(path), 500, 100)
+    assert [(doc.page_content, doc.metadata['chunk_id']) for doc in streamed] == \
+        [(doc.page_content, doc.metadata['chunk_id']) for doc in loaded]
+
+
+def test_streamed_text_file_uses_bounded_memory(tmp_path):
+    path = tmp_path / 'gros.txt'
+    rng = random.Random(0)
+    words = [''.join(rng.choice('abcdefghij') for _ in range(rng.randint(2, 9))) for _ in range(500)]
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(6000):
+            f.write(' '.join(rng.choice(words) for _ in range(rng.randint(20, 200))) + '\n\n')
+    window = 65536
+
+    tracemalloc.start()
+    try:
+        chunks = sum(1 for _ in iter_file_chunks(path, 1000, 200, window))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # Quelques fenêtres, plus les identifiants des chunks déjà produits (~80 octets chacun)
+    assert chunks > 5000
+    assert peak < os.path.getsize(path) / 2
+    assert peak - 100 * chunks < 16 * window
+
+
+class RecordingEmbedding(DeterministicFakeEmbedding):
+    """Embeddings déterministes; garde les textes envoyés au modèle"""
+
+    embedded: list = []
+
+    def embed_documents(self, texts, progress=None):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def throughput_report(self):
+        return f'{len(self.embedded)} textes'
+
+
+@pytest.fixture
+def embedding(config, monkeypatch):
+    """Indexation de config['paths']['data_dir'] avec des embeddings déterministes"""
+    embedding = RecordingEmbedding(size=16, embedded=[])
+    config['ingestion']['workers'] = 1
+    monkeypatch.setattr(ingest, 'load_config', lambda: config)
+    monkeypatch.setattr(ingest, 'get_embeddings', lambda config: embedding)
+    return embedding
+
+
+def paragraph(word, size=900):
+    return ' '.join([word] * (size // (len(word) + 1)))
+
+
+def test_duplicate_chunks_are_removed_per_source():
+    repeated = paragraph('répété')
+    text = f'{repeated}\n\n{paragraph("unique")}\n\n{repeated}'
+    documents = [Document(page_content=text, metadata={'source': 'a.md'}),
+                 Document(page_content=repeated, metadata={'source': 'b.md'})]
+
+    splits = split_documents(documents, 1000, 200)
+
+    # Le paragraphe répété est gardé une fois par source
+    assert [(doc.metadata['source'], doc.page_content) for doc in splits] == \
+        [('a.md', repeated), ('a.md', paragraph('unique')), ('b.md', repeated)]
+    assert len({doc.metadata['chunk_id'] for doc in splits}) == 3
+
+
+@pytest.mark.parametrize('stream_threshold_mb', [16, 0])
+def test_unchanged_files_are_skipped(config, embedding, stream_threshold_mb):
+    config['ingestion']['stream_threshold_mb'] = stream_threshold_mb
+    data_dir = config['paths']['data_dir']
+    files = {
+        'a.md': f'{paragraph("alpha")}\n\n{paragraph("beta")}\n\n{paragraph("alpha")}',
+        'b.txt': paragraph('gamma'),
+    }
+    for name, text in files.items():
+        with open(os.path.join(data_dir, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+    path = get_store_path(config)
+
+    ingest_documents()
+    # Le paragraphe répété de a.md n'est embeddé qu'une fois
+    assert sorted(embedding.embedded) == sorted([paragraph('alpha'), paragraph('beta'), paragraph('gamma')])
+    registry = load_sources_registry(config)
+    assert {source: entry['chunks'] for source, entry in registry.items()} == {'a.md': 2, 'b.txt': 1}
+    assert all(len(entry['fingerprint']['sha256']) == 64 for entry in registry.values())
+
+    # Rien n'a changé, ou seulement la date de modification: aucun embedding, index intact
+    journal_path = _current_version(path)[2]
+    journal_size = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+    embedding.embedded.clear()
+    ingest_documents()
+    os.utime(os.path.join(data_dir, 'a.md'), (1, 1))
+    ingest_documents()
+    assert embedding.embedded == []
+    assert (os.path.getsize(journal_path) if os.path.exists(journal_path) else 0) == journal_size
+
+    # Fichier modifié: seuls ses chunks sont embeddés et remplacent les anciens
+    with open(os.path.join(data_dir, 'b.txt'), 'w', encoding='utf-8') as f:
+        f.write(paragraph('delta'))
+    ingest_documents()
+    assert embedding.embedded == [paragraph('delta')]
+    assert sorted(read_store(path)['documents']) == sorted([paragraph('alpha'), paragraph('beta'), paragraph('delta')])
+
+    # Fichier supprimé du dossier: retiré de l'index et du registre, sans embedding
+    embedding.embedded.clear()
+    os.remove(os.path.join(data_dir, 'a.md'))
+    ingest_documents()
+    assert embedding.embedded == []
+    assert read_store(path)['documents'] == [paragraph('delta')]
+    assert list(load_sources_registry(config)) == ['b.txt']
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Tests de la recherche lexicale (BM25) et de la fusion par rang réciproque (RRF)"""
+
+import numpy as np
+import pytest
+
+from lexical import BM25_B, BM25_K1, RRF_K, BM25Postings, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "Le serveur Flask répond sur le port 5000",
+    "Installer le serveur puis lancer le serveur",
+    "Erreur RT-2045 au démarrage du serveur",
+    "Configurer le modèle d'embedding",
+    "Le cache évite de recalculer les embeddings du modèle",
+]
+
+
+def index(texts=TEXTS):
+    return LexicalIndex([(0, BM25Postings.from_texts(texts))])
+
+
+def bm25(query, texts=TEXTS):
+    """Scores BM25 calculés directement par la formule"""
+    documents = [tokenize(text) for text in texts]
+    avg_length = sum(map(len, documents)) / len(documents)
+    scores = np.zeros(len(documents))
+    for term in set(tokenize(query)):
+        df = sum(term in document for document in documents)
+        if not df:
+            continue
+        idf = np.log(1.0 + (len(documents) - df + 0.5) / (df + 0.5))
+        for i, document in enumerate(documents):
+            tf = document.count(term)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * len(document) / avg_length)
+            scores[i] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+    return scores
+
+
+def test_rrf_orders_by_summed_reciprocal_ranks():
+    rankings = [[1, 2, 3], [3, 2, 4]]
+
+    # 3: 1/61 + 1/63 > 2: 2/62 > 1: 1/61 > 4: 1/63
+    assert reciprocal_rank_fusion(rankings, 10) == [3, 2, 1, 4]
+    assert reciprocal_rank_fusion(rankings, 2) == [3, 2]
+    # Sans lissage, le premier rang domine: 3 (1 + 1/3), puis 1 et 2 à égalité (1), puis 4
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 2, 4]], 10, rrf_k=0) == [3, 1, 2, 4]
+
+
+def test_rrf_scores_match_the_formula():
+    rng = np.random.default_rng(0)
+    rankings = [list(rng.permutation(30)[:20]) for _ in range(3)]
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank)
+
+    result = reciprocal_rank_fusion(rankings, 10)
+
+    assert all(isinstance(row, int) for row in result)
+    assert [fused[row] for row in result] == sorted(fused.values(), reverse=True)[:10]
+
+
+def test_rrf_ties_keep_the_first_ranking_order():
+    # Mêmes rangs dans deux classements: ordre de première apparition
+    assert reciprocal_rank_fusion([[5, 7], [7, 5]], 2) == [5, 7]
+    assert reciprocal_rank_fusion([[], np.array([4, 2])], 2) == [4, 2]
+
+
+def test_tokenize_folds_case_and_accents_and_splits_identifiers():
+    assert tokenize("Démarrage du Modèle") == ['demarrage', 'du', 'modele']
+    assert tokenize("Erreur RT-2045 (v2.1)") == ['erreur', 'rt-2045', 'rt', '2045', 'v2.1', 'v2', '1']
+    assert tokenize('x' * 65 + ' ok') == ['ok']
+
+
+@pytest.mark.parametrize('query', ['serveur', 'modèle embedding', 'rt-2045', '2045 serveur', 'inconnu'])
+def test_bm25_scores_and_order(query):
+    expected = bm25(query)
+
+    rows, scores = index().search(query, k=10)
+
+    matching = np.flatnonzero(expected > 0)
+    assert sorted(rows) == sorted(matching)
+    assert scores == pytest.approx(expected[rows], rel=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_bm25_ranks_rare_terms_and_short_chunks_first():
+    rows, _ = index().search('serveur modèle', k=10)
+    # "modèle" (2 chunks) pèse plus que "serveur" (3 chunks); le chunk court passe devant
+    assert list(rows[:2]) == [3, 4]
+    # Fréquence saturée: deux occurrences ne comptent pas double
+    rows, scores = index().search('serveur', k=10)
+    score = dict(zip(rows, scores))
+    assert score[0] < score[1] < 2 * score[0]
+
+
+def test_bm25_allowed_rows_and_parts():
+    rows, _ = index().search('serveur', k=10, allowed=np.array([1, 3]))
+    assert list(rows) == [1]
+
+    # Deux parties (segment et journal): mêmes scores qu'un index unique, lignes décalées
+    split = LexicalIndex([(0, BM25Postings.from_texts(TEXTS[:2])), (2, BM25Postings.from_texts(TEXTS[2:]))])
+    for query in ('serveur', 'modèle embedding'):
+        single_rows, single_scores = index().search(query, k=10)
+        split_rows, split_scores = split.search(query, k=10)
+        assert list(split_rows) == list(single_rows)
+        assert split_scores == pytest.approx(single_scores, rel=1e-6)
+
+    # Lignes supprimées de la première partie
+    masked = LexicalIndex([(0, BM25Postings.from_texts(TEXTS))], alive=np.array([False, True, True, True, True]))
+    assert 0 not in masked.search('serveur', k=10)[0]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Tests du vector store partitionné construit en mémoire (from_texts, add_texts)"""
+
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingest
+from filters import MetadataFilter
+from ingest import ChunkWriter, reshard_vectorstore
+from shards import ShardedVectorStore, load_shards, read_shard_count, shard_of, shard_paths
+from store import (SHARDS_FILENAME, LocalVectorStore, append_to_store, get_store_path, load_store, save_store,
+                   store_exists)
+
+TEXTS = [
+    "Installer le serveur avec pip install -r requirements.txt",
+    "Configurer le modèle d'embedding dans config.yaml",
+    "Lancer l'indexation avec python ingest.py --rebuild",
+    "Le serveur Flask répond sur le port 5000",
+    "Les shards répartissent les chunks par source",
+    "La recherche hybride fusionne BM25 et vecteurs par RRF",
+    "Le cache SQLite évite de recalculer les embeddings",
+    "Les questions par lot sont générées en parallèle",
+]
+METADATAS = [{'source': f'https://docs.example.com/page{i % 5}'} for i in range(len(TEXTS))]
+
+
+@pytest.fixture
+def embedding():
+    return DeterministicFakeEmbedding(size=32)
+
+
+def contents(documents):
+    return [doc.page_content for doc in documents]
+
+
+def test_from_texts_routes_chunks_by_source(embedding):
+    store = ShardedVectorStore.from_texts(TEXTS, embedding, METADATAS, shard_count=3)
+
+    assert len(store.data) == len(TEXTS)
+    for index, shard in enumerate(store.shards):
+        for metadata in shard.data.delta_metadatas:
+            assert shard_of(metadata['source'], 3) == index
+
+
+def test_from_texts_matches_single_store(embedding):
+    sharded = ShardedVectorStore.from_texts(TEXTS, embedding, METADATAS, shard_count=3)
+    single = LocalVectorStore.from_texts(TEXTS, embedding, METADATAS)
+    query = "indexation des embeddings"
+    vector = embedding.embed_query(query)
+
+    assert contents(sharded.similarity_search_by_vector(vector, k=5)) == \
+        contents(single.similarity_search_by_vector(vector, k=5))
+    assert contents(sharded.lexical_search(query, k=3)) == contents(single.lexical_search(query, k=3))
+    assert contents(sharded.hybrid_search(query, vector, k=4)) == contents(single.hybrid_search(query, vector, k=4))
+    assert [contents(docs) for docs in sharded.batch_search([query], [vector], k=4)] == \
+        [contents(docs) for docs in single.batch_search([query], [vector], k=4)]
+
+
+def corpus(count=120, seed=1):
+    """Chunks de longueurs différentes, vocabulaire propre à chaque source (statistiques BM25 inégales entre shards)"""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f'mot{i}' for i in range(40)]
+    texts, metadatas = [], []
+    for i in range(count):
+        source = i % 9
+        words = rng.choice(vocabulary[source * 3:source * 3 + 12], size=5 + i)
+        texts.append(f'chunk{i} ' + ' '.join(words))
+        metadatas.append({'source': f'https://docs.example.com/page{source}', 'type': 'pdf' if i % 3 else 'md',
+                          'indexed_at': f'2024-0{1 + source % 6}-15T12:00:00'})
+    return texts, metadatas
+
+
+FILTERS = [
+    None,
+    {'source': ['https://docs.example.com/page1', 'https://docs.example.com/page5']},
+    {'type': 'md'},
+    {'indexed_after': '2024-03-01', 'indexed_before': '2024-05-01', 'type': 'pdf'},
+]
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_fan_out_matches_single_store_with_filters(embedding, filters):
+    texts, metadatas = corpus()
+    sharded = ShardedVectorStore.from_texts(texts, embedding, metadatas, shard_count=4)
+    single = LocalVectorStore.from_texts(texts, embedding, metadatas)
+    metadata_filter = MetadataFilter.from_dict(filters)
+
+    for query in ('mot3 mot4', 'mot20 mot21 mot22', 'chunk7 mot0'):
+        vector = embedding.embed_query(query)
+        expected = single.similarity_search_with_score_by_vector(vector, k=8, filter=metadata_filter)
+        results = sharded.similarity_search_with_score_by_vector(vector, k=8, filter=metadata_filter)
+        assert results
+        assert contents(doc for doc, _ in results) == contents(doc for doc, _ in expected)
+        assert [score for _, score in results] == pytest.approx([score for _, score in expected], abs=1e-6)
+        assert all(metadata_filter is None or metadata_filter.matches(
+            doc.metadata['source'], doc.metadata['type'], doc.metadata['indexed_at']) for doc, _ in results)
+        assert contents(sharded.hybrid_search(query, vector, k=8, candidates=20, filter=metadata_filter)) == \
+            contents(single.hybrid_search(query, vector, k=8, candidates=20, filter=metadata_filter))
+
+
+def test_bm25_uses_statistics_of_all_shards(embedding):
+    texts, metadatas = corpus()
+    sharded = ShardedVectorStore.from_texts(texts, embedding, metadatas, shard_count=4)
+    single = LocalVectorStore.from_texts(texts, embedding, metadatas)
+    queries = ['mot3', 'mot10 mot11', 'mot25 mot3 mot14', 'chunk42 mot26']
+
+    # Un mot fréquent dans un shard et rare ailleurs a la même IDF que dans un index unique
+    for query in queries:
+        assert contents(sharded.lexical_search(query, k=10)) == contents(single.lexical_search(query, k=10))
+    vectors = embedding.embed_documents(queries)
+    assert [contents(docs) for docs in sharded.batch_search(queries, vectors, k=6, candidates=20)] == \
+        [contents(docs) for docs in single.batch_search(queries, vectors, k=6, candidates=20)]
+
+    # Statistiques sommées sur les shards = celles de l'index unique, différentes de celles de chaque shard
+    query = 'mot3 mot10 mot26'
+    stats = single.data.lexical().term_stats(query)
+    assert sharded._lexical_stats([query]) == [stats]
+    assert all(shard.data.lexical().term_stats(query) != stats for shard in sharded.shards)
+
+
+def shard_files(path):
+    """Contenu de tous les fichiers d'un shard"""
+    files = {}
+    for directory, _, names in os.walk(path):
+        for name in names:
+            with open(os.path.join(directory, name), 'rb') as f:
+                files[os.path.relpath(os.path.join(directory, name), path)] = f.read()
+    return files
+
+
+def write_chunks(config, chunks, fingerprints=None):
+    """Indexe des chunks {source: [textes]} avec des embeddings déterministes"""
+    embedding = DeterministicFakeEmbedding(size=16)
+    writer = ChunkWriter(config, batch_size=0)
+    for source, texts in chunks.items():
+        writer.add([Document(page_content=text, metadata={'source': source}) for text in texts],
+                   embedding.embed_documents(texts))
+    writer.finish(fingerprints or {source: 'v1' for source in chunks})
+
+
+def test_reingest_writes_only_the_shard_of_the_source(config):
+    config['storage']['shards'] = 4
+    sources = [f'doc{i}.md' for i in range(12)]
+    write_chunks(config, {source: [f'{source} partie {j}' for j in range(3)] for source in sources})
+    path = get_store_path(config)
+    before = [shard_files(shard_path) for shard_path in shard_paths(path)]
+
+    # Réindexer une source: ses anciens chunks sont remplacés, dans son shard seulement
+    write_chunks(config, {'doc5.md': ['doc5.md nouvelle version']}, {'doc5.md': 'v2'})
+
+    changed = [i for i, shard_path in enumerate(shard_paths(path)) if shard_files(shard_path) != before[i]]
+    assert changed == [shard_of('doc5.md', 4)]
+    store = open_sharded(config)
+    assert len(store.data) == 11 * 3 + 1
+    doc5 = MetadataFilter.from_dict({'source': 'doc5.md'})
+    assert contents(store.lexical_search('doc5 partie version', k=10, filter=doc5)) == ['doc5.md nouvelle version']
+    assert len(store.lexical_search('partie', k=100)) == 11 * 3
+
+
+def test_add_texts_returns_global_rows(embedding):
+    store = ShardedVectorStore.from_texts(TEXTS[:4], embedding, METADATAS[:4], shard_count=2)
+
+    ids = store.add_texts(TEXTS[4:], METADATAS[4:])
+
+    assert len(store.data) == len(TEXTS)
+    for row, text in zip(ids, TEXTS[4:]):
+        assert store._document(int(row)).page_content == text
+
+
+def test_from_texts_empty_and_invalid_shard_count(embedding):
+    store = ShardedVectorStore.from_texts([], embedding, shard_count=2)
+    assert len(store.data) == 0
+    assert store.lexical_search("serveur") == []
+
+    with pytest.raises(ValueError):
+        ShardedVectorStore.from_texts(TEXTS, embedding, METADATAS, shard_count=0)
+
+
+def populated_store(config, count=60, dimension=16):
+    """Vector store unique de count chunks (segment et journal) répartis sur 12 sources; retourne leurs vecteurs"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(count, dimension)).astype(np.float32)
+    texts = [f'chunk {i}' for i in range(count)]
+    metadatas = [{'source': f'doc{i % 12}.md'} for i in range(count)]
+    path = get_store_path(config)
+    model = config['models']['embedding_model']
+    half = count // 2
+    save_store(path, texts[:half], metadatas[:half], vectors[:half], model)
+    append_to_store(path, texts[half:], metadatas[half:], vectors[half:], model)
+    return dict(zip(texts, vectors))
+
+
+def open_sharded(config):
+    shards = load_shards(get_store_path(config), config['models']['embedding_model'])
+    return ShardedVectorStore(None, [LocalVectorStore(None, data) for data in shards])
+
+
+def assert_all_chunks_found(store, chunks):
+    assert len(store.data) == len(chunks)
+    for text, vector in chunks.items():
+        assert store.similarity_search_by_vector(vector, k=1)[0].page_content == text
+
+
+@pytest.mark.parametrize('counts', [[3], [3, 2], [4, 1]])
+def test_reshard_keeps_every_chunk(config, counts):
+    chunks = populated_store(config)
+    path = get_store_path(config)
+
+    for count in counts:
+        config['storage']['shards'] = count
+        assert reshard_vectorstore(config) == len(chunks)
+
+        assert read_shard_count(path) == count
+        # Seuls shards.json et la répartition publiée restent dans le dossier
+        assert sorted(os.listdir(path)) == sorted([SHARDS_FILENAME, os.path.dirname(
+            os.path.relpath(shard_paths(path)[0], path))])
+        assert_all_chunks_found(open_sharded(config), chunks)
+
+
+def test_reshard_publishes_through_the_pointer(config, monkeypatch):
+    chunks = populated_store(config)
+    path = get_store_path(config)
+    before = load_store(path, config['models']['embedding_model'])
+    config['storage']['shards'] = 3
+
+    # Interruption avant la publication: l'index reste l'ancien, complet
+    def crash(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(ingest, 'publish_layout', crash)
+    with pytest.raises(KeyboardInterrupt):
+        reshard_vectorstore(config)
+    assert read_shard_count(path) is None
+    assert_all_chunks_found(open_sharded(config), chunks)
+
+    # Le dossier de l'index existe à chaque instant de la publication
+    monkeypatch.undo()
+    replace = os.replace
+    def checked_replace(source, destination):
+        assert store_exists(path)
+        replace(source, destination)
+        assert store_exists(path)
+    monkeypatch.setattr(os, 'replace', checked_replace)
+    reshard_vectorstore(config)
+    monkeypatch.undo()
+
+    assert_all_chunks_found(open_sharded(config), chunks)
+    # Un lecteur qui avait ouvert l'ancien index continue de le lire
+    assert sorted(before.text(row) for row in range(len(before))) == sorted(chunks)
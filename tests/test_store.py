@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Tests du vector store sur disque (journal, versions, format mappé, quantification)"""
+
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import store
+from filters import MetadataFilter
+from store import (CURRENT_FILENAME, KEEP_VERSIONS, LEGACY_STORE_FILENAME, MANIFEST_FILENAME, VERSIONS_DIRNAME,
+                   LocalVectorStore, StoreData, _current_version, _list_versions, append_to_store, get_store_path,
+                   load_store, read_store, save_store)
+
+MODEL = 'fake-embedding'
+EMBEDDING = DeterministicFakeEmbedding(size=16)
+
+
+def chunks(source, count, version='v1'):
+    """count chunks d'une source: (textes, metadatas, embeddings)"""
+    texts = [f'{source} {version} partie {i}' for i in range(count)]
+    return texts, [{'source': source} for _ in texts], EMBEDDING.embed_documents(texts)
+
+
+def merge(*parts):
+    """Réunit les chunks de plusieurs sources"""
+    return [sum(columns, []) for columns in zip(*parts)]
+
+
+def texts_of(data):
+    return sorted(data.text(row) for row in range(data.base_count + len(data.delta_texts))
+                  if row >= data.base_count or data.base_alive is None or data.base_alive[row])
+
+
+def assert_found(data, texts):
+    """Chaque texte est son propre plus proche voisin dans l'index"""
+    store = LocalVectorStore(EMBEDDING, data)
+    for text in texts:
+        assert store.similarity_search_by_vector(EMBEDDING.embed_query(text), k=1)[0].page_content == text
+
+
+@pytest.fixture
+def path(tmp_path):
+    return get_store_path({'paths': {'vectorstore_dir': str(tmp_path / 'vectorstore')}})
+
+
+def test_append_then_reopen(path):
+    first = chunks('a.md', 5)
+    save_store(path, *first, MODEL)
+    version = _current_version(path)[0]
+    second, third = chunks('b.md', 3), chunks('c.md', 4)
+    append_to_store(path, *second, MODEL)
+    append_to_store(path, *third, MODEL)
+
+    # Les ajouts vont dans le journal de la version active, sans la réécrire
+    assert _current_version(path)[0] == version
+    data = load_store(path, MODEL)
+    assert (data.base_count, len(data.delta_texts)) == (5, 7)
+    expected = sorted(first[0] + second[0] + third[0])
+    assert texts_of(data) == expected
+    assert_found(data, expected)
+    assert sorted(read_store(path)['documents']) == expected
+    assert data.metadata(data.base_count) == {'source': 'b.md'}
+
+
+def test_source_replaced_and_deleted_through_the_journal(path):
+    save_store(path, *merge(chunks('a.md', 3), chunks('b.md', 3)), MODEL)
+    append_to_store(path, *chunks('c.md', 2), MODEL)
+
+    # Réindexation de a.md (segment) et de c.md (journal): anciens chunks supprimés, nouveaux gardés
+    replaced = merge(chunks('a.md', 2, 'v2'), chunks('c.md', 1, 'v2'))
+    append_to_store(path, *replaced, MODEL, deleted_sources=['a.md', 'c.md'])
+    data = load_store(path, MODEL)
+    expected = sorted(chunks('b.md', 3)[0] + replaced[0])
+    assert texts_of(data) == expected
+    assert len(data) == len(expected)
+    assert_found(data, expected)
+
+    # Suppression seule: plus aucun chunk de b.md, y compris par la recherche lexicale
+    append_to_store(path, [], [], [], MODEL, deleted_sources=['b.md'])
+    data = load_store(path, MODEL)
+    assert texts_of(data) == sorted(replaced[0])
+    store = LocalVectorStore(EMBEDDING, data)
+    assert all(doc.metadata['source'] != 'b.md' for doc in store.lexical_search('b.md partie', k=10))
+    assert sorted(read_store(path)['documents']) == sorted(replaced[0])
+
+
+def test_truncated_journal_record_is_ignored(path):
+    save_store(path, *chunks('a.md', 2), MODEL)
+    append_to_store(path, *chunks('b.md', 2), MODEL)
+    journal_path = _current_version(path)[2]
+    size = os.path.getsize(journal_path)
+    append_to_store(path, *chunks('c.md', 2), MODEL)
+
+    # Interruption pendant l'écriture du dernier enregistrement
+    with open(journal_path, 'r+b') as f:
+        f.truncate(size + (os.path.getsize(journal_path) - size) // 2)
+
+    assert texts_of(load_store(path, MODEL)) == sorted(chunks('a.md', 2)[0] + chunks('b.md', 2)[0])
+
+
+def columnar_chunks(count=40):
+    """Chunks aux metadatas variées: valeurs répétées, uniques, absentes, non ASCII"""
+    texts = [f'chunk {i} — données « {i % 7} » {"é" * (i % 5)}' for i in range(count)]
+    metadatas = []
+    for i in range(count):
+        meta = {'source': f'doc{i % 4}.pdf', 'type': 'pdf', 'title': f'Titre n°{i}'}
+        if i % 3:
+            meta['page'] = i % 3
+        metadatas.append(meta)
+    return texts, metadatas, EMBEDDING.embed_documents(texts)
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float16'])
+def test_columnar_segment_is_memory_mapped(path, dtype):
+    texts, metadatas, embeddings = columnar_chunks()
+    save_store(path, texts, metadatas, embeddings, MODEL, dtype=dtype)
+
+    data = load_store(path, MODEL)
+    base = data.base
+    assert isinstance(base.vectors, np.memmap) and base.vectors.dtype == np.dtype(dtype)
+    with open(os.path.join(base.directory, MANIFEST_FILENAME), encoding='utf-8') as f:
+        columns = {name: column['kind'] for name, column in json.load(f)['metadata_columns'].items()}
+    assert columns == {'source': 'dictionary', 'type': 'dictionary', 'page': 'dictionary', 'title': 'strings'}
+
+    # Textes et metadatas relus à l'identique (lignes regroupées par source)
+    rows = {data.text(row): data.metadata(row) for row in range(len(data))}
+    assert rows == dict(zip(texts, metadatas))
+    assert_found(data, texts)
+    store = LocalVectorStore(EMBEDDING, data)
+    for text, embedding in zip(texts[:5], embeddings):
+        doc, distance = store.similarity_search_with_score_by_vector(embedding, k=1)[0]
+        assert doc.page_content == text
+        assert distance == pytest.approx(0.0, abs=1e-6 if dtype == 'float32' else 1e-3)
+
+    # Un filtre par source lit une plage de lignes contiguës
+    source_rows = data.filter_rows(MetadataFilter.from_dict({'source': 'doc2.pdf'}))
+    assert list(source_rows) == list(range(source_rows[0], source_rows[0] + 10))
+    assert {data.metadata(row)['source'] for row in source_rows} == {'doc2.pdf'}
+
+
+def test_legacy_pickle_is_converted_without_embedding(path):
+    texts, metadatas, embeddings = columnar_chunks(10)
+    os.makedirs(os.path.dirname(path))
+    legacy_path = os.path.join(os.path.dirname(path), LEGACY_STORE_FILENAME)
+    with open(legacy_path, 'wb') as f:
+        pickle.dump({'documents': texts, 'metadatas': metadatas, 'embeddings': np.asarray(embeddings),
+                     'embedding_model': MODEL}, f)
+
+    data = load_store(path, MODEL)
+
+    assert not os.path.exists(legacy_path)
+    assert _current_version(path)[0] is not None
+    assert {data.text(row): data.metadata(row) for row in range(len(data))} == dict(zip(texts, metadatas))
+    assert_found(data, texts)
+
+
+def all_texts(data):
+    return sorted(data.text(row) for row in range(len(data)))
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Windows ne supprime pas un dossier dont les fichiers sont mappés")
+def test_old_versions_are_collected_while_a_reader_holds_a_snapshot(path):
+    save_store(path, *chunks('a.md', 4), MODEL)
+    append_to_store(path, *chunks('b.md', 2), MODEL)
+    reader = load_store(path, MODEL)
+    snapshot = all_texts(reader)
+
+    for version in range(2, KEEP_VERSIONS + 3):
+        save_store(path, *chunks('a.md', 4, f'v{version}'), MODEL)
+
+    # Version du lecteur supprimée du disque: ses fichiers mappés restent lisibles
+    versions = _list_versions(path)
+    assert len(versions) == KEEP_VERSIONS and reader.version not in versions
+    assert not os.path.exists(reader.base.directory)
+    assert _current_version(path)[0] == versions[-1]
+    assert all_texts(reader) == snapshot
+    assert_found(reader, snapshot)
+    assert all_texts(load_store(path, MODEL)) == sorted(chunks('a.md', 4, f'v{KEEP_VERSIONS + 2}')[0])
+
+
+def test_interrupted_save_keeps_the_previous_version(path, monkeypatch):
+    save_store(path, *chunks('a.md', 3), MODEL)
+    append_to_store(path, *chunks('b.md', 2), MODEL)
+    expected = sorted(chunks('a.md', 3)[0] + chunks('b.md', 2)[0])
+
+    # Interruption avant la bascule de CURRENT: nouvelle version complète mais pas publiée
+    replace = os.replace
+    def crash_before_flip(source, destination):
+        if os.path.basename(destination) == CURRENT_FILENAME:
+            raise KeyboardInterrupt
+        replace(source, destination)
+    monkeypatch.setattr(store.os, 'replace', crash_before_flip)
+    with pytest.raises(KeyboardInterrupt):
+        save_store(path, *chunks('c.md', 3), MODEL)
+    monkeypatch.undo()
+    # Interruption pendant l'écriture d'un segment (dossier .tmp sans manifeste)
+    os.makedirs(os.path.join(path, VERSIONS_DIRNAME, 'v000009.tmp'))
+
+    assert all_texts(load_store(path, MODEL)) == expected
+    assert os.path.exists(os.path.join(path, CURRENT_FILENAME + '.tmp'))
+
+    # La sauvegarde suivante publie une nouvelle version et retire les restes
+    save_store(path, *chunks('d.md', 2), MODEL)
+    assert all_texts(load_store(path, MODEL)) == sorted(chunks('d.md', 2)[0])
+    assert sorted(os.listdir(path)) == [CURRENT_FILENAME, VERSIONS_DIRNAME]
+    assert not [name for name in os.listdir(os.path.join(path, VERSIONS_DIRNAME)) if name.endswith('.tmp')]
+
+
+def test_open_retries_when_the_version_disappears(path, monkeypatch):
+    save_store(path, *chunks('a.md', 3), MODEL)
+    current_version = _current_version
+
+    # CURRENT lu juste avant la suppression de la version qu'il désignait
+    calls = []
+    def stale_then_current(store_path):
+        calls.append(store_path)
+        if len(calls) == 1:
+            return 'v000000', os.path.join(store_path, VERSIONS_DIRNAME, 'v000000'), None
+        return current_version(store_path)
+    monkeypatch.setattr(store, '_current_version', stale_then_current)
+
+    data = StoreData.open(path)
+    assert len(calls) == 2
+    assert all_texts(data) == sorted(chunks('a.md', 3)[0])
+
+
+def clustered_vectors(count=3000, dim=64, seed=0):
+    """Embeddings groupés en thèmes (cas réaliste pour la quantification) et questions proches de chunks"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(30, dim))
+    vectors = (centers[rng.integers(0, len(centers), count)] + rng.normal(scale=0.6, size=(count, dim)))
+    queries = vectors[rng.choice(count, 50, replace=False)] + rng.normal(scale=0.3, size=(50, dim))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def recall(store, exact, queries, k=10):
+    """Part des k plus proches voisins exacts retrouvés par store"""
+    found = [
+        len({doc.page_content for doc in store.similarity_search_by_vector(query, k=k)}
+            & {doc.page_content for doc in exact.similarity_search_by_vector(query, k=k)}) / k
+        for query in queries
+    ]
+    return float(np.mean(found))
+
+
+@pytest.mark.parametrize('mode, ratio, coarse_recall', [('int8', 4, 0.95), ('pq', 16, 0.4)])
+def test_quantized_search_recall_against_exact(path, mode, ratio, coarse_recall):
+    vectors, queries = clustered_vectors()
+    texts = [f'chunk {i}' for i in range(len(vectors))]
+    save_store(path, texts, [{'source': f'doc{i % 10}.md'} for i in range(len(texts))], vectors, MODEL,
+               quantization={'mode': mode, 'subvectors': 0})
+    data = load_store(path, MODEL)
+    exact = LocalVectorStore(None, data, use_quantization=False)
+
+    assert data.quantizer.kind == mode
+    assert data.quantizer.codes.nbytes * ratio == data.base.vectors.nbytes
+    # Scores approchés seuls, puis candidats recalculés avec les vecteurs complets
+    coarse = LocalVectorStore(None, data, rerank_candidates=0)
+    reranked = LocalVectorStore(None, data, rerank_candidates=100)
+    assert coarse.quantized and reranked.quantized
+    assert recall(coarse, exact, queries) >= coarse_recall
+    assert recall(reranked, exact, queries) >= 0.98
+    # Scores exacts après recalcul: mêmes distances que la recherche exhaustive
+    first = reranked.similarity_search_with_score_by_vector(queries[0], k=1)[0]
+    assert first[1] == pytest.approx(exact.similarity_search_with_score_by_vector(queries[0], k=1)[0][1], abs=1e-6)
+
+    # Recherche par lot: mêmes résultats que question par question
+    batch = reranked.batch_search([''] * len(queries), queries, k=10, hybrid=False)
+    assert [[doc.page_content for doc in docs] for docs in batch] == \
+        [[doc.page_content for doc in reranked.similarity_search_by_vector(query, k=10)] for query in queries]
+
+    # Chunks du journal (non quantifiés): comparés exactement
+    append_to_store(path, ['ajouté'], [{'source': 'new.md'}], queries[:1], MODEL)
+    doc, distance = LocalVectorStore(None, load_store(path, MODEL), rerank_candidates=0) \
+        .similarity_search_with_score_by_vector(queries[0], k=1)[0]
+    assert (doc.page_content, distance) == ('ajouté', pytest.approx(0.0, abs=1e-6))